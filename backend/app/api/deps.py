@@ -1,13 +1,26 @@
 """
 Dependencies para los endpoints
 """
-from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status, UploadFile
+import base64
+import hashlib
+import json
+import os
+import uuid
+import zipfile
+from dataclasses import dataclass
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Generator, List, Optional, Tuple
+from urllib.parse import quote
+from fastapi import Depends, HTTPException, Request, Response, status, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
+from app.core.config import settings
 from app.core.database import get_db
-from app.core.security import decode_access_token
 from app.models.models import Usuario
+from app.services import cache_usuarios
+from app.services.descargas import Validadores
 
 security = HTTPBearer()
 
@@ -17,10 +30,12 @@ def get_current_user(
     db: Session = Depends(get_db)
 ) -> Usuario:
     """
-    Obtener usuario actual desde el token JWT
+    Obtener usuario actual desde el token JWT. El token decodificado y los
+    datos del usuario salen de la caché de autenticación (sin consultar la
+    base de datos mientras no vencen ni se modifica el usuario).
     """
     token = credentials.credentials
-    payload = decode_access_token(token)
+    payload = cache_usuarios.payload_token(token)
 
     if payload is None:
         raise HTTPException(
@@ -35,7 +50,7 @@ def get_current_user(
             detail="Token inválido"
         )
 
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+    user = cache_usuarios.obtener_usuario(db, email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,6 +80,56 @@ def get_current_admin_user(
     return current_user
 
 
+def codificar_cursor(valor) -> str:
+    """Cursor opaco con el valor de orden de la última fila de una página"""
+    return base64.urlsafe_b64encode(json.dumps(valor).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, tipo: type):
+    """Valor de orden del cursor; 400 si no es un cursor de este listado"""
+    try:
+        valor = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if type(valor) is not tipo:
+            raise ValueError(cursor)
+        return valor
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+def paginar_keyset(
+    query: Query,
+    columna,
+    limit: int,
+    cursor: Optional[str] = None,
+    descendente: bool = False,
+    skip: int = 0
+) -> Tuple[list, Optional[str]]:
+    """
+    Página de `query` ordenada por `columna` (de valores únicos) a partir
+    del cursor de la página anterior: la consulta sigue el índice de la
+    columna desde el último valor visto en lugar de saltar filas con OFFSET.
+    Devuelve las filas y el cursor de la página siguiente (None si no hay
+    más). `skip` solo se aplica sin cursor, para clientes que aún paginan por
+    OFFSET.
+    """
+    if cursor:
+        ultimo = decodificar_cursor(cursor, columna.type.python_type)
+        query = query.filter(columna < ultimo if descendente else columna > ultimo)
+
+    query = query.order_by(columna.desc() if descendente else columna.asc())
+    if skip and not cursor:
+        query = query.offset(skip)
+    filas = query.limit(limit + 1).all()
+
+    if len(filas) <= limit:
+        return filas, None
+    filas = filas[:limit]
+    return filas, codificar_cursor(getattr(filas[-1], columna.key))
+
+
 def validate_excel_file(archivo: UploadFile) -> UploadFile:
     """
     Validar que el archivo sea un Excel válido
@@ -83,3 +148,294 @@ def validate_excel_file(archivo: UploadFile) -> UploadFile:
         )
 
     return archivo
+
+
+# Tamaño de los bloques leídos del upload y escritos a disco
+TAMANO_BLOQUE_UPLOAD = 1024 * 1024
+
+
+@dataclass
+class ArchivoSubido:
+    path: str
+    tamano: int
+    sha256: str
+
+
+def _error_tamano() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"El archivo excede el tamaño máximo permitido ({settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB)"
+    )
+
+
+def _escribir_bloque(f, hash_contenido, bloque: bytes) -> None:
+    f.write(bloque)
+    hash_contenido.update(bloque)
+
+
+# Margen del cuerpo multipart sobre el tamaño de los archivos (campos del
+# formulario, separadores y encabezados de cada parte)
+MARGEN_MULTIPART = 64 * 1024
+
+
+def limite_cuerpo_upload(path: str) -> int:
+    """Tamaño máximo del cuerpo multipart de una petición"""
+    archivos = settings.LOTE_MAX_ARCHIVOS if path.endswith("/procesar-lote") else 1
+    return settings.MAX_UPLOAD_SIZE * archivos + MARGEN_MULTIPART
+
+
+class LimiteTamanoUpload:
+    """
+    Middleware que rechaza con 413 los formularios multipart cuyo
+    Content-Length excede limite_cuerpo_upload, antes de que Starlette lea el
+    cuerpo (y lo guarde en memoria o disco) para armar los UploadFile. Los
+    envíos sin Content-Length (chunked) los corta guardar_upload al copiar.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT"):
+            headers = dict(scope["headers"])
+            largo = headers.get(b"content-length", b"")
+            if (
+                headers.get(b"content-type", b"").startswith(b"multipart/form-data")
+                and largo.isdigit()
+                and int(largo) > limite_cuerpo_upload(scope["path"])
+            ):
+                respuesta = JSONResponse(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, content={
+                    "detail": _error_tamano().detail
+                })
+                await respuesta(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+async def guardar_upload(archivo: UploadFile, destino: str) -> ArchivoSubido:
+    """
+    Guardar el archivo subido en disco por bloques de TAMANO_BLOQUE_UPLOAD,
+    calculando su SHA-256 en el camino. La escritura y el hash se ejecutan en
+    el threadpool para no bloquear el event loop, y si el archivo supera
+    settings.MAX_UPLOAD_SIZE se corta la copia, se borra lo escrito y se
+    responde 413. Para entonces Starlette ya recibió el cuerpo completo: el
+    rechazo temprano por Content-Length lo hace LimiteTamanoUpload.
+    """
+    if archivo.size is not None and archivo.size > settings.MAX_UPLOAD_SIZE:
+        raise _error_tamano()
+
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    hash_contenido = hashlib.sha256()
+    tamano = 0
+
+    f = await run_in_threadpool(open, destino, "wb")
+    try:
+        while True:
+            bloque = await archivo.read(TAMANO_BLOQUE_UPLOAD)
+            if not bloque:
+                break
+            tamano += len(bloque)
+            if tamano > settings.MAX_UPLOAD_SIZE:
+                raise _error_tamano()
+            await run_in_threadpool(_escribir_bloque, f, hash_contenido, bloque)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+
+    await run_in_threadpool(f.close)
+    return ArchivoSubido(path=destino, tamano=tamano, sha256=hash_contenido.hexdigest())
+
+
+def extraer_zip_ventas(zip_path: str, destino: str) -> List[Tuple[str, ArchivoSubido]]:
+    """
+    Extraer en `destino` los archivos Excel de un .zip subido y devolver
+    (ruta dentro del zip, archivo) por cada uno. Se ignoran carpetas, archivos
+    ocultos y de otros tipos. Cada archivo se copia por bloques con el mismo
+    límite de settings.MAX_UPLOAD_SIZE que un upload (sin confiar en el tamaño
+    declarado en el zip) y se guarda con un nombre generado, de modo que las
+    rutas del zip nunca se usan para escribir en disco.
+    """
+    try:
+        zip_file = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo .zip no es válido"
+        )
+
+    extraidos: List[Tuple[str, ArchivoSubido]] = []
+    with zip_file:
+        for miembro in zip_file.infolist():
+            nombre = os.path.basename(miembro.filename.replace("\\", "/"))
+            if (
+                miembro.is_dir()
+                or miembro.filename.startswith("__MACOSX/")
+                or not nombre
+                or nombre.startswith(".")
+                or nombre.split('.')[-1].lower() not in ['xls', 'xlsx']
+            ):
+                continue
+
+            if len(extraidos) >= settings.LOTE_MAX_ARCHIVOS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"El lote excede el máximo de {settings.LOTE_MAX_ARCHIVOS} archivos"
+                )
+
+            path = os.path.join(destino, f"{uuid.uuid4().hex[:8]}_{nombre}")
+            hash_contenido = hashlib.sha256()
+            tamano = 0
+            try:
+                with zip_file.open(miembro) as origen, open(path, "wb") as f:
+                    while True:
+                        bloque = origen.read(TAMANO_BLOQUE_UPLOAD)
+                        if not bloque:
+                            break
+                        tamano += len(bloque)
+                        if tamano > settings.MAX_UPLOAD_SIZE:
+                            raise _error_tamano()
+                        _escribir_bloque(f, hash_contenido, bloque)
+            except HTTPException:
+                os.remove(path)
+                raise
+            except Exception as e:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"No se pudo extraer {miembro.filename} del .zip: {str(e)}"
+                )
+
+            extraidos.append((miembro.filename, ArchivoSubido(path=path, tamano=tamano, sha256=hash_contenido.hexdigest())))
+
+    return extraidos
+
+
+# --- Descargas con validadores y rangos ---
+
+CACHE_CONTROL_DESCARGA = "private, no-cache"
+
+
+def _coincide_etag(encabezado: str, etag: str) -> bool:
+    """If-None-Match: comparación débil contra una lista de ETags o '*'"""
+    for valor in encabezado.split(","):
+        valor = valor.strip()
+        if valor == "*" or valor.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _rango_pedido(encabezado: str, tamano: int) -> Optional[Tuple[int, int]]:
+    """
+    Primer y último byte de un header Range de un solo rango. None si el
+    header no se puede interpretar o pide varios rangos (se responde el
+    archivo completo); 416 si el rango queda fuera del archivo.
+    """
+    unidad, _, rangos = encabezado.partition("=")
+    if unidad.strip().lower() != "bytes" or "," in rangos:
+        return None
+    inicio, separador, fin = rangos.strip().partition("-")
+    if not separador:
+        return None
+
+    try:
+        if inicio:
+            primero = int(inicio)
+            ultimo = tamano - 1
+            if fin:
+                if int(fin) < primero:
+                    return None
+                ultimo = min(int(fin), ultimo)
+        else:
+            # Últimos N bytes (N = 0 no se puede satisfacer)
+            sufijo = int(fin)
+            if sufijo < 0:
+                return None
+            primero, ultimo = (max(tamano - sufijo, 0), tamano - 1) if sufijo else (tamano, tamano - 1)
+    except ValueError:
+        return None
+
+    if primero >= tamano:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Rango fuera del archivo",
+            headers={"Content-Range": f"bytes */{tamano}"}
+        )
+    return primero, ultimo
+
+
+def _content_disposition(nombre: str) -> str:
+    """Igual que FileResponse: filename* (RFC 5987) si el nombre no es ASCII"""
+    nombre_codificado = quote(nombre)
+    if nombre_codificado != nombre:
+        return f"attachment; filename*=utf-8''{nombre_codificado}"
+    return f'attachment; filename="{nombre}"'
+
+
+def _leer_rango(path: str, primero: int, ultimo: int):
+    with open(path, "rb") as f:
+        f.seek(primero)
+        restante = ultimo - primero + 1
+        while restante > 0:
+            bloque = f.read(min(TAMANO_BLOQUE_UPLOAD, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+
+
+def respuesta_archivo(
+    request: Request,
+    path: str,
+    nombre: str,
+    media_type: str,
+    validadores: Validadores
+) -> Response:
+    """
+    Respuesta de descarga con ETag y Last-Modified ya calculados: 304 si el
+    cliente tiene la misma versión (If-None-Match / If-Modified-Since), 206
+    con el rango pedido (Range, respetando If-Range) o el archivo completo.
+    """
+    etag = f'"{validadores.etag}"'
+    ultima_modificacion = format_datetime(validadores.modificado, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": ultima_modificacion,
+        "Cache-Control": CACHE_CONTROL_DESCARGA,
+        "Accept-Ranges": "bytes",
+    }
+
+    si_no_coincide = request.headers.get("if-none-match")
+    si_modificado = request.headers.get("if-modified-since")
+    if si_no_coincide is not None:
+        if _coincide_etag(si_no_coincide, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    elif si_modificado is not None:
+        try:
+            if validadores.modificado <= parsedate_to_datetime(si_modificado):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    rango = request.headers.get("range")
+    si_rango = request.headers.get("if-range")
+    # If-Range: el rango solo vale para la misma versión (ETag fuerte o fecha exacta)
+    if rango and (si_rango is None or si_rango.strip() in (etag, ultima_modificacion)):
+        limites = _rango_pedido(rango, validadores.tamano)
+        if limites is not None:
+            primero, ultimo = limites
+            headers.update({
+                "Content-Range": f"bytes {primero}-{ultimo}/{validadores.tamano}",
+                "Content-Length": str(ultimo - primero + 1),
+                "Content-Disposition": _content_disposition(nombre),
+            })
+            return StreamingResponse(
+                _leer_rango(path, primero, ultimo),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers=headers
+            )
+
+    return FileResponse(path=path, filename=nombre, media_type=media_type, headers=headers)
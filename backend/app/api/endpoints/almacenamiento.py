@@ -0,0 +1,56 @@
+"""
+Endpoints para el almacenamiento de archivos (UPLOAD_DIR)
+"""
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.api.deps import get_current_admin_user
+from app.api import schemas
+from app.models.models import Usuario
+from app.services import almacenamiento
+
+router = APIRouter()
+
+
+def _mb_a_bytes(mb: int):
+    return mb * 1024 * 1024 if mb else None
+
+
+@router.get("/uso", response_model=schemas.UsoAlmacenamiento)
+async def uso_almacenamiento(
+    current_user: Usuario = Depends(get_current_admin_user)
+):
+    """
+    Archivos y bytes ocupados por área: Excel de asientos, temporales, caché
+    de lecturas y períodos mensuales (solo administradores)
+    """
+    areas = await run_in_threadpool(almacenamiento.calcular_uso)
+    return schemas.UsoAlmacenamiento(
+        areas=areas,
+        total_archivos=sum(area["archivos"] for area in areas),
+        total_bytes=sum(area["bytes"] for area in areas),
+        salidas_max_bytes=_mb_a_bytes(settings.ALMACENAMIENTO_SALIDAS_MAX_MB),
+        salidas_ttl_horas=settings.ALMACENAMIENTO_SALIDAS_TTL_HORAS or None,
+        lecturas_max_bytes=_mb_a_bytes(settings.CACHE_LECTURAS_MAX_MB)
+    )
+
+
+@router.post("/barrer", response_model=schemas.ResultadoBarrido)
+async def barrer_almacenamiento(
+    current_user: Usuario = Depends(get_current_admin_user)
+):
+    """
+    Ejecutar ahora el barrido de almacenamiento (vencimiento, límite de
+    tamaño y temporales abandonados) (solo administradores)
+    """
+    try:
+        resultado = await run_in_threadpool(almacenamiento.barrer)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en el barrido: {str(e)}")
+
+    if resultado is None:
+        raise HTTPException(status_code=409, detail="Hay un barrido de almacenamiento en curso")
+    return schemas.ResultadoBarrido(**asdict(resultado))
@@ -1,37 +1,94 @@
 """
 Endpoints para configuración de diccionarios
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
-import pandas as pd
+from typing import List, Optional
 import os
+import logging
 from datetime import datetime
 
 from app.core.database import get_db
-from app.core.config import settings
-from app.api.deps import get_current_user, validate_excel_file
+from app.api.deps import get_current_user, guardar_upload, paginar_keyset, validate_excel_file
 from app.api import schemas
 from app.models.models import ProductoCuenta, ComboSalto, Usuario
+from app.services.almacenamiento import ruta_temporal
+from app.services.busqueda import MODO_CONTIENE, MODO_PREFIJO, filtro_texto
+from app.services.diccionarios import incrementar_version
+from app.services.importacion import importar_combos, importar_productos, resumen
 from app.utils.excel_reader import read_excel_file
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+ORDEN_NOMBRE = "nombre"
+ORDEN_FECHA = "fecha"
+
+
+def _listar_diccionario(
+    db: Session,
+    response: Response,
+    modelo,
+    columna_nombre,
+    columnas_busqueda: list,
+    activo: Optional[bool],
+    buscar: Optional[str],
+    modo: str,
+    orden: str,
+    direccion: str,
+    limit: int,
+    cursor: Optional[str],
+    skip: int
+) -> list:
+    """
+    Página de un diccionario filtrada en la base de datos, con el total de
+    filas que cumplen los filtros en el header X-Total y el cursor de la
+    página siguiente en X-Siguiente-Cursor
+    """
+    query = db.query(modelo)
+    if activo is not None:
+        query = query.filter(modelo.activo == activo)
+    if buscar and buscar.strip():
+        query = query.filter(filtro_texto(db, columnas_busqueda, buscar, modo))
+
+    total = query.with_entities(func.count(modelo.id)).scalar()
+
+    # "fecha" ordena por id: crece con created_at y es único, como el nombre
+    columna = columna_nombre if orden == ORDEN_NOMBRE else modelo.id
+    filas, siguiente = paginar_keyset(
+        query, columna, limit, cursor, descendente=direccion == "desc", skip=skip
+    )
+
+    response.headers["X-Total"] = str(total)
+    if siguiente:
+        response.headers["X-Siguiente-Cursor"] = siguiente
+    return filas
+
+
 # --- Endpoints para ProductoCuenta ---
 @router.get("/productos-cuentas", response_model=List[schemas.ProductoCuenta])
 def listar_productos_cuentas(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
     activo: bool = None,
+    buscar: Optional[str] = Query(None, max_length=255, description="Texto en producto o cuenta contable"),
+    modo: str = Query(MODO_CONTIENE, pattern=f"^({MODO_CONTIENE}|{MODO_PREFIJO})$"),
+    orden: str = Query(ORDEN_FECHA, pattern=f"^({ORDEN_NOMBRE}|{ORDEN_FECHA})$"),
+    direccion: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Usar cursor"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    """Listar productos y sus cuentas contables"""
-    query = db.query(ProductoCuenta)
-    if activo is not None:
-        query = query.filter(ProductoCuenta.activo == activo)
-    return query.offset(skip).limit(limit).all()
+    """Listar productos y sus cuentas contables, con búsqueda y paginación por cursor"""
+    return _listar_diccionario(
+        db, response, ProductoCuenta, ProductoCuenta.producto,
+        [ProductoCuenta.producto, ProductoCuenta.cuenta_contable],
+        activo, buscar, modo, orden, direccion, limit, cursor, skip
+    )
 
 
 @router.post("/productos-cuentas", response_model=schemas.ProductoCuenta)
@@ -50,6 +107,7 @@ def crear_producto_cuenta(
 
     db_producto = ProductoCuenta(**producto_cuenta.dict())
     db.add(db_producto)
+    incrementar_version(db)
     db.commit()
     db.refresh(db_producto)
     return db_producto
@@ -71,6 +129,7 @@ def actualizar_producto_cuenta(
     for field, value in update_data.items():
         setattr(db_producto, field, value)
 
+    incrementar_version(db)
     db.commit()
     db.refresh(db_producto)
     return db_producto
@@ -88,6 +147,7 @@ def eliminar_producto_cuenta(
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     db_producto.activo = False
+    incrementar_version(db)
     db.commit()
     return schemas.Message(message="Producto desactivado exitosamente")
 
@@ -104,12 +164,9 @@ async def importar_productos_cuentas(
         validate_excel_file(archivo)
 
         # Guardar archivo temporal
-        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-        temp_path = os.path.join(settings.UPLOAD_DIR, f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{archivo.filename}")
+        temp_path = ruta_temporal(f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{archivo.filename}")
 
-        with open(temp_path, "wb") as f:
-            content = await archivo.read()
-            f.write(content)
+        await guardar_upload(archivo, temp_path)
 
         # Leer Excel
         df = read_excel_file(temp_path)
@@ -122,59 +179,16 @@ async def importar_productos_cuentas(
         col_names = ['Producto', 'Asiento'] + [f'Extra_{i}' for i in range(df.shape[1] - 2)]
         df.columns = col_names[:df.shape[1]]
 
-        # Importar con commits individuales para mayor confiabilidad
-        count_procesados = 0
-        count_guardados = 0
-        errores = []
+        # Importar en lotes (una consulta de existentes y upserts por lote)
+        resultado = importar_productos(db, df)
+        for error in resultado.errores:
+            logger.warning(f"Importación de productos - {error}")
 
-        for idx, row in df.iterrows():
-            try:
-                raw_producto = row['Producto']
-                raw_cuenta = row['Asiento']
-
-                if pd.isna(raw_producto) or pd.isna(raw_cuenta):
-                    continue
-
-                producto = str(raw_producto).strip()
-                cuenta = str(raw_cuenta).strip()
-
-                if not producto or not cuenta or producto.lower() == 'nan' or cuenta.lower() == 'nan':
-                    continue
-
-                count_procesados += 1
-
-                # Buscar si existe
-                existe = db.query(ProductoCuenta).filter(
-                    ProductoCuenta.producto == producto
-                ).first()
-
-                if existe:
-                    existe.cuenta_contable = cuenta
-                    existe.activo = True
-                else:
-                    nuevo = ProductoCuenta(
-                        producto=producto,
-                        cuenta_contable=cuenta,
-                        activo=True
-                    )
-                    db.add(nuevo)
-
-                # Commit individual - más lento pero confiable
-                try:
-                    db.commit()
-                    count_guardados += 1
-                except Exception as commit_error:
-                    db.rollback()
-                    errores.append(f"Fila {idx} ({producto}): {str(commit_error)}")
-                    continue
-
-            except Exception as e:
-                errores.append(f"Fila {idx}: {str(e)}")
-                continue
+        if resultado.insertados or resultado.actualizados:
+            incrementar_version(db)
+            db.commit()
 
-        mensaje = f"{count_guardados} productos guardados exitosamente de {count_procesados} procesados"
-        if errores:
-            mensaje += f" ({len(errores)} errores)"
+        mensaje = resumen(resultado, "productos")
 
         return schemas.Message(message=mensaje)
 
@@ -191,21 +205,28 @@ async def importar_productos_cuentas(
             try:
                 os.remove(temp_path)
             except Exception as e:
-                print(f"[WARNING] No se pudo eliminar archivo temporal: {e}")
+                logger.warning(f"No se pudo eliminar archivo temporal: {e}")
 
 
 # --- Endpoints para ComboSalto ---
 @router.get("/combos-salto", response_model=List[schemas.ComboSalto])
 def listar_combos_salto(
+    response: Response,
     activo: bool = None,
+    buscar: Optional[str] = Query(None, max_length=255, description="Texto en el combo"),
+    modo: str = Query(MODO_CONTIENE, pattern=f"^({MODO_CONTIENE}|{MODO_PREFIJO})$"),
+    orden: str = Query(ORDEN_FECHA, pattern=f"^({ORDEN_NOMBRE}|{ORDEN_FECHA})$"),
+    direccion: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    """Listar combos y sus reglas de salto"""
-    query = db.query(ComboSalto)
-    if activo is not None:
-        query = query.filter(ComboSalto.activo == activo)
-    return query.all()
+    """Listar combos y sus reglas de salto, con búsqueda y paginación por cursor"""
+    return _listar_diccionario(
+        db, response, ComboSalto, ComboSalto.combo, [ComboSalto.combo],
+        activo, buscar, modo, orden, direccion, limit, cursor, 0
+    )
 
 
 @router.post("/combos-salto", response_model=schemas.ComboSalto)
@@ -221,6 +242,7 @@ def crear_combo_salto(
 
     db_combo = ComboSalto(**combo_salto.dict())
     db.add(db_combo)
+    incrementar_version(db)
     db.commit()
     db.refresh(db_combo)
     return db_combo
@@ -242,6 +264,7 @@ def actualizar_combo_salto(
     for field, value in update_data.items():
         setattr(db_combo, field, value)
 
+    incrementar_version(db)
     db.commit()
     db.refresh(db_combo)
     return db_combo
@@ -259,6 +282,7 @@ def eliminar_combo_salto(
         raise HTTPException(status_code=404, detail="Combo no encontrado")
 
     db_combo.activo = False
+    incrementar_version(db)
     db.commit()
     return schemas.Message(message="Combo desactivado exitosamente")
 
@@ -274,12 +298,9 @@ async def importar_combos_salto(
     try:
         validate_excel_file(archivo)
 
-        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-        temp_path = os.path.join(settings.UPLOAD_DIR, f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{archivo.filename}")
+        temp_path = ruta_temporal(f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{archivo.filename}")
 
-        with open(temp_path, "wb") as f:
-            content = await archivo.read()
-            f.write(content)
+        await guardar_upload(archivo, temp_path)
 
         df = read_excel_file(temp_path)
 
@@ -289,58 +310,16 @@ async def importar_combos_salto(
         col_names = ['Combo', 'Salto'] + [f'Extra_{i}' for i in range(df.shape[1] - 2)]
         df.columns = col_names[:df.shape[1]]
 
-        count_procesados = 0
-        count_guardados = 0
-        errores = []
+        # Importar en lotes (una consulta de existentes y upserts por lote)
+        resultado = importar_combos(db, df)
+        for error in resultado.errores:
+            logger.warning(f"Importación de combos - {error}")
 
-        for idx, row in df.iterrows():
-            try:
-                raw_combo = row['Combo']
-                raw_salto = row['Salto']
-
-                if pd.isna(raw_combo) or pd.isna(raw_salto):
-                    continue
-
-                combo = str(raw_combo).strip()
-                if not combo or combo.lower() == 'nan':
-                    continue
-
-                try:
-                    salto = int(raw_salto)
-                except (ValueError, TypeError):
-                    try:
-                        salto = int(float(raw_salto))
-                    except (ValueError, TypeError):
-                        errores.append(f"Fila {idx}: salto inválido '{raw_salto}'")
-                        continue
-
-                count_procesados += 1
-
-                existe = db.query(ComboSalto).filter(ComboSalto.combo == combo).first()
-
-                if existe:
-                    existe.salto = salto
-                    existe.activo = True
-                else:
-                    nuevo = ComboSalto(combo=combo, salto=salto, activo=True)
-                    db.add(nuevo)
-
-                # Commit individual - más lento pero confiable
-                try:
-                    db.commit()
-                    count_guardados += 1
-                except Exception as commit_error:
-                    db.rollback()
-                    errores.append(f"Fila {idx} ({combo}): {str(commit_error)}")
-                    continue
-
-            except Exception as e:
-                errores.append(f"Fila {idx}: {str(e)}")
-                continue
+        if resultado.insertados or resultado.actualizados:
+            incrementar_version(db)
+            db.commit()
 
-        mensaje = f"{count_guardados} combos guardados exitosamente de {count_procesados} procesados"
-        if errores:
-            mensaje += f" ({len(errores)} errores)"
+        mensaje = resumen(resultado, "combos")
 
         return schemas.Message(message=mensaje)
 
@@ -357,4 +336,4 @@ async def importar_combos_salto(
             try:
                 os.remove(temp_path)
             except Exception as e:
-                print(f"[WARNING] No se pudo eliminar archivo temporal: {e}")
+                logger.warning(f"No se pudo eliminar archivo temporal: {e}")
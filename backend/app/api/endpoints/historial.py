@@ -1,31 +1,66 @@
 """
 Endpoints para historial de procesamientos
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, load_only
+from typing import List, Optional
+import json
+import uuid
+from datetime import datetime
 
 from app.core.database import get_db
-from app.api.deps import get_current_user
+from app.core.config import settings
+from app.api.deps import get_current_user, paginar_keyset
 from app.api import schemas
 from app.models.models import ProcesamientoHistorial, Usuario
+from app.services import jobs
+from app.services.almacenamiento import borrar_salida
+from app.services.cache_lecturas import clave_lectura, existe_lectura
+from app.services.cache_resultados import buscar_resultado, clave_resultado, huella_lote
+from app.services.diccionarios import obtener_diccionarios
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.HistorialItem])
+# Columnas del listado: los JSON grandes (códigos faltantes, métricas,
+# detalle de archivos) no se leen hasta pedir el detalle
+_COLUMNAS_RESUMEN = [
+    getattr(ProcesamientoHistorial, campo) for campo in schemas.HistorialResumen.model_fields
+]
+
+
+@router.get("/", response_model=List[schemas.HistorialResumen])
 def listar_historial(
-    skip: int = 0,
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Valor de X-Siguiente-Cursor de la página anterior"),
+    mes: Optional[str] = Query(None, pattern=r'^(0[1-9]|1[0-2])$'),
+    estado: Optional[str] = None,
+    procesado_por: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True, description="Usar cursor"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Obtener historial de procesamientos
+    Obtener historial de procesamientos, del más reciente al más antiguo.
+    Si hay más resultados, el header X-Siguiente-Cursor trae el cursor de la
+    página siguiente. El detalle completo se obtiene con GET /historial/{id}.
     """
-    historial = db.query(ProcesamientoHistorial).order_by(
-        ProcesamientoHistorial.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    query = db.query(ProcesamientoHistorial).options(load_only(*_COLUMNAS_RESUMEN))
+    if mes:
+        query = query.filter(ProcesamientoHistorial.mes == mes)
+    if estado:
+        query = query.filter(ProcesamientoHistorial.estado == estado)
+    if procesado_por:
+        query = query.filter(ProcesamientoHistorial.procesado_por == procesado_por)
+
+    # Los ids crecen con created_at: ordenar por id usa la clave primaria (o
+    # los índices compuestos de cada filtro) en lugar de ordenar la tabla
+    historial, siguiente = paginar_keyset(
+        query, ProcesamientoHistorial.id, limit, cursor, descendente=True, skip=skip
+    )
+    if siguiente:
+        response.headers["X-Siguiente-Cursor"] = siguiente
 
     return historial
 
@@ -49,6 +84,133 @@ def obtener_historial_detalle(
     return historial
 
 
+@router.post("/{historial_id}/reprocesar", response_model=schemas.TrabajoEnviado, status_code=202)
+def reprocesar_historial(
+    historial_id: int,
+    parametros: Optional[schemas.ReprocesarRequest] = None,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Volver a generar los asientos de un procesamiento con los diccionarios
+    actuales, sin subir de nuevo los archivos: las boletas se toman de la
+    caché de lecturas. Mes, subdiario y comprobante inicial son opcionales
+    (por defecto, los del original). Se registra como un historial nuevo.
+    """
+    original = db.query(ProcesamientoHistorial).filter(
+        ProcesamientoHistorial.id == historial_id
+    ).first()
+
+    if not original:
+        raise HTTPException(status_code=404, detail="Historial no encontrado")
+
+    if original.periodo_id is not None:
+        raise HTTPException(
+            status_code=409,
+            detail="Los envíos de un período mensual no se reprocesan por separado"
+        )
+
+    if not original.archivos_entrada:
+        raise HTTPException(
+            status_code=409,
+            detail="El procesamiento no tiene lecturas guardadas; vuelva a subir el archivo"
+        )
+
+    parametros = parametros or schemas.ReprocesarRequest()
+    # Solo los omitidos (None) se toman del original
+    mes = parametros.mes if parametros.mes is not None else original.mes
+    subdiario_inicial = (
+        parametros.subdiario_inicial if parametros.subdiario_inicial is not None else original.subdiario_inicial
+    )
+    numero_comprobante_inicial = (
+        parametros.numero_comprobante_inicial
+        if parametros.numero_comprobante_inicial is not None
+        else original.numero_comprobante_inicial
+    )
+
+    diccionarios = obtener_diccionarios(db)
+
+    # Las lecturas dependen de los combos: si cambiaron (o la lectura venció)
+    # hay que volver a leer el archivo
+    archivos = [(archivo["nombre"], archivo["sha256"]) for archivo in json.loads(original.archivos_entrada)]
+    claves = [clave_lectura(sha256, settings.PROCESAMIENTO_ENGINE, diccionarios.combos) for _, sha256 in archivos]
+    faltantes = [nombre for (nombre, _), clave in zip(archivos, claves) if not existe_lectura(clave)]
+    if faltantes:
+        raise HTTPException(
+            status_code=409,
+            detail=f"La lectura de {', '.join(faltantes)} ya no está disponible (venció o cambiaron los combos); vuelva a subir el archivo"
+        )
+
+    # Misma caché de resultados que /procesar y /procesar-lote
+    lote = len(archivos) > 1 or original.detalle_archivos is not None
+    cache_key = clave_resultado(
+        huella_lote(archivos) if lote else archivos[0][1],
+        mes,
+        subdiario_inicial,
+        numero_comprobante_inicial,
+        diccionarios.version
+    )
+    existente = buscar_resultado(db, cache_key)
+    if existente is not None:
+        return schemas.TrabajoEnviado(
+            job_id=existente.job_id,
+            historial_id=existente.id,
+            estado=existente.estado,
+            progreso=100,
+            estado_url=f"/api/v1/procesamiento/jobs/{existente.job_id}",
+            desde_cache=True
+        )
+
+    job_id = uuid.uuid4().hex
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"asientos_{timestamp}_{job_id[:8]}.xlsx"
+
+    historial = ProcesamientoHistorial(
+        nombre_archivo=original.nombre_archivo,
+        mes=mes,
+        subdiario_inicial=subdiario_inicial,
+        numero_comprobante_inicial=numero_comprobante_inicial,
+        total_registros_procesados=0,
+        total_asientos_generados=0,
+        estado=jobs.ESTADO_PENDIENTE,
+        progreso=0,
+        job_id=job_id,
+        cache_key=cache_key,
+        archivos_entrada=original.archivos_entrada,
+        reprocesado_de=original.id,
+        procesado_por=current_user.email
+    )
+    db.add(historial)
+    db.commit()
+    db.refresh(historial)
+
+    try:
+        jobs.enviar_reproceso(
+            historial.id,
+            archivos=[(nombre, clave) for (nombre, _), clave in zip(archivos, claves)],
+            output_filename=output_filename,
+            mes=mes,
+            subdiario_inicial=subdiario_inicial,
+            numero_comprobante_inicial=numero_comprobante_inicial,
+            diccionario_cuentas=diccionarios.cuentas,
+            diccionario_combos=diccionarios.combos,
+            lote=lote
+        )
+    except Exception as e:
+        historial.estado = jobs.ESTADO_ERROR
+        historial.mensaje_error = str(e)
+        db.commit()
+        raise HTTPException(status_code=500, detail=f"Error al reprocesar: {str(e)}")
+
+    return schemas.TrabajoEnviado(
+        job_id=job_id,
+        historial_id=historial.id,
+        estado=historial.estado,
+        progreso=historial.progreso,
+        estado_url=f"/api/v1/procesamiento/jobs/{job_id}"
+    )
+
+
 @router.delete("/{historial_id}", response_model=schemas.Message)
 def eliminar_historial(
     historial_id: int,
@@ -56,7 +218,7 @@ def eliminar_historial(
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Eliminar registro de historial
+    Eliminar registro de historial y su Excel de asientos
     """
     historial = db.query(ProcesamientoHistorial).filter(
         ProcesamientoHistorial.id == historial_id
@@ -65,7 +227,9 @@ def eliminar_historial(
     if not historial:
         raise HTTPException(status_code=404, detail="Historial no encontrado")
 
+    archivo_salida = historial.archivo_salida
     db.delete(historial)
     db.commit()
+    borrar_salida(archivo_salida)
 
     return schemas.Message(message="Historial eliminado exitosamente")
@@ -0,0 +1,246 @@
+"""
+Endpoints para períodos mensuales incrementales
+"""
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List
+import json
+import os
+import uuid
+from datetime import datetime
+
+from app.core.database import get_db
+from app.core.config import settings
+from app.api.deps import validate_excel_file, get_current_user, guardar_upload, respuesta_archivo
+from app.api import schemas
+from app.models.models import PeriodoMensual, ProcesamientoHistorial, Usuario
+from app.services import jobs, periodos
+from app.services.almacenamiento import marcar_uso_archivo, ruta_temporal
+from app.services.cache_lecturas import clave_lectura
+from app.services.descargas import validadores_por_stat
+from app.services.diccionarios import obtener_diccionarios
+
+router = APIRouter()
+
+
+def _obtener_periodo(db: Session, periodo_id: int) -> PeriodoMensual:
+    periodo = db.query(PeriodoMensual).filter(PeriodoMensual.id == periodo_id).first()
+    if not periodo:
+        raise HTTPException(status_code=404, detail="Período no encontrado")
+    return periodo
+
+
+@router.get("/", response_model=List[schemas.PeriodoItem])
+def listar_periodos(
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Obtener los períodos mensuales
+    """
+    return db.query(PeriodoMensual).order_by(
+        PeriodoMensual.anio.desc(), PeriodoMensual.mes.desc(), PeriodoMensual.id.desc()
+    ).offset(skip).limit(limit).all()
+
+
+@router.post("/", response_model=schemas.PeriodoItem, status_code=201)
+def crear_periodo(
+    periodo_in: schemas.PeriodoCreate,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Abrir un período mensual. Los envíos diarios del mes se agregan a él con
+    numeración continua desde numero_comprobante_inicial.
+    """
+    abierto = db.query(PeriodoMensual).filter(
+        PeriodoMensual.anio == periodo_in.anio,
+        PeriodoMensual.mes == periodo_in.mes,
+        PeriodoMensual.estado == periodos.ESTADO_ABIERTO
+    ).first()
+    if abierto:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Ya hay un período abierto para {periodo_in.mes}/{periodo_in.anio} (id {abierto.id})"
+        )
+
+    periodo = PeriodoMensual(
+        **periodo_in.dict(),
+        subdiario_siguiente=periodo_in.subdiario_inicial,
+        numero_siguiente=periodo_in.numero_comprobante_inicial,
+        total_boletas=0,
+        total_asientos=0,
+        estado=periodos.ESTADO_ABIERTO,
+        creado_por=current_user.email
+    )
+    db.add(periodo)
+    db.commit()
+    db.refresh(periodo)
+    return periodo
+
+
+@router.get("/{periodo_id}", response_model=schemas.PeriodoItem)
+def obtener_periodo(
+    periodo_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Obtener detalle de un período
+    """
+    return _obtener_periodo(db, periodo_id)
+
+
+@router.post("/{periodo_id}/cerrar", response_model=schemas.PeriodoItem)
+def cerrar_periodo(
+    periodo_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Cerrar un período: no admite más envíos, el Excel del mes sigue disponible
+    """
+    periodo = _obtener_periodo(db, periodo_id)
+    periodo.estado = periodos.ESTADO_CERRADO
+    db.commit()
+    db.refresh(periodo)
+    return periodo
+
+
+@router.post("/{periodo_id}/procesar", response_model=schemas.TrabajoEnviado, status_code=202)
+async def procesar_en_periodo(
+    periodo_id: int,
+    archivo: UploadFile = File(..., description="Archivo de ventas Excel"),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Agregar un archivo de ventas al período en segundo plano. Solo se procesan
+    las boletas (serie-número) que el período todavía no tiene, numeradas a
+    continuación de la última. Los envíos de un período se procesan de a uno.
+    """
+    periodo = _obtener_periodo(db, periodo_id)
+    if periodo.estado != periodos.ESTADO_ABIERTO:
+        raise HTTPException(status_code=409, detail="El período está cerrado")
+
+    validate_excel_file(archivo)
+
+    job_id = uuid.uuid4().hex
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    input_path = ruta_temporal(f"ventas_{timestamp}_{job_id[:8]}_{archivo.filename}")
+    output_filename = f"asientos_{timestamp}_{job_id[:8]}.xlsx"
+
+    try:
+        archivo_subido = await guardar_upload(archivo, input_path)
+        diccionarios = obtener_diccionarios(db)
+        clave = clave_lectura(archivo_subido.sha256, settings.PROCESAMIENTO_ENGINE, diccionarios.combos)
+
+        # Bloquear el período hasta el commit (la fila en PostgreSQL, la
+        # escritura en SQLite): dos envíos simultáneos no pueden pasar ambos
+        # la comprobación de procesamiento en curso
+        db.query(PeriodoMensual).filter(PeriodoMensual.id == periodo_id).update(
+            {PeriodoMensual.updated_at: func.now()}, synchronize_session=False
+        )
+        periodo = db.query(PeriodoMensual).filter(PeriodoMensual.id == periodo_id).populate_existing().first()
+        if periodo.estado != periodos.ESTADO_ABIERTO:
+            raise HTTPException(status_code=409, detail="El período está cerrado")
+
+        # Los trabajos interrumpidos por un reinicio se marcan con error al
+        # iniciar (jobs.reconciliar_trabajos): los que quedan están en curso
+        en_curso = db.query(ProcesamientoHistorial.id).filter(
+            ProcesamientoHistorial.periodo_id == periodo_id,
+            ProcesamientoHistorial.estado.in_([jobs.ESTADO_PENDIENTE, jobs.ESTADO_PROCESANDO])
+        ).first()
+        if en_curso:
+            raise HTTPException(
+                status_code=409,
+                detail=f"El período tiene un procesamiento en curso (historial {en_curso.id})"
+            )
+
+        historial = ProcesamientoHistorial(
+            nombre_archivo=archivo.filename,
+            mes=periodo.mes,
+            subdiario_inicial=periodo.subdiario_siguiente,
+            numero_comprobante_inicial=periodo.numero_siguiente,
+            total_registros_procesados=0,
+            total_asientos_generados=0,
+            estado=jobs.ESTADO_PENDIENTE,
+            progreso=0,
+            job_id=job_id,
+            archivos_entrada=json.dumps(
+                [{"nombre": archivo.filename, "sha256": archivo_subido.sha256}], ensure_ascii=False
+            ),
+            periodo_id=periodo_id,
+            procesado_por=current_user.email
+        )
+        db.add(historial)
+        db.commit()
+        db.refresh(historial)
+
+    except HTTPException:
+        db.rollback()
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        raise
+    except Exception as e:
+        db.rollback()
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        raise HTTPException(status_code=500, detail=f"Error al procesar archivo: {str(e)}")
+
+    try:
+        jobs.enviar_incremental(
+            historial.id,
+            periodo_id=periodo_id,
+            input_path=input_path,
+            output_filename=output_filename,
+            diccionario_cuentas=diccionarios.cuentas,
+            diccionario_combos=diccionarios.combos,
+            clave_lectura=clave
+        )
+    except Exception as e:
+        historial.estado = jobs.ESTADO_ERROR
+        historial.mensaje_error = str(e)
+        db.commit()
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        raise HTTPException(status_code=500, detail=f"Error al procesar archivo: {str(e)}")
+
+    return schemas.TrabajoEnviado(
+        job_id=job_id,
+        historial_id=historial.id,
+        estado=historial.estado,
+        progreso=historial.progreso,
+        estado_url=f"/api/v1/procesamiento/jobs/{job_id}"
+    )
+
+
+@router.get("/{periodo_id}/descargar")
+async def descargar_periodo(
+    periodo_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Descargar el Excel del mes con los asientos de todos los envíos del período
+    """
+    periodo = _obtener_periodo(db, periodo_id)
+
+    archivo_path = await run_in_threadpool(periodos.salida_mensual, periodo)
+    if archivo_path is None:
+        raise HTTPException(status_code=404, detail="El período todavía no tiene asientos")
+    marcar_uso_archivo(archivo_path)
+
+    # El Excel del mes cambia al llegar tramos: validadores por tamaño y fecha
+    return respuesta_archivo(
+        request,
+        archivo_path,
+        f"asientos_{periodo.anio}{periodo.mes}.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        validadores_por_stat(archivo_path)
+    )
@@ -1,23 +1,58 @@
 """
 Endpoints para procesamiento de archivos de ventas
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from typing import List
 import os
+import re
 import json
+import shutil
+import uuid
 from datetime import datetime
 
 from app.core.database import get_db
 from app.core.config import settings
-from app.api.deps import validate_excel_file, get_current_user
+from app.api.deps import validate_excel_file, get_current_user, guardar_upload, extraer_zip_ventas, respuesta_archivo
 from app.api import schemas
-from app.models.models import ProcesamientoHistorial, ProductoCuenta, ComboSalto, Usuario
-from app.services.procesamiento_service import ProcesamientoService
+from app.models.models import ProcesamientoHistorial, Usuario
+from app.services import jobs
+from app.services.almacenamiento import marcar_descarga, ruta_absoluta, ruta_temporal
+from app.services.cache_lecturas import clave_lectura
+from app.services.cache_resultados import buscar_resultado, clave_resultado, huella_lote
+from app.services.descargas import obtener_zip, ruta_zip, validadores_guardados
+from app.services.diccionarios import obtener_diccionarios
 
 router = APIRouter()
 
 
-@router.post("/procesar", response_model=schemas.ProcesamientoResponse)
+def _registrar_error_envio(
+    db: Session,
+    nombre_archivo: str,
+    mes: str,
+    subdiario_inicial: int,
+    numero_comprobante_inicial: int,
+    mensaje: str,
+    current_user: Usuario
+):
+    """Guardar en el historial un envío que falló antes de llegar al pool"""
+    db.rollback()
+    db.add(ProcesamientoHistorial(
+        nombre_archivo=(nombre_archivo or "")[:255],
+        mes=mes,
+        subdiario_inicial=subdiario_inicial,
+        numero_comprobante_inicial=numero_comprobante_inicial,
+        total_registros_procesados=0,
+        total_asientos_generados=0,
+        estado=jobs.ESTADO_ERROR,
+        mensaje_error=mensaje,
+        procesado_por=current_user.email if current_user else None
+    ))
+    db.commit()
+
+
+@router.post("/procesar", response_model=schemas.TrabajoEnviado, status_code=202)
 async def procesar_archivo_ventas(
     archivo: UploadFile = File(..., description="Archivo de ventas Excel"),
     mes: str = Form(..., min_length=2, max_length=2),
@@ -27,106 +62,320 @@ async def procesar_archivo_ventas(
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Procesar archivo de ventas y generar asientos contables para Concar
+    Enviar archivo de ventas a procesar en segundo plano.
+    Devuelve el id del trabajo para consultar su estado en /jobs/{job_id}
     """
+    input_path = None
     try:
         # Validar el archivo recibido
         validate_excel_file(archivo)
 
-        # Crear directorio de uploads si no existe
-        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-
         # Guardar archivo temporal
+        job_id = uuid.uuid4().hex
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        input_filename = f"ventas_{timestamp}_{archivo.filename}"
-        input_path = os.path.join(settings.UPLOAD_DIR, input_filename)
+        input_filename = f"ventas_{timestamp}_{job_id[:8]}_{archivo.filename}"
+        input_path = ruta_temporal(input_filename)
+        output_filename = f"asientos_{timestamp}_{job_id[:8]}.xlsx"
 
-        with open(input_path, "wb") as f:
-            content = await archivo.read()
-            f.write(content)
+        archivo_subido = await guardar_upload(archivo, input_path)
 
-        # Obtener diccionarios activos de la base de datos
-        productos_cuentas = db.query(ProductoCuenta).filter(ProductoCuenta.activo == True).all()
-        combos_salto = db.query(ComboSalto).filter(ComboSalto.activo == True).all()
+        # Obtener diccionarios activos (caché por versión)
+        diccionarios = obtener_diccionarios(db)
 
-        diccionario_cuentas = {pc.producto: pc.cuenta_contable for pc in productos_cuentas}
-        diccionario_combos = {cs.combo: cs.salto for cs in combos_salto}
-
-        # Procesar archivo
-        servicio = ProcesamientoService(diccionario_cuentas, diccionario_combos)
-        df_resultado, codigos_faltantes = servicio.procesar_archivo_ventas(
-            input_path,
+        # Reutilizar el resultado si ya se procesó el mismo archivo con los mismos parámetros
+        cache_key = clave_resultado(
+            archivo_subido.sha256,
             mes,
             subdiario_inicial,
-            numero_comprobante_inicial
+            numero_comprobante_inicial,
+            diccionarios.version
         )
+        existente = buscar_resultado(db, cache_key)
+        if existente is not None:
+            os.remove(input_path)
+            return schemas.TrabajoEnviado(
+                job_id=existente.job_id,
+                historial_id=existente.id,
+                estado=existente.estado,
+                progreso=100,
+                estado_url=f"/api/v1/procesamiento/jobs/{existente.job_id}",
+                desde_cache=True
+            )
 
-        # Guardar resultado
-        output_filename = f"asientos_{timestamp}.xlsx"
-        output_path = os.path.join(settings.UPLOAD_DIR, output_filename)
-        df_resultado.to_excel(output_path, index=False)
+        # Las boletas extraídas quedan en la caché de lecturas para los
+        # siguientes procesamientos del mismo archivo
+        clave = clave_lectura(archivo_subido.sha256, settings.PROCESAMIENTO_ENGINE, diccionarios.combos)
 
-        # Guardar en historial
+        # Registrar el trabajo en historial
         historial = ProcesamientoHistorial(
             nombre_archivo=archivo.filename,
             mes=mes,
             subdiario_inicial=subdiario_inicial,
             numero_comprobante_inicial=numero_comprobante_inicial,
-            total_registros_procesados=len(df_resultado),
-            total_asientos_generados=len(df_resultado),
-            codigos_faltantes=json.dumps(codigos_faltantes, ensure_ascii=False) if codigos_faltantes else None,
-            archivo_salida=output_filename,
-            estado="completado",
+            total_registros_procesados=0,
+            total_asientos_generados=0,
+            estado=jobs.ESTADO_PENDIENTE,
+            progreso=0,
+            job_id=job_id,
+            cache_key=cache_key,
+            archivos_entrada=json.dumps(
+                [{"nombre": archivo.filename, "sha256": archivo_subido.sha256}], ensure_ascii=False
+            ),
             procesado_por=current_user.email
         )
         db.add(historial)
         db.commit()
         db.refresh(historial)
 
-        # Limpiar archivo temporal de entrada
+    except Exception as e:
+        # Guardar error en historial
+        if input_path and os.path.exists(input_path):
+            os.remove(input_path)
+        error = e if isinstance(e, HTTPException) else HTTPException(
+            status_code=500, detail=f"Error al procesar archivo: {str(e)}"
+        )
+        _registrar_error_envio(
+            db, archivo.filename, mes, subdiario_inicial, numero_comprobante_inicial, str(error.detail), current_user
+        )
+        raise error
+
+    # Enviar al pool de procesos
+    try:
+        jobs.enviar_procesamiento(
+            historial.id,
+            input_path=input_path,
+            output_filename=output_filename,
+            mes=mes,
+            subdiario_inicial=subdiario_inicial,
+            numero_comprobante_inicial=numero_comprobante_inicial,
+            diccionario_cuentas=diccionarios.cuentas,
+            diccionario_combos=diccionarios.combos,
+            clave_lectura=clave
+        )
+    except Exception as e:
+        historial.estado = jobs.ESTADO_ERROR
+        historial.mensaje_error = str(e)
+        db.commit()
         if os.path.exists(input_path):
             os.remove(input_path)
+        raise HTTPException(status_code=500, detail=f"Error al procesar archivo: {str(e)}")
 
-        return schemas.ProcesamientoResponse(
-            id=historial.id,
-            nombre_archivo=archivo.filename,
-            total_registros_procesados=len(df_resultado),
-            total_asientos_generados=len(df_resultado),
-            codigos_faltantes=codigos_faltantes,
-            archivo_salida_url=f"/api/v1/procesamiento/descargar/{historial.id}",
-            mensaje="Procesamiento completado exitosamente"
+    return schemas.TrabajoEnviado(
+        job_id=job_id,
+        historial_id=historial.id,
+        estado=historial.estado,
+        progreso=historial.progreso,
+        estado_url=f"/api/v1/procesamiento/jobs/{job_id}"
+    )
+
+
+def _orden_natural(nombre: str):
+    """Clave de orden por nombre con los números comparados por valor (caja2 < caja10)"""
+    return [int(parte) if parte.isdigit() else parte.casefold() for parte in re.split(r"(\d+)", nombre)]
+
+
+@router.post("/procesar-lote", response_model=schemas.TrabajoEnviado, status_code=202)
+async def procesar_lote_ventas(
+    archivos: List[UploadFile] = File(..., description="Archivos de ventas Excel o .zip con ellos"),
+    mes: str = Form(..., min_length=2, max_length=2),
+    subdiario_inicial: int = Form(..., ge=1),
+    numero_comprobante_inicial: int = Form(..., ge=1, le=9999),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Enviar varios archivos de ventas (uno por caja o local, sueltos o en un
+    .zip) a procesar como un solo lote en segundo plano.
+
+    Los archivos se ordenan por nombre y sus comprobantes se numeran de forma
+    continua en ese orden desde numero_comprobante_inicial (pasando al
+    siguiente subdiario al superar 9999). Se genera un único Excel de asientos
+    y el historial guarda las estadísticas de cada archivo.
+    """
+    job_id = uuid.uuid4().hex
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    directorio = ruta_temporal(f"lote_{timestamp}_{job_id[:8]}")
+    output_filename = f"asientos_{timestamp}_{job_id[:8]}.xlsx"
+
+    try:
+        for archivo in archivos:
+            if not (archivo.filename or "").lower().endswith(".zip"):
+                validate_excel_file(archivo)
+
+        os.makedirs(directorio, exist_ok=True)
+
+        # Guardar los archivos (y extraer los .zip)
+        subidos = []
+        for archivo in archivos:
+            destino = os.path.join(directorio, f"{uuid.uuid4().hex[:8]}_{os.path.basename(archivo.filename)}")
+            archivo_subido = await guardar_upload(archivo, destino)
+            if archivo.filename.lower().endswith(".zip"):
+                subidos.extend(await run_in_threadpool(extraer_zip_ventas, destino, directorio))
+                os.remove(destino)
+            else:
+                subidos.append((archivo.filename, archivo_subido))
+
+            if len(subidos) > settings.LOTE_MAX_ARCHIVOS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El lote excede el máximo de {settings.LOTE_MAX_ARCHIVOS} archivos"
+                )
+
+        if not subidos:
+            raise HTTPException(status_code=400, detail="El lote no contiene archivos Excel (.xls o .xlsx)")
+
+        # Orden determinístico del lote: por nombre de archivo (sin la carpeta
+        # dentro del zip) y, a igual nombre, por ruta y contenido
+        subidos.sort(key=lambda item: (
+            _orden_natural(os.path.basename(item[0])), _orden_natural(item[0]), item[0], item[1].sha256
+        ))
+        nombres = [nombre for nombre, _ in subidos]
+
+        diccionarios = obtener_diccionarios(db)
+
+        # Misma caché de resultados que /procesar, con el contenido de todo el lote
+        cache_key = clave_resultado(
+            huella_lote([(nombre, subido.sha256) for nombre, subido in subidos]),
+            mes,
+            subdiario_inicial,
+            numero_comprobante_inicial,
+            diccionarios.version
         )
+        existente = buscar_resultado(db, cache_key)
+        if existente is not None:
+            shutil.rmtree(directorio, ignore_errors=True)
+            return schemas.TrabajoEnviado(
+                job_id=existente.job_id,
+                historial_id=existente.id,
+                estado=existente.estado,
+                progreso=100,
+                estado_url=f"/api/v1/procesamiento/jobs/{existente.job_id}",
+                desde_cache=True
+            )
 
-    except Exception as e:
-        # Guardar error en historial
-        historial_error = ProcesamientoHistorial(
-            nombre_archivo=archivo.filename,
+        claves = [
+            clave_lectura(subido.sha256, settings.PROCESAMIENTO_ENGINE, diccionarios.combos) for _, subido in subidos
+        ]
+
+        nombre_lote = f"Lote de {len(nombres)} archivos: {', '.join(nombres)}"
+        historial = ProcesamientoHistorial(
+            nombre_archivo=nombre_lote[:255],
             mes=mes,
             subdiario_inicial=subdiario_inicial,
             numero_comprobante_inicial=numero_comprobante_inicial,
             total_registros_procesados=0,
             total_asientos_generados=0,
-            estado="error",
-            mensaje_error=str(e),
-            procesado_por=current_user.email if current_user else None
+            estado=jobs.ESTADO_PENDIENTE,
+            progreso=0,
+            job_id=job_id,
+            cache_key=cache_key,
+            archivos_entrada=json.dumps(
+                [{"nombre": nombre, "sha256": subido.sha256} for nombre, subido in subidos], ensure_ascii=False
+            ),
+            procesado_por=current_user.email
         )
-        db.add(historial_error)
+        db.add(historial)
         db.commit()
+        db.refresh(historial)
 
-        raise HTTPException(status_code=500, detail=f"Error al procesar archivo: {str(e)}")
+    except Exception as e:
+        # Guardar error en historial
+        shutil.rmtree(directorio, ignore_errors=True)
+        error = e if isinstance(e, HTTPException) else HTTPException(
+            status_code=500, detail=f"Error al procesar lote: {str(e)}"
+        )
+        _registrar_error_envio(
+            db,
+            f"Lote de {len(archivos)} archivos: {', '.join(a.filename or '' for a in archivos)}",
+            mes,
+            subdiario_inicial,
+            numero_comprobante_inicial,
+            str(error.detail),
+            current_user
+        )
+        raise error
+
+    try:
+        jobs.enviar_lote(
+            historial.id,
+            [(nombre, subido.path, clave) for (nombre, subido), clave in zip(subidos, claves)],
+            directorio,
+            output_filename=output_filename,
+            mes=mes,
+            subdiario_inicial=subdiario_inicial,
+            numero_comprobante_inicial=numero_comprobante_inicial,
+            diccionario_cuentas=diccionarios.cuentas,
+            diccionario_combos=diccionarios.combos
+        )
+    except Exception as e:
+        historial.estado = jobs.ESTADO_ERROR
+        historial.mensaje_error = str(e)
+        db.commit()
+        shutil.rmtree(directorio, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Error al procesar lote: {str(e)}")
+
+    return schemas.TrabajoEnviado(
+        job_id=job_id,
+        historial_id=historial.id,
+        estado=historial.estado,
+        progreso=historial.progreso,
+        estado_url=f"/api/v1/procesamiento/jobs/{job_id}"
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.TrabajoEstado)
+def obtener_estado_trabajo(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Consultar estado y avance de un trabajo de procesamiento
+    """
+    historial = db.query(ProcesamientoHistorial).filter(
+        ProcesamientoHistorial.job_id == job_id
+    ).first()
+
+    if not historial:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    resultado = None
+    if historial.estado == jobs.ESTADO_COMPLETADO:
+        codigos_faltantes = json.loads(historial.codigos_faltantes) if historial.codigos_faltantes else []
+        resultado = schemas.ProcesamientoResponse(
+            id=historial.id,
+            nombre_archivo=historial.nombre_archivo,
+            total_registros_procesados=historial.total_registros_procesados,
+            total_asientos_generados=historial.total_asientos_generados,
+            codigos_faltantes=codigos_faltantes,
+            archivo_salida_url=f"/api/v1/procesamiento/descargar/{historial.id}",
+            mensaje="Procesamiento completado exitosamente",
+            detalle_archivos=json.loads(historial.detalle_archivos) if historial.detalle_archivos else None
+        )
+
+    return schemas.TrabajoEstado(
+        job_id=job_id,
+        historial_id=historial.id,
+        estado=historial.estado,
+        progreso=historial.progreso or 0,
+        mensaje_error=historial.mensaje_error,
+        resultado=resultado
+    )
 
 
 @router.get("/descargar/{historial_id}")
 async def descargar_archivo_procesado(
     historial_id: int,
+    request: Request,
+    formato: str = Query("xlsx", pattern="^(xlsx|zip)$", description="zip: el Excel comprimido en un .zip"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
-    Descargar archivo procesado
+    Descargar archivo procesado. Responde 304 si el cliente ya tiene la
+    misma versión (If-None-Match / If-Modified-Since) y admite descargas
+    parciales (Range) para reanudar archivos grandes.
     """
-    from fastapi.responses import FileResponse
-
     historial = db.query(ProcesamientoHistorial).filter(
         ProcesamientoHistorial.id == historial_id
     ).first()
@@ -137,13 +386,36 @@ async def descargar_archivo_procesado(
     if not historial.archivo_salida:
         raise HTTPException(status_code=404, detail="Archivo de salida no disponible")
 
-    archivo_path = os.path.join(settings.UPLOAD_DIR, historial.archivo_salida)
+    archivo_path = ruta_absoluta(historial.archivo_salida)
+    # El historial guarda la ruta dentro de UPLOAD_DIR (salidas/ab/asientos_...)
+    nombre = os.path.basename(historial.archivo_salida)
 
     if not os.path.exists(archivo_path):
         raise HTTPException(status_code=404, detail="Archivo no encontrado en el servidor")
 
-    return FileResponse(
-        path=archivo_path,
-        filename=historial.archivo_salida,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    marcar_descarga(db, historial)
+
+    validadores = validadores_guardados(
+        archivo_path,
+        historial.archivo_salida_etag,
+        historial.archivo_salida_tamano,
+        historial.archivo_salida_modificado
+    )
+
+    if formato == "zip":
+        validadores = await run_in_threadpool(obtener_zip, archivo_path, nombre, validadores)
+        return respuesta_archivo(
+            request,
+            ruta_zip(archivo_path),
+            f"{os.path.splitext(nombre)[0]}.zip",
+            "application/zip",
+            validadores
+        )
+
+    return respuesta_archivo(
+        request,
+        archivo_path,
+        nombre,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        validadores
     )
@@ -65,6 +65,25 @@ class ProcesamientoRequest(BaseModel):
     numero_comprobante_inicial: int = Field(..., ge=1, le=9999, description="Número de comprobante inicial")
 
 
+class ReprocesarRequest(BaseModel):
+    """Parámetros del reprocesamiento (los omitidos se toman del original)"""
+    mes: Optional[str] = Field(None, pattern=r'^\d{2}$', description="Mes en formato 01-12")
+    subdiario_inicial: Optional[int] = Field(None, ge=1, description="Número de subdiario inicial")
+    numero_comprobante_inicial: Optional[int] = Field(
+        None, ge=1, le=9999, description="Número de comprobante inicial"
+    )
+
+
+class EstadisticaArchivo(BaseModel):
+    archivo: str
+    comprobantes: int
+    anuladas: int
+    lineas: int
+    primer_comprobante: Optional[str] = None
+    ultimo_comprobante: Optional[str] = None
+    codigos_faltantes: List[str] = []
+
+
 class ProcesamientoResponse(BaseModel):
     id: int
     nombre_archivo: str
@@ -73,10 +92,30 @@ class ProcesamientoResponse(BaseModel):
     codigos_faltantes: List[str]
     archivo_salida_url: str
     mensaje: str
+    detalle_archivos: Optional[List[EstadisticaArchivo]] = None
+
+
+class TrabajoEnviado(BaseModel):
+    job_id: str
+    historial_id: int
+    estado: str
+    progreso: int
+    estado_url: str
+    desde_cache: bool = False
+
+
+class TrabajoEstado(BaseModel):
+    job_id: str
+    historial_id: int
+    estado: str
+    progreso: int
+    mensaje_error: Optional[str] = None
+    resultado: Optional[ProcesamientoResponse] = None
 
 
 # --- Schemas para Historial ---
-class HistorialItem(BaseModel):
+class HistorialResumen(BaseModel):
+    """Fila del listado: sin los JSON grandes, que quedan para el detalle"""
     id: int
     nombre_archivo: str
     mes: str
@@ -84,16 +123,53 @@ class HistorialItem(BaseModel):
     numero_comprobante_inicial: int
     total_registros_procesados: int
     total_asientos_generados: int
-    codigos_faltantes: Optional[str] = None
+    total_codigos_faltantes: Optional[int] = None
     estado: str
     mensaje_error: Optional[str] = None
     procesado_por: Optional[str] = None
+    job_id: Optional[str] = None
+    progreso: Optional[int] = None
+    reprocesado_de: Optional[int] = None
+    periodo_id: Optional[int] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class HistorialItem(HistorialResumen):
+    codigos_faltantes: Optional[str] = None
+    detalle_archivos: Optional[str] = None
+    metricas: Optional[str] = None
+
+
+# --- Schemas para Períodos mensuales ---
+class PeriodoCreate(BaseModel):
+    anio: int = Field(..., ge=2000, le=2100)
+    mes: str = Field(..., pattern=r'^(0[1-9]|1[0-2])$', description="Mes en formato 01-12")
+    subdiario_inicial: int = Field(..., ge=1, description="Número de subdiario inicial")
+    numero_comprobante_inicial: int = Field(..., ge=1, le=9999, description="Número de comprobante inicial")
+
+
+class PeriodoItem(BaseModel):
+    id: int
+    anio: int
+    mes: str
+    subdiario_inicial: int
+    numero_comprobante_inicial: int
+    subdiario_siguiente: int
+    numero_siguiente: int
+    total_boletas: int
+    total_asientos: int
+    estado: str
+    creado_por: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 # --- Schemas para Usuario ---
 class UsuarioBase(BaseModel):
     email: EmailStr
@@ -135,6 +211,32 @@ class LoginRequest(BaseModel):
     password: str
 
 
+# --- Schemas para Almacenamiento ---
+class UsoArea(BaseModel):
+    area: str  # salidas, temporales, lecturas, periodos, otros
+    archivos: int
+    bytes: int
+
+
+class UsoAlmacenamiento(BaseModel):
+    areas: List[UsoArea]
+    total_archivos: int
+    total_bytes: int
+    salidas_max_bytes: Optional[int] = None  # None = sin límite
+    salidas_ttl_horas: Optional[int] = None  # None = sin vencimiento
+    lecturas_max_bytes: Optional[int] = None
+
+
+class ResultadoBarrido(BaseModel):
+    salidas_desalojadas: int
+    temporales_eliminados: int
+    huerfanos_eliminados: int
+    tramos_recuperados: int
+    lecturas_desalojadas: int
+    bytes_liberados: int
+    duracion_segundos: float
+
+
 # --- Schemas genéricos ---
 class Message(BaseModel):
     message: str
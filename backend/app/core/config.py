@@ -13,11 +13,25 @@ class Settings(BaseSettings):
 
     # Database - PostgreSQL en producción, SQLite en desarrollo
     DATABASE_URL: str = "sqlite:///./ventas_contables.db"
+    # Pool de conexiones (por proceso: el web y cada proceso del pool de trabajos)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10  # conexiones extra por encima de DB_POOL_SIZE en picos
+    DB_POOL_TIMEOUT: int = 30  # segundos de espera por una conexión libre
+    DB_POOL_RECYCLE: int = 1800  # segundos de vida de una conexión (PostgreSQL); -1 = sin reciclar
+    DB_POOL_PRE_PING: bool = True  # validar la conexión antes de usarla (PostgreSQL)
+    # SQLite: pragmas de cada conexión. WAL permite leer mientras otro escribe;
+    # con el archivo montado en Docker, montar su directorio (usa -wal y -shm)
+    SQLITE_JOURNAL_MODE: str = "WAL"  # vacío = el modo del archivo (DELETE por defecto)
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # OFF, NORMAL, FULL o EXTRA
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # espera ante "database is locked"
 
     # Security
     SECRET_KEY: str = "change-this-secret-key-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Caché de autenticación por proceso: datos del usuario y tokens decodificados
+    AUTH_CACHE_USUARIOS_TTL_SEGUNDOS: int = 60  # 0 = consultar el usuario en cada llamada
+    AUTH_CACHE_TOKENS_MAX: int = 10000  # 0 = decodificar el token en cada llamada
 
     # CORS - acepta string separado por comas o lista
     CORS_ORIGINS: Union[List[str], str] = "http://localhost:5173,http://localhost:3000,https://ventas-contables-web.vercel.app"
@@ -34,6 +48,54 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB
     UPLOAD_DIR: str = "/tmp/uploads"
 
+    # Procesamiento
+    # Motor de extracción: "legacy" (fila por fila con df.iloc), "vectorizado" (arrays NumPy)
+    # o "streaming" (lectura perezosa por boleta, memoria acotada para archivos muy grandes)
+    PROCESAMIENTO_ENGINE: str = "vectorizado"
+    # Procesos del pool que ejecuta los trabajos en segundo plano (0 = uno por núcleo)
+    PROCESAMIENTO_WORKERS: int = 0
+    # Archivos de ventas admitidos en un lote (incluidos los de un .zip)
+    LOTE_MAX_ARCHIVOS: int = 50
+    # Escritura del Excel de asientos: "streaming" (openpyxl write_only) o "pandas" (df.to_excel)
+    SALIDA_ENGINE: str = "streaming"
+
+    # Caché de resultados (mismo archivo, parámetros y versión de diccionarios)
+    CACHE_RESULTADOS_ACTIVO: bool = True
+    CACHE_RESULTADOS_TTL_HORAS: int = 24 * 7  # 0 = sin vencimiento
+    CACHE_RESULTADOS_MAX_MB: int = 1024  # Excel reutilizables en total; 0 = sin límite de tamaño
+
+    # Caché de lecturas: boletas ya extraídas de cada archivo (mismo contenido,
+    # motor y combos) guardadas en .npz para no volver a leer el Excel
+    CACHE_LECTURAS_ACTIVO: bool = True
+    CACHE_LECTURAS_DIR: str = ""  # vacío = UPLOAD_DIR/lecturas
+    CACHE_LECTURAS_TTL_HORAS: int = 24 * 30  # desde el último uso; 0 = sin vencimiento
+    CACHE_LECTURAS_MAX_MB: int = 512  # 0 = sin límite de tamaño
+
+    # Almacenamiento de UPLOAD_DIR (app/services/almacenamiento.py)
+    ALMACENAMIENTO_BARRIDO_MINUTOS: int = 60  # 0 = sin barrido periódico
+    ALMACENAMIENTO_SALIDAS_TTL_HORAS: int = 24 * 90  # desde la última descarga; 0 = sin vencimiento
+    ALMACENAMIENTO_SALIDAS_MAX_MB: int = 10240  # 0 = sin límite de tamaño
+    ALMACENAMIENTO_TEMPORALES_HORAS: int = 24  # temporales y archivos sin historial abandonados
+
+    # Importación de diccionarios: filas escritas por transacción
+    IMPORTACION_LOTE: int = 1000
+
+    # Logging
+    LOG_NIVEL: str = "INFO"
+    # Módulos en modo traza (nivel DEBUG, detalle por línea), separados por comas,
+    # p. ej. "app.services.procesamiento_service"; vacío = sin traza
+    LOG_TRAZA: Union[List[str], str] = ""
+    # En modo traza se registra uno de cada N eventos de cada tipo
+    LOG_TRAZA_MUESTREO: int = 100
+
+    @field_validator("LOG_TRAZA", mode="before")
+    @classmethod
+    def parse_log_traza(cls, v):
+        """Convertir string separado por comas a lista de módulos"""
+        if isinstance(v, str):
+            return [modulo.strip() for modulo in v.split(",") if modulo.strip()]
+        return v
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,13 +1,144 @@
-from sqlalchemy import create_engine
+from time import perf_counter
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from .config import settings
+from .metricas import REGISTRO
 
-# Crear engine de base de datos
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+# Espera por una conexión del pool (segundos)
+_BUCKETS_ESPERA = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+ESPERA_CONEXION = REGISTRO.histograma(
+    "ventas_db_pool_espera_segundos", "Espera para obtener una conexión del pool", _BUCKETS_ESPERA
+)
+ESPERAS_AGOTADAS = REGISTRO.contador(
+    "ventas_db_pool_esperas_agotadas_total", "Pedidos de conexión que superaron DB_POOL_TIMEOUT"
 )
+ESPERAS_AGOTADAS.inc(0)
+ENTREGAS = REGISTRO.contador(
+    "ventas_db_pool_entregas_total", "Conexiones entregadas por el pool"
+)
+CONEXIONES_ABIERTAS = REGISTRO.contador(
+    "ventas_db_pool_conexiones_abiertas_total", "Conexiones nuevas abiertas con la base de datos"
+)
+
+
+class QueuePoolMedido(QueuePool):
+    """
+    QueuePool que registra cuánto tarda cada pedido de conexión (espera en
+    el pool más la apertura si hace falta una nueva), midiendo el método
+    público connect(): los eventos del pool solo avisan cuando la conexión
+    ya se entregó
+    """
+
+    def connect(self):
+        inicio = perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            ESPERAS_AGOTADAS.inc()
+            raise
+        finally:
+            ESPERA_CONEXION.observe(perf_counter() - inicio)
+
+
+def _opciones_engine(url: str) -> dict:
+    """Argumentos de create_engine según el motor de base de datos y la configuración"""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return {
+            "poolclass": QueuePoolMedido,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+
+    opciones = {
+        "connect_args": {
+            "check_same_thread": False,
+            # Espera del driver ante un bloqueo (mismo valor que busy_timeout)
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    }
+    # Una base en memoria vive en una sola conexión: se deja el pool por defecto
+    if url.database and url.database != ":memory:":
+        opciones.update(
+            poolclass=QueuePoolMedido,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return opciones
+
+
+def _configurar_sqlite(engine):
+    """Pragmas de SQLite en cada conexión nueva (WAL, synchronous, busy_timeout)"""
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if settings.SQLITE_JOURNAL_MODE:
+                cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+            if settings.SQLITE_SYNCHRONOUS:
+                cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        finally:
+            cursor.close()
+
+
+def _registrar_metricas_pool(engine):
+    """Entregas y aperturas del pool (eventos) y su ocupación, leída al exponer /metrics"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+
+    @event.listens_for(pool, "checkout")
+    def _entrega(dbapi_connection, connection_record, connection_proxy):
+        ENTREGAS.inc()
+
+    @event.listens_for(pool, "connect")
+    def _apertura(dbapi_connection, connection_record):
+        CONEXIONES_ABIERTAS.inc()
+
+    def capacidad() -> int:
+        # Desborde máximo configurado (DB_MAX_OVERFLOW; negativo = sin límite, no suma)
+        return pool.size() + max(settings.DB_MAX_OVERFLOW, 0)
+
+    def desborde() -> int:
+        return max(pool.overflow(), 0)
+
+    def saturacion() -> float:
+        return pool.checkedout() / capacidad() if capacidad() else 0.0
+
+    REGISTRO.indicador(
+        "ventas_db_pool_conexiones_en_uso", "Conexiones del pool entregadas", funcion=pool.checkedout
+    )
+    REGISTRO.indicador(
+        "ventas_db_pool_conexiones_libres", "Conexiones abiertas disponibles en el pool", funcion=pool.checkedin
+    )
+    REGISTRO.indicador(
+        "ventas_db_pool_desborde", "Conexiones abiertas por encima de DB_POOL_SIZE", funcion=desborde
+    )
+    REGISTRO.indicador(
+        "ventas_db_pool_capacidad", "Conexiones máximas del pool (tamaño + desborde)", funcion=capacidad
+    )
+    REGISTRO.indicador(
+        "ventas_db_pool_saturacion", "Fracción de la capacidad del pool en uso", funcion=saturacion
+    )
+
+
+# Crear engine de base de datos
+engine = create_engine(settings.DATABASE_URL, **_opciones_engine(settings.DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    _configurar_sqlite(engine)
+_registrar_metricas_pool(engine)
 
 # Crear SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
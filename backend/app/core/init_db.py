@@ -3,6 +3,7 @@ Script de inicialización de la base de datos
 """
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal, engine, Base
+from app.core.migraciones import aplicar_migraciones
 from app.models.models import Usuario
 from app.core.security import get_password_hash
 import logging
@@ -18,6 +19,7 @@ def init_db() -> None:
     try:
         # Crear todas las tablas
         Base.metadata.create_all(bind=engine)
+        aplicar_migraciones(engine)
         logger.info("Tablas creadas exitosamente")
 
         # Crear sesión
@@ -0,0 +1,118 @@
+"""
+Configuración de logging de la aplicación
+
+Los registros se encolan con un QueueHandler y un QueueListener los escribe
+en la salida desde un hilo propio, de modo que la E/S de logs nunca bloquea
+una petición ni un proceso del pool. Los procesos del pool reciben la misma
+cola al iniciarse y envían sus registros al proceso principal.
+
+Modo traza: los módulos listados en settings.LOG_TRAZA quedan en nivel DEBUG
+y registran el detalle línea por línea (muestreado, ver TrazaMuestreada).
+"""
+import atexit
+import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+
+FORMATO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_cola = None
+_listener: Optional[QueueListener] = None
+
+
+def _aplicar_niveles():
+    """Nivel general y nivel DEBUG para los módulos en modo traza"""
+    logging.getLogger().setLevel(settings.LOG_NIVEL.upper())
+    for nombre in settings.LOG_TRAZA:
+        logging.getLogger(nombre).setLevel(logging.DEBUG)
+
+
+def _reemplazar_handlers(handler: logging.Handler):
+    raiz = logging.getLogger()
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(handler)
+
+
+def configurar_logging():
+    """
+    Configurar el logging del proceso principal: todos los registros pasan por
+    una cola (compartida con el pool) que un QueueListener vacía en stderr
+    """
+    global _cola, _listener
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler()
+    salida.setFormatter(logging.Formatter(FORMATO))
+
+    _cola = multiprocessing.get_context("spawn").Queue(-1)
+    _listener = QueueListener(_cola, salida, respect_handler_level=True)
+    _listener.start()
+    # Sin el evento de apagado de FastAPI (scripts, pruebas) la cola se
+    # vacía al salir, antes de que multiprocessing la cierre
+    atexit.register(detener_logging)
+
+    _reemplazar_handlers(QueueHandler(_cola))
+    _aplicar_niveles()
+
+
+def configurar_logging_worker(cola=None):
+    """
+    Configurar el logging de un proceso del pool: envía sus registros a la
+    cola del proceso principal (o directo a stderr si no se recibió cola)
+    """
+    if cola is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(FORMATO))
+    else:
+        handler = QueueHandler(cola)
+    _reemplazar_handlers(handler)
+    _aplicar_niveles()
+
+
+def obtener_cola():
+    """Cola de registros del proceso principal (None si no se configuró)"""
+    return _cola
+
+
+def detener_logging():
+    """
+    Vaciar la cola pendiente y volver a escribir directo en stderr. Se puede
+    llamar más de una vez (apagado de la aplicación y salida del intérprete).
+    """
+    global _cola, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    configurar_logging_worker(None)
+    _cola = None
+
+
+class TrazaMuestreada:
+    """
+    Registro en DEBUG de eventos repetidos dentro de un bucle: solo está activo
+    si el logger tiene el modo traza y emite uno de cada `cada` eventos de cada
+    tipo (settings.LOG_TRAZA_MUESTREO). El mensaje se formatea solo al emitirse.
+
+    Uso en bucles críticos:
+        traza = TrazaMuestreada(logger)
+        if traza.activa:
+            traza("BOLSA", "Producto: %s, importe: %s", producto, importe)
+    """
+
+    def __init__(self, logger: logging.Logger, cada: Optional[int] = None):
+        self.logger = logger
+        self.activa = logger.isEnabledFor(logging.DEBUG)
+        self.cada = max(1, cada if cada is not None else settings.LOG_TRAZA_MUESTREO)
+        self.eventos = {}
+
+    def __call__(self, tipo: str, mensaje: str, *args):
+        n = self.eventos.get(tipo, 0)
+        self.eventos[tipo] = n + 1
+        if n % self.cada == 0:
+            self.logger.debug(f"[{tipo} #{n + 1}] {mensaje}", *args)
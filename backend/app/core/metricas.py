@@ -0,0 +1,186 @@
+"""
+Registro de métricas en formato de exposición de Prometheus
+
+Implementación mínima (contadores, indicadores e histogramas con etiquetas) para exponer
+en /metrics sin depender de prometheus_client. Los valores viven en memoria
+del proceso web: con varios workers de uvicorn cada uno expone los suyos.
+"""
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    partes = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: Dict[str, str]) -> Tuple[str, ...]:
+        if set(etiquetas) != set(self.etiquetas):
+            raise ValueError(f"{self.nombre}: se esperaban las etiquetas {self.etiquetas}")
+        return tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+
+    def _muestras(self) -> List[str]:
+        raise NotImplementedError
+
+    def exponer(self) -> str:
+        lineas = [f"# HELP {self.nombre} {self.descripcion}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            lineas.extend(self._muestras())
+        return "\n".join(lineas)
+
+
+class Contador(_Metrica):
+    """Contador monótono (el nombre debe terminar en _total)"""
+    tipo = "counter"
+
+    def __init__(self, nombre: str, descripcion: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, descripcion, etiquetas)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0.0) + valor
+
+    def _muestras(self) -> List[str]:
+        return [
+            f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+            for clave, valor in sorted(self._valores.items())
+        ]
+
+
+class Indicador(_Metrica):
+    """
+    Valor que sube y baja (gauge). Con `funcion` el valor se lee al exponer
+    las métricas, sin etiquetas (p. ej. el estado de un pool de conexiones)
+    """
+    tipo = "gauge"
+
+    def __init__(
+        self,
+        nombre: str,
+        descripcion: str,
+        etiquetas: Sequence[str] = (),
+        funcion: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(nombre, descripcion, etiquetas)
+        self.funcion = funcion
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = valor
+
+    def _muestras(self) -> List[str]:
+        if self.funcion is not None:
+            return [f"{self.nombre} {_numero(self.funcion())}"]
+        return [
+            f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+            for clave, valor in sorted(self._valores.items())
+        ]
+
+
+class Histograma(_Metrica):
+    """Histograma con límites de buckets fijos (acumulados, como en Prometheus)"""
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, descripcion: str, buckets: Sequence[float], etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, descripcion, etiquetas)
+        self.buckets = sorted(float(limite) for limite in buckets)
+        # clave -> [conteo por bucket (no acumulado), suma, cantidad]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def _muestras(self) -> List[str]:
+        lineas = []
+        for clave, (conteos, suma, cantidad) in sorted(self._series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            infinito = 'le="+Inf"'
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, infinito)} {cantidad}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {cantidad}")
+        return lineas
+
+
+class Registro:
+    """Conjunto de métricas expuestas juntas"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            if metrica.nombre in self._metricas:
+                raise ValueError(f"Métrica ya registrada: {metrica.nombre}")
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre: str, descripcion: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self.registrar(Contador(nombre, descripcion, etiquetas))
+
+    def indicador(
+        self,
+        nombre: str,
+        descripcion: str,
+        etiquetas: Sequence[str] = (),
+        funcion: Optional[Callable[[], float]] = None
+    ) -> Indicador:
+        return self.registrar(Indicador(nombre, descripcion, etiquetas, funcion))
+
+    def histograma(
+        self, nombre: str, descripcion: str, buckets: Sequence[float], etiquetas: Sequence[str] = ()
+    ) -> Histograma:
+        return self.registrar(Histograma(nombre, descripcion, buckets, etiquetas))
+
+    def exponer(self) -> str:
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "\n".join(metrica.exponer() for metrica in metricas) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+REGISTRO = Registro()
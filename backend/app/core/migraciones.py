@@ -0,0 +1,122 @@
+"""
+Migraciones ligeras aplicadas al iniciar la aplicación
+
+Base.metadata.create_all solo crea las tablas que no existen. Aquí se agregan
+las columnas e índices declarados en los modelos que todavía no están en una
+base de datos creada con una versión anterior. Las columnas con datos
+derivados se completan para las filas existentes al agregarlas.
+"""
+import json
+import logging
+import warnings
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Filas leídas por bloque al completar una columna derivada
+FILAS_POR_BLOQUE = 1000
+
+
+def _completar_total_codigos_faltantes(conn: Connection) -> None:
+    """Cantidad de códigos faltantes a partir del JSON guardado"""
+    ultimo_id = 0
+    while True:
+        filas = conn.execute(
+            text(
+                "SELECT id, codigos_faltantes FROM procesamiento_historial "
+                "WHERE id > :ultimo_id AND codigos_faltantes IS NOT NULL ORDER BY id LIMIT :limite"
+            ),
+            {"ultimo_id": ultimo_id, "limite": FILAS_POR_BLOQUE}
+        ).all()
+        if not filas:
+            return
+        conn.execute(
+            text("UPDATE procesamiento_historial SET total_codigos_faltantes = :total WHERE id = :id"),
+            [{"id": id_, "total": len(json.loads(codigos))} for id_, codigos in filas]
+        )
+        ultimo_id = filas[-1][0]
+
+
+# Columnas con búsqueda de texto sin distinguir mayúsculas (app/services/busqueda.py)
+COLUMNAS_BUSQUEDA = [
+    ("productos_cuentas", "producto"),
+    ("productos_cuentas", "cuenta_contable"),
+    ("combos_salto", "combo"),
+]
+
+
+def _crear_indices_busqueda(engine: Engine) -> None:
+    """
+    Índices de búsqueda según el motor: trigramas (pg_trgm) sobre
+    lower(columna) en PostgreSQL, lower(columna) en SQLite. Si no se pueden
+    crear (por ejemplo, sin permiso para instalar pg_trgm) la búsqueda sigue
+    funcionando, recorriendo la tabla.
+    """
+    dialecto = engine.dialect.name
+    if dialecto == "postgresql":
+        sentencias = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+            f"CREATE INDEX IF NOT EXISTS ix_{tabla}_{columna}_trgm "
+            f"ON {tabla} USING gin (lower({columna}) gin_trgm_ops)"
+            for tabla, columna in COLUMNAS_BUSQUEDA
+        ]
+    elif dialecto == "sqlite":
+        sentencias = [
+            f"CREATE INDEX IF NOT EXISTS ix_{tabla}_{columna}_lower ON {tabla} (lower({columna}))"
+            for tabla, columna in COLUMNAS_BUSQUEDA
+        ]
+    else:
+        return
+
+    try:
+        with engine.begin() as conn:
+            for sentencia in sentencias:
+                conn.execute(text(sentencia))
+    except Exception as e:
+        logger.warning(f"No se pudieron crear los índices de búsqueda: {e}")
+
+
+# (tabla, columna) -> función que completa la columna recién agregada
+COMPLETAR_COLUMNAS = {
+    ("procesamiento_historial", "total_codigos_faltantes"): _completar_total_codigos_faltantes,
+}
+
+
+def aplicar_migraciones(engine: Engine) -> None:
+    """Agregar columnas e índices faltantes de los modelos"""
+    inspector = inspect(engine)
+    tablas_existentes = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            if tabla.name not in tablas_existentes:
+                continue
+
+            columnas_existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in columnas_existentes:
+                    continue
+                tipo = columna.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}'))
+                logger.info(f"Columna agregada: {tabla.name}.{columna.name}")
+
+                completar = COMPLETAR_COLUMNAS.get((tabla.name, columna.name))
+                if completar is not None:
+                    completar(conn)
+                    logger.info(f"Columna completada: {tabla.name}.{columna.name}")
+
+    # Índices declarados en los modelos (checkfirst evita recrear los existentes).
+    # Los índices de búsqueda sobre lower(columna) no se pueden reflejar en
+    # SQLite: se omite el aviso
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection of expression-based index", SAWarning)
+        for tabla in Base.metadata.sorted_tables:
+            if tabla.name not in tablas_existentes:
+                continue
+            for indice in tabla.indexes:
+                indice.create(bind=engine, checkfirst=True)
+
+    _crear_indices_busqueda(engine)
@@ -3,8 +3,11 @@ Script para inicializar la base de datos con datos iniciales
 """
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal, engine, Base
-from app.models.models import ProductoCuenta, ComboSalto, Usuario
+from app.core.migraciones import aplicar_migraciones
+from app.models.models import Usuario
 from app.core.security import get_password_hash
+from app.services.diccionarios import incrementar_version
+from app.services.importacion import importar_combos, importar_productos
 from app.utils.excel_reader import read_excel_file
 import os
 
@@ -13,6 +16,7 @@ def init_db():
     """Inicializar base de datos"""
     # Crear tablas
     Base.metadata.create_all(bind=engine)
+    aplicar_migraciones(engine)
 
     db = SessionLocal()
 
@@ -30,52 +34,31 @@ def init_db():
             db.add(admin)
             print("✓ Usuario admin creado (email: admin@ventas.com, password: admin123)")
 
-        # Importar DiccionarioCuentas2 si existe el archivo
+        db.commit()
+
+        # Importar DiccionarioCuentas2 si existe el archivo (solo productos nuevos)
         diccionario_path = "../DiccionarioCuentas2.xlsx"
         if os.path.exists(diccionario_path):
             print(f"Importando productos desde {diccionario_path}...")
             df = read_excel_file(diccionario_path)
+            resultado = importar_productos(db, df, actualizar=False)
+            print(
+                f"✓ {resultado.insertados} productos importados "
+                f"({resultado.actualizados} actualizados, {resultado.omitidos} omitidos, {len(resultado.errores)} errores)"
+            )
 
-            count = 0
-            for _, row in df.iterrows():
-                producto = str(row['Producto']).strip()
-                cuenta = str(row['Asiento']).strip()
-
-                existe = db.query(ProductoCuenta).filter(
-                    ProductoCuenta.producto == producto
-                ).first()
-
-                if not existe:
-                    nuevo = ProductoCuenta(
-                        producto=producto,
-                        cuenta_contable=cuenta,
-                        activo=True
-                    )
-                    db.add(nuevo)
-                    count += 1
-
-            print(f"✓ {count} productos importados")
-
-        # Importar ComboSalto si existe el archivo
+        # Importar ComboSalto si existe el archivo (solo combos nuevos)
         combo_path = "../ComboSalto.xlsx"
         if os.path.exists(combo_path):
             print(f"Importando combos desde {combo_path}...")
             df = read_excel_file(combo_path)
+            resultado = importar_combos(db, df, actualizar=False)
+            print(
+                f"✓ {resultado.insertados} combos importados "
+                f"({resultado.actualizados} actualizados, {resultado.omitidos} omitidos, {len(resultado.errores)} errores)"
+            )
 
-            count = 0
-            for _, row in df.iterrows():
-                combo = str(row['Combo']).strip()
-                salto = int(row['Salto'])
-
-                existe = db.query(ComboSalto).filter(ComboSalto.combo == combo).first()
-
-                if not existe:
-                    nuevo = ComboSalto(combo=combo, salto=salto, activo=True)
-                    db.add(nuevo)
-                    count += 1
-
-            print(f"✓ {count} combos importados")
-
+        incrementar_version(db)
         db.commit()
         print("\n✅ Base de datos inicializada correctamente")
 
@@ -3,20 +3,22 @@ Aplicación principal FastAPI
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 import os
-import logging
 
 from app.core.config import settings
 from app.core.database import engine, Base
 from app.core.init_db import init_db
-from app.api.endpoints import procesamiento, configuracion, historial, auth
+from app.core.logging_config import configurar_logging, detener_logging
+from app.core.metricas import CONTENT_TYPE, REGISTRO
+from app.api.deps import LimiteTamanoUpload
+from app.api.endpoints import procesamiento, configuracion, historial, periodos, auth, almacenamiento
+from app.services.almacenamiento import detener_barrido, iniciar_barrido
+from app.services.jobs import cerrar_pool, reconciliar_trabajos
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configurar logging (escritura en segundo plano a través de una cola)
+configurar_logging()
 
 # Inicializar base de datos y crear usuario admin
 init_db()
@@ -31,6 +33,10 @@ app = FastAPI(
     description="API para convertir reportes de ventas a asientos contables para Concar"
 )
 
+# Rechazar por Content-Length los uploads demasiado grandes antes de leerlos
+# (agregado antes que CORS para que la respuesta 413 lleve sus headers)
+app.add_middleware(LimiteTamanoUpload)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -66,6 +72,33 @@ app.include_router(
     tags=["Historial"]
 )
 
+app.include_router(
+    periodos.router,
+    prefix=f"{settings.API_V1_STR}/periodos",
+    tags=["Períodos"]
+)
+
+app.include_router(
+    almacenamiento.router,
+    prefix=f"{settings.API_V1_STR}/almacenamiento",
+    tags=["Almacenamiento"]
+)
+
+
+@app.on_event("startup")
+def startup():
+    """Cerrar los trabajos interrumpidos e iniciar el barrido periódico de UPLOAD_DIR"""
+    reconciliar_trabajos()
+    iniciar_barrido()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Detener el barrido y el pool de procesamiento y vaciar la cola de logs"""
+    detener_barrido()
+    cerrar_pool()
+    detener_logging()
+
 
 @app.get("/")
 def root():
@@ -83,6 +116,12 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas de los procesamientos en formato Prometheus"""
+    return Response(content=REGISTRO.exponer(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
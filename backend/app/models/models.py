@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -33,11 +33,29 @@ class ComboSalto(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+class DiccionarioVersion(Base):
+    """
+    Versión de los diccionarios de cuentas y combos (fila única).
+    Se incrementa con cada cambio para invalidar la caché de todos los workers
+    """
+    __tablename__ = "diccionario_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class ProcesamientoHistorial(Base):
     """
     Modelo para el historial de procesamientos
     """
     __tablename__ = "procesamiento_historial"
+    # Listado por filtro en orden de llegada (id descendente, paginado por cursor)
+    __table_args__ = (
+        Index("ix_historial_mes_id", "mes", "id"),
+        Index("ix_historial_estado_id", "estado", "id"),
+        Index("ix_historial_procesado_por_id", "procesado_por", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nombre_archivo = Column(String(255), nullable=False)
@@ -47,13 +65,62 @@ class ProcesamientoHistorial(Base):
     total_registros_procesados = Column(Integer, default=0)
     total_asientos_generados = Column(Integer, default=0)
     codigos_faltantes = Column(Text, nullable=True)  # JSON string
+    total_codigos_faltantes = Column(Integer, nullable=True)  # Cantidad, para listar sin leer el JSON
     archivo_salida = Column(String(255), nullable=True)
-    estado = Column(String(50), default="completado")  # completado, error
+    archivo_salida_etag = Column(String(64), nullable=True)  # SHA-256 del Excel, calculado al escribirlo
+    archivo_salida_tamano = Column(Integer, nullable=True)
+    archivo_salida_modificado = Column(DateTime(timezone=True), nullable=True)
+    archivo_salida_descargado = Column(DateTime(timezone=True), nullable=True)  # Última descarga, para desalojar el menos usado
+    estado = Column(String(50), default="completado")  # pendiente, procesando, completado, error
     mensaje_error = Column(Text, nullable=True)
     procesado_por = Column(String(255), nullable=True)  # Usuario
+    job_id = Column(String(36), unique=True, index=True, nullable=True)
+    progreso = Column(Integer, default=0)  # 0-100
+    cache_key = Column(String(64), index=True, nullable=True)  # Archivo + parámetros + versión de diccionarios
+    detalle_archivos = Column(Text, nullable=True)  # JSON: estadísticas por archivo de un lote
+    metricas = Column(Text, nullable=True)  # JSON: tiempo, CPU y memoria por etapa, tamaño de entrada
+    archivos_entrada = Column(Text, nullable=True)  # JSON: nombre y SHA-256 de cada archivo, en el orden del lote
+    reprocesado_de = Column(Integer, nullable=True)  # Historial cuya lectura se reutilizó
+    periodo_id = Column(Integer, index=True, nullable=True)  # Período mensual al que se agregó
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class PeriodoMensual(Base):
+    """
+    Período mensual incremental: los procesamientos diarios se agregan a un
+    único resultado del mes, con numeración continua y sin repetir boletas
+    """
+    __tablename__ = "periodos_mensuales"
+
+    id = Column(Integer, primary_key=True, index=True)
+    anio = Column(Integer, nullable=False)
+    mes = Column(String(2), nullable=False)
+    subdiario_inicial = Column(Integer, nullable=False)
+    numero_comprobante_inicial = Column(Integer, nullable=False)
+    subdiario_siguiente = Column(Integer, nullable=False)  # Numeración de la próxima boleta nueva
+    numero_siguiente = Column(Integer, nullable=False)
+    total_boletas = Column(Integer, default=0)
+    total_asientos = Column(Integer, default=0)
+    estado = Column(String(20), default="abierto")  # abierto, cerrado
+    creado_por = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class PeriodoBoleta(Base):
+    """
+    Boletas ya agregadas a un período (serie-número), para no volver a
+    procesarlas en los envíos siguientes
+    """
+    __tablename__ = "periodo_boletas"
+    __table_args__ = (UniqueConstraint("periodo_id", "clave", name="uq_periodo_boleta"),)
+
+    id = Column(Integer, primary_key=True)
+    periodo_id = Column(Integer, nullable=False)
+    clave = Column(String(120), nullable=False)
+    historial_id = Column(Integer, nullable=True)
+
+
 class Usuario(Base):
     """
     Modelo para usuarios del sistema
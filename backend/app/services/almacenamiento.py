@@ -0,0 +1,451 @@
+"""
+Almacenamiento de UPLOAD_DIR: ubicación de los archivos y barrido periódico
+
+    salidas/ab/asientos_*.xlsx  Excel de asientos (y su variante .zip), repartidos
+                                en 256 subdirectorios según el hash del nombre
+    temporales/                 archivos de ventas, lotes e importaciones de
+                                diccionarios mientras se procesan
+    lecturas/                   caché de lecturas (app/services/cache_lecturas.py)
+    periodos/<id>/              tramos de cada período mensual y su Excel del mes
+
+El barrido se ejecuta cada ALMACENAMIENTO_BARRIDO_MINUTOS en un hilo de la
+API (uno a la vez entre workers, con un bloqueo de archivo):
+- Desaloja los Excel de asientos que no se descargan hace más de
+  ALMACENAMIENTO_SALIDAS_TTL_HORAS y, del último descargado al más antiguo,
+  los que excedan ALMACENAMIENTO_SALIDAS_MAX_MB. El historial queda sin
+  archivo de salida.
+- Elimina los temporales, y los archivos que ningún historial referencia,
+  con más de ALMACENAMIENTO_TEMPORALES_HORAS (trabajos interrumpidos).
+- En los períodos mueve a tramo los pendientes cuyo historial se completó,
+  borra los abandonados y el Excel del mes sin descargar hace más del TTL
+  (se vuelve a generar al pedirlo). Los tramos no se borran nunca.
+- Aplica la política de la caché de lecturas.
+Los archivos de versiones anteriores, en la raíz de UPLOAD_DIR, se siguen
+sirviendo y se barren igual.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session, load_only
+
+from app.core.config import settings
+from app.core.metricas import REGISTRO
+from app.models.models import ProcesamientoHistorial
+from app.services.cache_lecturas import directorio_lecturas, purgar_lecturas
+from app.services.descargas import ruta_zip
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre workers
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_SALIDAS = "salidas"
+DIRECTORIO_TEMPORALES = "temporales"
+DIRECTORIO_PERIODOS = "periodos"
+
+# Archivos de la raíz de UPLOAD_DIR (versiones anteriores)
+PREFIJO_SALIDA = "asientos_"
+PREFIJOS_TEMPORALES = ("ventas_", "temp_", "lote_")
+
+AREAS = ("salidas", "temporales", "lecturas", "periodos", "otros")
+
+# La fecha de última descarga se registra como mucho una vez por intervalo
+INTERVALO_MARCA_DESCARGA = timedelta(hours=1)
+
+_PENDIENTE = re.compile(r"^pendiente_(\d+)\.npz$")
+
+BYTES_ALMACENAMIENTO = REGISTRO.indicador(
+    "ventas_almacenamiento_bytes",
+    "Bytes ocupados en UPLOAD_DIR por área (al último barrido)",
+    ("area",)
+)
+ARCHIVOS_ALMACENAMIENTO = REGISTRO.indicador(
+    "ventas_almacenamiento_archivos",
+    "Archivos en UPLOAD_DIR por área (al último barrido)",
+    ("area",)
+)
+ELIMINADOS = REGISTRO.contador(
+    "ventas_almacenamiento_eliminados_total",
+    "Archivos eliminados por el barrido de UPLOAD_DIR",
+    ("motivo",)
+)
+
+
+@dataclass
+class ResultadoBarrido:
+    salidas_desalojadas: int = 0
+    temporales_eliminados: int = 0
+    huerfanos_eliminados: int = 0
+    tramos_recuperados: int = 0
+    lecturas_desalojadas: int = 0
+    bytes_liberados: int = 0
+    duracion_segundos: float = 0.0
+
+
+# --- Ubicación de los archivos ---
+
+def ruta_salida(nombre: str) -> str:
+    """Ruta relativa a UPLOAD_DIR (la que guarda el historial) de un Excel de asientos"""
+    particion = hashlib.sha1(nombre.encode("utf-8")).hexdigest()[:2]
+    return os.path.join(DIRECTORIO_SALIDAS, particion, nombre)
+
+
+def ruta_absoluta(relativa: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, relativa)
+
+
+def ruta_temporal(nombre: str) -> str:
+    """Ruta de un archivo o directorio temporal (creando el directorio de temporales)"""
+    directorio = os.path.join(settings.UPLOAD_DIR, DIRECTORIO_TEMPORALES)
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, nombre)
+
+
+def _tamano(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _borrar(path: str) -> int:
+    """Borrar un archivo o directorio; devuelve los bytes liberados"""
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            liberados = sum(_tamano(os.path.join(raiz, nombre)) for raiz, _, nombres in os.walk(path) for nombre in nombres)
+            shutil.rmtree(path, ignore_errors=True)
+            return liberados
+        liberados = os.path.getsize(path)
+        os.remove(path)
+        return liberados
+    except OSError:
+        return 0
+
+
+def borrar_salida(archivo_salida: Optional[str]) -> int:
+    """Borrar el Excel de asientos de un historial y su variante .zip"""
+    if not archivo_salida:
+        return 0
+    path = ruta_absoluta(archivo_salida)
+    return _borrar(path) + _borrar(ruta_zip(path))
+
+
+def quitar_salida(historial: ProcesamientoHistorial) -> int:
+    """Borrar el Excel de un historial y dejarlo sin archivo de salida (sin commit)"""
+    liberados = borrar_salida(historial.archivo_salida)
+    historial.archivo_salida = None
+    historial.archivo_salida_etag = None
+    historial.archivo_salida_tamano = None
+    historial.archivo_salida_modificado = None
+    historial.archivo_salida_descargado = None
+    # Sin Excel, el resultado no sirve como caché
+    historial.cache_key = None
+    return liberados
+
+
+# --- Último uso ---
+
+def _ahora_utc() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _fecha_utc(fecha: datetime) -> datetime:
+    """Fecha como UTC sin zona (SQLite la guarda sin zona, PostgreSQL con zona)"""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def marcar_descarga(db: Session, historial: ProcesamientoHistorial) -> None:
+    """Registrar la descarga del Excel de un historial (orden de desalojo)"""
+    ahora = _ahora_utc()
+    anterior = historial.archivo_salida_descargado
+    if anterior is not None and _fecha_utc(anterior) > ahora - INTERVALO_MARCA_DESCARGA:
+        return
+    historial.archivo_salida_descargado = ahora
+    db.commit()
+
+
+def marcar_uso_archivo(path: str) -> None:
+    """
+    Registrar el uso de un archivo sin historial (el Excel de un período) en
+    su fecha de acceso: la de modificación no cambia, porque de ella salen
+    sus validadores de descarga
+    """
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except OSError:
+        pass
+
+
+# --- Uso ---
+
+def _area_raiz(nombre: str) -> str:
+    if nombre == DIRECTORIO_SALIDAS or nombre.startswith(PREFIJO_SALIDA):
+        return "salidas"
+    if nombre == DIRECTORIO_TEMPORALES or nombre.startswith(PREFIJOS_TEMPORALES):
+        return "temporales"
+    if nombre == DIRECTORIO_PERIODOS:
+        return "periodos"
+    return "otros"
+
+
+def _sumar(path: str, uso: Dict[str, Dict[str, int]], clave: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        for raiz, _, nombres in os.walk(path):
+            for nombre in nombres:
+                uso[clave]["archivos"] += 1
+                uso[clave]["bytes"] += _tamano(os.path.join(raiz, nombre))
+    elif os.path.exists(path):
+        uso[clave]["archivos"] += 1
+        uso[clave]["bytes"] += _tamano(path)
+
+
+def calcular_uso() -> List[Dict]:
+    """Archivos y bytes de cada área de UPLOAD_DIR (y de la caché de lecturas)"""
+    uso = {area: {"archivos": 0, "bytes": 0} for area in AREAS}
+    lecturas = os.path.abspath(directorio_lecturas())
+
+    if os.path.isdir(settings.UPLOAD_DIR):
+        for entrada in os.scandir(settings.UPLOAD_DIR):
+            if os.path.abspath(entrada.path) == lecturas or entrada.name.startswith("."):
+                continue
+            _sumar(entrada.path, uso, _area_raiz(entrada.name))
+    # La caché de lecturas puede estar fuera de UPLOAD_DIR (CACHE_LECTURAS_DIR)
+    _sumar(lecturas, uso, "lecturas")
+
+    return [{"area": area, **uso[area]} for area in AREAS]
+
+
+def _actualizar_metricas(uso: List[Dict]):
+    for area in uso:
+        BYTES_ALMACENAMIENTO.set(area["bytes"], area=area["area"])
+        ARCHIVOS_ALMACENAMIENTO.set(area["archivos"], area=area["area"])
+
+
+# --- Barrido ---
+
+def _antiguo(path: str, limite: float) -> bool:
+    try:
+        return os.stat(path).st_mtime < limite
+    except OSError:
+        return False
+
+
+def _barrer_salidas(db: Session, resultado: ResultadoBarrido) -> Set[str]:
+    """Desalojo por antigüedad y tamaño; devuelve las salidas que siguen referenciadas"""
+    ahora = _ahora_utc()
+    ttl = settings.ALMACENAMIENTO_SALIDAS_TTL_HORAS
+    limite_bytes = settings.ALMACENAMIENTO_SALIDAS_MAX_MB * 1024 * 1024
+
+    historiales = db.query(ProcesamientoHistorial).options(load_only(
+        ProcesamientoHistorial.id,
+        ProcesamientoHistorial.archivo_salida,
+        ProcesamientoHistorial.archivo_salida_descargado,
+        ProcesamientoHistorial.created_at
+    )).filter(ProcesamientoHistorial.archivo_salida.isnot(None)).all()
+
+    def ultimo_uso(historial):
+        fecha = historial.archivo_salida_descargado or historial.created_at
+        return _fecha_utc(fecha) if fecha is not None else datetime.min
+
+    acumulado = 0
+    # Del uso más reciente al más antiguo
+    for historial in sorted(historiales, key=lambda h: (ultimo_uso(h), h.id), reverse=True):
+        path = ruta_absoluta(historial.archivo_salida)
+        if not os.path.exists(path):
+            continue
+
+        acumulado += _tamano(path) + _tamano(ruta_zip(path))
+        vencido = ttl and ultimo_uso(historial) < ahora - timedelta(hours=ttl)
+        if vencido or (limite_bytes and acumulado > limite_bytes):
+            resultado.bytes_liberados += quitar_salida(historial)
+            resultado.salidas_desalojadas += 1
+            ELIMINADOS.inc(motivo="vencido" if vencido else "tamano")
+
+    db.commit()
+    return {os.path.normpath(h.archivo_salida) for h in historiales if h.archivo_salida}
+
+
+def _barrer_huerfanos(referenciadas: Set[str], limite: float, resultado: ResultadoBarrido):
+    """Excel (y .zip o escrituras a medias) que ningún historial referencia"""
+    candidatos = []
+    directorio = os.path.join(settings.UPLOAD_DIR, DIRECTORIO_SALIDAS)
+    for raiz, _, nombres in os.walk(directorio):
+        candidatos.extend(os.path.join(raiz, nombre) for nombre in nombres)
+    if os.path.isdir(settings.UPLOAD_DIR):
+        candidatos.extend(
+            entrada.path for entrada in os.scandir(settings.UPLOAD_DIR)
+            if entrada.name.startswith(PREFIJO_SALIDA) and entrada.is_file()
+        )
+
+    for path in candidatos:
+        relativa = os.path.normpath(os.path.relpath(path, settings.UPLOAD_DIR))
+        base = relativa[:-len(".zip")] if relativa.endswith(".xlsx.zip") else relativa
+        if base in referenciadas or not _antiguo(path, limite):
+            continue
+        resultado.bytes_liberados += _borrar(path)
+        resultado.huerfanos_eliminados += 1
+        ELIMINADOS.inc(motivo="huerfano")
+
+
+def _barrer_temporales(limite: float, resultado: ResultadoBarrido):
+    """Entradas de trabajos que no llegaron a borrarlas (raíz y temporales/)"""
+    candidatos = []
+    directorio = os.path.join(settings.UPLOAD_DIR, DIRECTORIO_TEMPORALES)
+    if os.path.isdir(directorio):
+        candidatos.extend(entrada.path for entrada in os.scandir(directorio))
+    if os.path.isdir(settings.UPLOAD_DIR):
+        candidatos.extend(
+            entrada.path for entrada in os.scandir(settings.UPLOAD_DIR)
+            if entrada.name.startswith(PREFIJOS_TEMPORALES)
+        )
+
+    for path in candidatos:
+        if not _antiguo(path, limite):
+            continue
+        resultado.bytes_liberados += _borrar(path)
+        resultado.temporales_eliminados += 1
+        ELIMINADOS.inc(motivo="temporal")
+
+
+def _barrer_periodos(db: Session, limite: float, resultado: ResultadoBarrido):
+    """Tramos pendientes, escrituras a medias y Excel del mes sin usar"""
+    from app.services import jobs, periodos
+
+    raiz = os.path.join(settings.UPLOAD_DIR, DIRECTORIO_PERIODOS)
+    if not os.path.isdir(raiz):
+        return
+
+    ttl = settings.ALMACENAMIENTO_SALIDAS_TTL_HORAS
+    limite_uso = time.time() - ttl * 3600
+
+    for directorio in os.scandir(raiz):
+        if not directorio.is_dir() or not directorio.name.isdigit():
+            continue
+        periodo_id = int(directorio.name)
+
+        for entrada in os.scandir(directorio.path):
+            pendiente = _PENDIENTE.match(entrada.name)
+            if pendiente:
+                historial = db.query(ProcesamientoHistorial).options(load_only(
+                    ProcesamientoHistorial.estado, ProcesamientoHistorial.periodo_id
+                )).filter(ProcesamientoHistorial.id == int(pendiente.group(1))).first()
+
+                if historial is not None and historial.estado == jobs.ESTADO_COMPLETADO and historial.periodo_id == periodo_id:
+                    # Sus boletas ya están registradas: el trabajo terminó sin moverlo
+                    try:
+                        os.replace(entrada.path, periodos.ruta_tramo(periodo_id, int(pendiente.group(1))))
+                        resultado.tramos_recuperados += 1
+                        logger.warning(f"Tramo pendiente {entrada.name} del período {periodo_id} recuperado")
+                    except OSError:
+                        pass
+                elif (historial is None or historial.estado == jobs.ESTADO_ERROR) and _antiguo(entrada.path, limite):
+                    resultado.bytes_liberados += _borrar(entrada.path)
+                    resultado.temporales_eliminados += 1
+                    ELIMINADOS.inc(motivo="temporal")
+
+            elif ".tmp" in entrada.name and _antiguo(entrada.path, limite):
+                resultado.bytes_liberados += _borrar(entrada.path)
+                resultado.temporales_eliminados += 1
+                ELIMINADOS.inc(motivo="temporal")
+
+            elif entrada.name.startswith(PREFIJO_SALIDA) and ttl:
+                try:
+                    estado = entrada.stat()
+                except OSError:
+                    continue
+                if max(estado.st_atime, estado.st_mtime) < limite_uso:
+                    resultado.bytes_liberados += _borrar(entrada.path)
+                    resultado.salidas_desalojadas += 1
+                    ELIMINADOS.inc(motivo="vencido")
+
+
+def barrer() -> Optional[ResultadoBarrido]:
+    """
+    Aplicar la política de almacenamiento a todo UPLOAD_DIR. Devuelve None si
+    otro proceso está barriendo.
+    """
+    from app.core.database import SessionLocal
+
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    with open(os.path.join(settings.UPLOAD_DIR, ".barrido.lock"), "a") as bloqueo:
+        if fcntl is not None:
+            try:
+                fcntl.flock(bloqueo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+
+        inicio = time.perf_counter()
+        resultado = ResultadoBarrido()
+        limite = time.time() - settings.ALMACENAMIENTO_TEMPORALES_HORAS * 3600
+
+        db = SessionLocal()
+        try:
+            referenciadas = _barrer_salidas(db, resultado)
+            _barrer_huerfanos(referenciadas, limite, resultado)
+            _barrer_temporales(limite, resultado)
+            _barrer_periodos(db, limite, resultado)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        resultado.lecturas_desalojadas = purgar_lecturas()
+        resultado.duracion_segundos = round(time.perf_counter() - inicio, 3)
+        _actualizar_metricas(calcular_uso())
+
+    logger.info(
+        "Barrido de almacenamiento: "
+        f"{resultado.salidas_desalojadas} salidas, {resultado.temporales_eliminados} temporales, "
+        f"{resultado.huerfanos_eliminados} huérfanos, {resultado.lecturas_desalojadas} lecturas, "
+        f"{resultado.bytes_liberados / (1024 * 1024):.1f} MB liberados"
+    )
+    return resultado
+
+
+# --- Barrido periódico ---
+
+_detener = threading.Event()
+_hilo: Optional[threading.Thread] = None
+
+
+def _ciclo():
+    # El primero al iniciar: los reinicios frecuentes no posponen el barrido
+    intervalo = settings.ALMACENAMIENTO_BARRIDO_MINUTOS * 60
+    while True:
+        try:
+            barrer()
+        except Exception:
+            logger.exception("Error en el barrido de almacenamiento")
+        if _detener.wait(intervalo):
+            return
+
+
+def iniciar_barrido():
+    """Iniciar el barrido periódico (si está activo) en un hilo de fondo"""
+    global _hilo
+    if not settings.ALMACENAMIENTO_BARRIDO_MINUTOS or (_hilo is not None and _hilo.is_alive()):
+        return
+    _detener.clear()
+    _hilo = threading.Thread(target=_ciclo, name="barrido-almacenamiento", daemon=True)
+    _hilo.start()
+
+
+def detener_barrido():
+    global _hilo
+    _detener.set()
+    if _hilo is not None:
+        _hilo.join(timeout=5)
+        _hilo = None
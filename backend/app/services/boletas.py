@@ -0,0 +1,265 @@
+"""
+Representación columnar de las boletas extraídas del reporte de ventas
+
+En lugar de una lista de [datos_boleta, [[producto, importe], ...]] por
+boleta, las cabeceras y las líneas de detalle se guardan en arrays paralelos
+de tipo fijo. Las líneas de la boleta b ocupan las posiciones
+offsets[b]:offsets[b + 1]; el producto de cada línea es un código entero
+sobre la tabla `productos` (cada texto se guarda una sola vez).
+
+Las boletas se pueden guardar en un .npz (arrays NumPy comprimidos, sin
+pickle): las columnas de objetos se codifican como arrays tipados.
+"""
+from array import array
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Versión del formato .npz (cambiarla invalida los archivos guardados)
+FORMATO_NPZ = 1
+
+# Tipos de valor de las columnas de objetos al guardarlas
+_TEXTO, _FECHA, _ENTERO, _DECIMAL, _NULO = range(5)
+
+
+def _columna(valores: Sequence) -> np.ndarray:
+    """Array de objetos con los valores tal cual (sin convertir fechas ni números)"""
+    columna = np.empty(len(valores), dtype=object)
+    columna[:] = valores
+    return columna
+
+
+def _columna_inferida(valores: Sequence) -> np.ndarray:
+    """Array con el tipo que pandas infiere (float64 si todos son números)"""
+    return pd.Series(_columna(valores), dtype=object).infer_objects().to_numpy()
+
+
+def codificar_columna(nombre: str, valores: np.ndarray) -> Dict[str, np.ndarray]:
+    """Arrays sin objetos que representan la columna `nombre`"""
+    if valores.dtype != object:
+        return {nombre: valores}
+    if pd.api.types.infer_dtype(valores, skipna=False) in ("string", "empty"):
+        return {f"{nombre}.texto": valores.astype(str)}
+
+    tipos = np.empty(len(valores), dtype=np.int8)
+    enteros = np.zeros(len(valores), dtype=np.int64)
+    decimales = np.zeros(len(valores), dtype=np.float64)
+    textos = [""] * len(valores)
+    for i, valor in enumerate(valores.tolist()):
+        if isinstance(valor, str):
+            tipos[i], textos[i] = _TEXTO, valor
+        elif valor is None:
+            tipos[i] = _NULO
+        elif isinstance(valor, (datetime, np.datetime64)):
+            tipos[i], enteros[i] = _FECHA, pd.Timestamp(valor).value
+        elif isinstance(valor, (bool, np.bool_)):
+            raise TypeError(f"Valor no soportado en la columna {nombre}: {valor!r}")
+        elif isinstance(valor, (int, np.integer)):
+            tipos[i], enteros[i] = _ENTERO, valor
+        elif isinstance(valor, (float, np.floating)):
+            tipos[i], decimales[i] = _DECIMAL, valor
+        else:
+            raise TypeError(f"Valor no soportado en la columna {nombre}: {type(valor).__name__}")
+
+    return {
+        f"{nombre}.tipo": tipos,
+        f"{nombre}.entero": enteros,
+        f"{nombre}.decimal": decimales,
+        f"{nombre}.texto": np.array(textos, dtype=str),
+    }
+
+
+def decodificar_columna(nombre: str, datos) -> np.ndarray:
+    """Columna `nombre` reconstruida desde los arrays de codificar_columna"""
+    if nombre in datos:
+        return datos[nombre]
+    textos = datos[f"{nombre}.texto"]
+    if f"{nombre}.tipo" not in datos:
+        return textos.astype(object)
+
+    tipos = datos[f"{nombre}.tipo"]
+    valores = np.full(len(tipos), None, dtype=object)
+    texto = tipos == _TEXTO
+    valores[texto] = textos[texto].astype(object)
+    fecha = tipos == _FECHA
+    if fecha.any():
+        valores[fecha] = pd.to_datetime(datos[f"{nombre}.entero"][fecha], unit="ns").to_numpy(dtype=object)
+    entero = tipos == _ENTERO
+    valores[entero] = datos[f"{nombre}.entero"][entero].astype(object)
+    decimal = tipos == _DECIMAL
+    valores[decimal] = datos[f"{nombre}.decimal"][decimal].astype(object)
+    return valores
+
+
+@dataclass
+class BoletasColumnares:
+    # Cabecera: una posición por boleta
+    fecha: np.ndarray       # valor de la celda (fecha o texto)
+    dniruc: np.ndarray      # str, recortado a 40 caracteres
+    cliente: np.ndarray     # str, recortado a 40 caracteres ("Clientes Varios" sin documento)
+    num: np.ndarray         # str
+    serie: np.ndarray       # str
+    total: np.ndarray       # float64 (o valores de la celda si no son numéricos)
+    anulada: np.ndarray     # bool
+    # Detalle: una posición por línea, en el orden de las boletas
+    offsets: np.ndarray     # int64, len = boletas + 1
+    codigos: np.ndarray     # int32, índice en `productos`
+    importes: np.ndarray    # float64
+    productos: np.ndarray   # str, tabla de productos distintos
+
+    def __len__(self) -> int:
+        return len(self.anulada)
+
+    @property
+    def lineas(self) -> int:
+        return len(self.codigos)
+
+    def guardar(self, archivo: Union[str, BinaryIO]):
+        """Guardar en formato .npz comprimido (TypeError si una celda no se puede representar)"""
+        arrays = {"formato": np.array(FORMATO_NPZ)}
+        for campo in fields(self):
+            arrays.update(codificar_columna(campo.name, getattr(self, campo.name)))
+        np.savez_compressed(archivo, **arrays)
+
+    @classmethod
+    def cargar(cls, archivo: Union[str, BinaryIO]) -> "BoletasColumnares":
+        """Leer boletas guardadas con guardar() (ValueError si el formato no corresponde)"""
+        with np.load(archivo, allow_pickle=False) as npz:
+            datos = {nombre: npz[nombre] for nombre in npz.files}
+        if "formato" not in datos or int(datos["formato"]) != FORMATO_NPZ:
+            raise ValueError("Formato de boletas guardadas no compatible")
+        return cls(**{campo.name: decodificar_columna(campo.name, datos) for campo in fields(cls)})
+
+    def boleta_de_linea(self) -> np.ndarray:
+        """Índice de la boleta a la que pertenece cada línea"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def seleccionar(self, mascara: np.ndarray) -> "BoletasColumnares":
+        """Boletas marcadas en `mascara` (una posición por boleta) con sus líneas, en el mismo orden"""
+        lineas = mascara[self.boleta_de_linea()]
+        offsets = np.zeros(int(mascara.sum()) + 1, dtype=np.int64)
+        np.cumsum(np.diff(self.offsets)[mascara], out=offsets[1:])
+        return BoletasColumnares(
+            fecha=self.fecha[mascara],
+            dniruc=self.dniruc[mascara],
+            cliente=self.cliente[mascara],
+            num=self.num[mascara],
+            serie=self.serie[mascara],
+            total=self.total[mascara],
+            anulada=self.anulada[mascara],
+            offsets=offsets,
+            codigos=self.codigos[lineas],
+            importes=self.importes[lineas],
+            productos=self.productos
+        )
+
+    @classmethod
+    def vacias(cls) -> "BoletasColumnares":
+        return ConstructorBoletas().construir()
+
+    @classmethod
+    def desde_iterable(cls, boletas: Iterable[list]) -> "BoletasColumnares":
+        """Construir desde boletas en el formato de listas ([datos_boleta, comida])"""
+        constructor = ConstructorBoletas()
+        for datos_boleta, comida in boletas:
+            constructor.agregar(datos_boleta, comida)
+        return constructor.construir()
+
+    @classmethod
+    def concatenar(cls, partes: List["BoletasColumnares"]) -> "BoletasColumnares":
+        """Unir las boletas de varios archivos (en ese orden) con una sola tabla de productos"""
+        if not partes:
+            return cls.vacias()
+        if len(partes) == 1:
+            return partes[0]
+
+        productos = pd.unique(np.concatenate([parte.productos for parte in partes]))
+        indice = pd.Index(productos)
+        codigos = [
+            indice.get_indexer(parte.productos).astype(np.int32)[parte.codigos]
+            for parte in partes
+        ]
+        desplazamientos = np.cumsum([0] + [parte.lineas for parte in partes[:-1]])
+        offsets = np.concatenate(
+            [[0]] + [parte.offsets[1:] + desplazamiento for parte, desplazamiento in zip(partes, desplazamientos)]
+        ).astype(np.int64)
+
+        def unir(campo: str) -> np.ndarray:
+            return np.concatenate([getattr(parte, campo) for parte in partes])
+
+        total = unir("total")
+        if total.dtype == object:
+            total = _columna_inferida(total)
+
+        return cls(
+            fecha=unir("fecha"),
+            dniruc=unir("dniruc"),
+            cliente=unir("cliente"),
+            num=unir("num"),
+            serie=unir("serie"),
+            total=total,
+            anulada=unir("anulada"),
+            offsets=offsets,
+            codigos=np.concatenate(codigos).astype(np.int32),
+            importes=unir("importes"),
+            productos=_columna(productos)
+        )
+
+
+class ConstructorBoletas:
+    """
+    Acumula boletas una a una (motores legacy y streaming) en arrays compactos:
+    las líneas de detalle van a array.array de enteros y floats, sin un objeto
+    por línea
+    """
+
+    def __init__(self):
+        self.fecha: List = []
+        self.dniruc: List[str] = []
+        self.cliente: List[str] = []
+        self.num: List[str] = []
+        self.serie: List[str] = []
+        self.total: List = []
+        self.anulada = array("b")
+        self.offsets = array("q", [0])
+        self.codigos = array("i")
+        self.importes = array("d")
+        self._indices: Dict[str, int] = {}
+
+    def _codigo(self, producto: str) -> int:
+        codigo = self._indices.get(producto)
+        if codigo is None:
+            codigo = self._indices[producto] = len(self._indices)
+        return codigo
+
+    def agregar(self, datos_boleta: dict, comida: List[list]):
+        """Agregar una boleta ([datos_boleta, [[producto, importe], ...]])"""
+        self.fecha.append(datos_boleta["Fecha"])
+        self.dniruc.append(datos_boleta["DNIRUC"])
+        self.cliente.append(datos_boleta["Cliente"])
+        self.num.append(datos_boleta["Num"])
+        self.serie.append(datos_boleta["Serie"])
+        self.total.append(datos_boleta["Total"])
+        self.anulada.append(datos_boleta["Estado"].strip() == "Anulada")
+        for producto, importe in comida:
+            self.codigos.append(self._codigo(producto))
+            self.importes.append(importe)
+        self.offsets.append(len(self.codigos))
+
+    def construir(self) -> BoletasColumnares:
+        return BoletasColumnares(
+            fecha=_columna(self.fecha),
+            dniruc=_columna(self.dniruc),
+            cliente=_columna(self.cliente),
+            num=_columna(self.num),
+            serie=_columna(self.serie),
+            total=_columna_inferida(self.total),
+            anulada=np.frombuffer(self.anulada, dtype=np.int8).astype(bool),
+            offsets=np.frombuffer(self.offsets, dtype=np.int64).copy(),
+            codigos=np.frombuffer(self.codigos, dtype=np.int32).copy(),
+            importes=np.frombuffer(self.importes, dtype=np.float64).copy(),
+            productos=_columna(list(self._indices))
+        )
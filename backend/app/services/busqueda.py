@@ -0,0 +1,48 @@
+"""
+Búsqueda de texto en los diccionarios de cuentas y combos
+
+La búsqueda no distingue mayúsculas y se hace sobre lower(columna). En
+PostgreSQL los índices de trigramas (pg_trgm) resuelven tanto el prefijo como
+la subcadena con LIKE. En SQLite el prefijo se busca como rango sobre el
+índice de lower(columna); la subcadena no tiene índice y recorre la tabla.
+lower() de SQLite solo convierte letras ASCII: ahí Ñ y ñ (o Á y á) se
+distinguen.
+Los índices se crean al iniciar (app/core/migraciones.py).
+"""
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+MODO_CONTIENE = "contiene"
+MODO_PREFIJO = "prefijo"
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filtro_texto(db: Session, columnas: list, texto: str, modo: str = MODO_CONTIENE):
+    """
+    Condición para las filas en que alguna de las columnas empieza con
+    (modo prefijo) o contiene (modo contiene) el texto, sin distinguir
+    mayúsculas
+    """
+    dialecto = db.get_bind().dialect.name
+    texto = texto.strip()
+    if dialecto == "sqlite":
+        # Igual que lower() de SQLite, para comparar con lower(columna)
+        texto = "".join(c.lower() if c.isascii() else c for c in texto)
+    else:
+        texto = texto.lower()
+
+    condiciones = []
+    for columna in columnas:
+        valor = func.lower(columna)
+        if modo == MODO_PREFIJO and dialecto == "sqlite":
+            # Rango [texto, texto con el último carácter siguiente): usa el índice
+            siguiente = texto[:-1] + chr(ord(texto[-1]) + 1)
+            condiciones.append(and_(valor >= texto, valor < siguiente))
+        elif modo == MODO_PREFIJO:
+            condiciones.append(valor.like(f"{_escapar_like(texto)}%", escape="\\"))
+        else:
+            condiciones.append(valor.like(f"%{_escapar_like(texto)}%", escape="\\"))
+    return or_(*condiciones)
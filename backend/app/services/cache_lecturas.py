@@ -0,0 +1,142 @@
+"""
+Caché de lecturas: boletas ya extraídas de cada archivo de ventas
+
+Leer el Excel es la etapa más costosa y es habitual volver a procesar el
+mismo archivo después de completar los diccionarios. Las boletas extraídas
+se guardan en formato columnar (.npz, ver BoletasColumnares.guardar) con una
+clave que combina el SHA-256 del archivo, el motor de extracción y los
+combos (que determinan qué líneas forman el detalle). Las cuentas contables
+no forman parte de la clave: se aplican después, en generar_asientos.
+
+El desalojo usa la fecha de modificación de cada archivo, que se actualiza
+en cada uso: vencen los no usados en CACHE_LECTURAS_TTL_HORAS y, si el total
+supera CACHE_LECTURAS_MAX_MB, se borran los usados hace más tiempo.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.services.boletas import FORMATO_NPZ, BoletasColumnares
+
+logger = logging.getLogger(__name__)
+
+EXTENSION = ".npz"
+
+
+def directorio_lecturas() -> str:
+    return settings.CACHE_LECTURAS_DIR or os.path.join(settings.UPLOAD_DIR, "lecturas")
+
+
+def clave_lectura(sha256_archivo: str, engine: str, diccionario_combos: Dict[str, int]) -> str:
+    """Clave de caché de la lectura de un archivo"""
+    combos = json.dumps(sorted(diccionario_combos.items()), ensure_ascii=False)
+    partes = [sha256_archivo, engine, hashlib.sha256(combos.encode()).hexdigest(), str(FORMATO_NPZ)]
+    return hashlib.sha256("|".join(partes).encode()).hexdigest()
+
+
+def _ruta(clave: str) -> str:
+    return os.path.join(directorio_lecturas(), clave + EXTENSION)
+
+
+def existe_lectura(clave: str) -> bool:
+    return settings.CACHE_LECTURAS_ACTIVO and os.path.exists(_ruta(clave))
+
+
+def cargar_lectura(clave: str) -> Optional[BoletasColumnares]:
+    """Boletas guardadas con la clave, o None si no están (o no se pueden leer)"""
+    if not settings.CACHE_LECTURAS_ACTIVO:
+        return None
+
+    ruta = _ruta(clave)
+    try:
+        boletas = BoletasColumnares.cargar(ruta)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Lectura en caché inválida, se descarta ({clave[:12]}): {e}")
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+        return None
+
+    # Marcar el uso para el desalojo (el archivo pudo borrarse entre tanto)
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+    return boletas
+
+
+def guardar_lectura(clave: str, boletas: BoletasColumnares) -> bool:
+    """
+    Guardar las boletas con la clave y aplicar la política de desalojo.
+    Devuelve False si la caché está desactivada o las boletas no se pueden
+    representar en el formato (p. ej. celdas de un tipo inesperado).
+    """
+    if not settings.CACHE_LECTURAS_ACTIVO:
+        return False
+
+    directorio = directorio_lecturas()
+    os.makedirs(directorio, exist_ok=True)
+
+    # Se escribe en un temporal y se renombra: otro proceso nunca ve un archivo a medias
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            boletas.guardar(f)
+        os.replace(temporal, _ruta(clave))
+    except TypeError as e:
+        logger.warning(f"La lectura no se guarda en caché: {e}")
+        return False
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    purgar_lecturas()
+    return True
+
+
+def purgar_lecturas() -> int:
+    """
+    Aplicar la política de desalojo (antigüedad desde el último uso y tamaño
+    total). Devuelve la cantidad de lecturas desalojadas.
+    """
+    directorio = directorio_lecturas()
+    if not os.path.isdir(directorio):
+        return 0
+
+    entradas = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(EXTENSION):
+            continue
+        try:
+            estado = os.stat(os.path.join(directorio, nombre))
+        except OSError:
+            continue
+        entradas.append((estado.st_mtime, estado.st_size, nombre))
+
+    limite_edad = time.time() - settings.CACHE_LECTURAS_TTL_HORAS * 3600
+    limite_bytes = settings.CACHE_LECTURAS_MAX_MB * 1024 * 1024
+    acumulado = 0
+    desalojadas = 0
+
+    # Del uso más reciente al más antiguo
+    for modificado, tamano, nombre in sorted(entradas, reverse=True):
+        acumulado += tamano
+        vencida = settings.CACHE_LECTURAS_TTL_HORAS and modificado < limite_edad
+        if vencida or (limite_bytes and acumulado > limite_bytes):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+                desalojadas += 1
+            except OSError:
+                pass
+
+    if desalojadas:
+        logger.info(f"Caché de lecturas: {desalojadas} lecturas desalojadas")
+    return desalojadas
@@ -0,0 +1,122 @@
+"""
+Caché de resultados de procesamiento por contenido
+
+La clave combina el SHA-256 del archivo de ventas, los parámetros del
+procesamiento y la versión de los diccionarios. Si un archivo idéntico se
+vuelve a enviar con los mismos parámetros (y los diccionarios no cambiaron),
+se reutiliza el registro de historial y el Excel ya generados.
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import ProcesamientoHistorial
+
+logger = logging.getLogger(__name__)
+
+
+def clave_resultado(
+    sha256_archivo: str,
+    mes: str,
+    subdiario_inicial: int,
+    numero_comprobante_inicial: int,
+    version_diccionarios: int
+) -> str:
+    """Clave de caché de un procesamiento"""
+    partes = [sha256_archivo, mes, str(subdiario_inicial), str(numero_comprobante_inicial), str(version_diccionarios)]
+    return hashlib.sha256("|".join(partes).encode()).hexdigest()
+
+
+def huella_lote(archivos: List[Tuple[str, str]]) -> str:
+    """Huella del contenido de un lote ([(nombre, sha256), ...] en el orden del lote)"""
+    return hashlib.sha256("\n".join(f"{nombre}:{sha256}" for nombre, sha256 in archivos).encode("utf-8")).hexdigest()
+
+
+def _ahora_utc() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _fecha_utc(fecha: datetime) -> datetime:
+    """created_at como UTC sin zona (SQLite lo guarda sin zona, PostgreSQL con zona)"""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def _vencido(historial: ProcesamientoHistorial, ahora: datetime) -> bool:
+    if not settings.CACHE_RESULTADOS_TTL_HORAS or historial.created_at is None:
+        return False
+    return _fecha_utc(historial.created_at) < ahora - timedelta(hours=settings.CACHE_RESULTADOS_TTL_HORAS)
+
+
+def _ruta_salida(historial: ProcesamientoHistorial) -> Optional[str]:
+    if not historial.archivo_salida:
+        return None
+    return os.path.join(settings.UPLOAD_DIR, historial.archivo_salida)
+
+
+def buscar_resultado(db: Session, clave: str) -> Optional[ProcesamientoHistorial]:
+    """Procesamiento completado con la misma clave cuyo Excel sigue disponible"""
+    if not settings.CACHE_RESULTADOS_ACTIVO:
+        return None
+
+    historial = db.query(ProcesamientoHistorial).filter(
+        ProcesamientoHistorial.cache_key == clave,
+        ProcesamientoHistorial.estado == "completado"
+    ).order_by(ProcesamientoHistorial.created_at.desc()).first()
+
+    if historial is None or _vencido(historial, _ahora_utc()):
+        return None
+
+    ruta = _ruta_salida(historial)
+    if ruta is None or not os.path.exists(ruta):
+        return None
+
+    return historial
+
+
+def purgar_resultados(db: Session) -> int:
+    """
+    Aplicar la política de la caché: dejan de reutilizarse los resultados más
+    antiguos que CACHE_RESULTADOS_TTL_HORAS y, del más nuevo al más viejo, los
+    que excedan CACHE_RESULTADOS_MAX_MB en total (0 desactiva cada límite).
+    Solo se quita la clave: el Excel sigue disponible para descargar hasta que
+    lo desaloje el barrido de almacenamiento (app/services/almacenamiento.py).
+    Devuelve la cantidad de resultados desalojados.
+    """
+    if not settings.CACHE_RESULTADOS_ACTIVO:
+        return 0
+
+    ahora = _ahora_utc()
+    limite_bytes = settings.CACHE_RESULTADOS_MAX_MB * 1024 * 1024
+    acumulado = 0
+    desalojados = 0
+
+    entradas = db.query(ProcesamientoHistorial).filter(
+        ProcesamientoHistorial.cache_key.isnot(None),
+        ProcesamientoHistorial.estado == "completado"
+    ).order_by(ProcesamientoHistorial.created_at.desc(), ProcesamientoHistorial.id.desc()).all()
+
+    for historial in entradas:
+        ruta = _ruta_salida(historial)
+        tamano = os.path.getsize(ruta) if ruta and os.path.exists(ruta) else None
+
+        if tamano is None:
+            # El Excel ya no existe: la entrada no sirve como caché
+            historial.cache_key = None
+            continue
+
+        acumulado += tamano
+        if _vencido(historial, ahora) or (limite_bytes and acumulado > limite_bytes):
+            historial.cache_key = None
+            desalojados += 1
+
+    db.commit()
+    if desalojados:
+        logger.info(f"Caché de resultados: {desalojados} resultados desalojados")
+    return desalojados
@@ -0,0 +1,162 @@
+"""
+Caché en memoria de la autenticación: tokens decodificados y usuarios
+
+get_current_user se ejecuta en cada llamada a la API. Los tokens ya
+decodificados se guardan hasta su vencimiento y los datos del usuario por
+AUTH_CACHE_USUARIOS_TTL_SEGUNDOS, de modo que una llamada autenticada no
+consulta la base de datos.
+
+Los cambios de usuarios hechos con el ORM (activar, desactivar, cambiar
+permisos, borrar) invalidan la caché al confirmarse la transacción, por los
+eventos de SQLAlchemy registrados aquí. La caché es por proceso: en otros
+workers el cambio se ve al vencer el TTL.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.core.metricas import REGISTRO
+from app.core.security import decode_access_token
+from app.models.models import Usuario
+
+logger = logging.getLogger(__name__)
+
+ACCESOS = REGISTRO.contador(
+    "ventas_auth_cache_total", "Consultas a la caché de autenticación", ["cache", "resultado"]
+)
+
+# Marca en session.info de los usuarios a invalidar al confirmar ("*" = todos)
+_PENDIENTES = "usuarios_modificados"
+_TODOS = "*"
+
+_lock = threading.Lock()
+# token -> (vencimiento, payload), del menos al más usado recientemente
+_tokens: "OrderedDict[str, tuple]" = OrderedDict()
+# email -> (vencimiento, columnas del usuario)
+_usuarios: Dict[str, tuple] = {}
+
+
+def payload_token(token: str) -> Optional[dict]:
+    """Payload del token (None si es inválido o venció), decodificado una sola vez"""
+    ahora = time.time()
+    with _lock:
+        entrada = _tokens.get(token)
+        if entrada is not None:
+            if entrada[0] > ahora:
+                _tokens.move_to_end(token)
+                ACCESOS.inc(cache="tokens", resultado="acierto")
+                return entrada[1]
+            del _tokens[token]
+
+    ACCESOS.inc(cache="tokens", resultado="fallo")
+    payload = decode_access_token(token)
+    if payload is None or settings.AUTH_CACHE_TOKENS_MAX <= 0:
+        return payload
+
+    # Sin "exp" el token no vence: se guarda como máximo el TTL de los usuarios
+    vencimiento = payload.get("exp") or ahora + settings.AUTH_CACHE_USUARIOS_TTL_SEGUNDOS
+    with _lock:
+        _tokens[token] = (float(vencimiento), payload)
+        while len(_tokens) > settings.AUTH_CACHE_TOKENS_MAX:
+            _tokens.popitem(last=False)
+    return payload
+
+
+def _columnas(usuario: Usuario) -> dict:
+    # El hash de la contraseña no hace falta para autorizar: no se guarda
+    return {
+        columna.key: getattr(usuario, columna.key)
+        for columna in inspect(Usuario).column_attrs
+        if columna.key != "hashed_password"
+    }
+
+
+def obtener_usuario(db: Session, email: str) -> Optional[Usuario]:
+    """
+    Usuario con el email (sujeto del token), desde la caché si no venció.
+    Se devuelve una instancia nueva sin sesión con los datos del usuario:
+    sirve para leer sus datos, no para modificarlo.
+    """
+    ahora = time.time()
+    entrada = _usuarios.get(email)
+    if entrada is not None and entrada[0] > ahora:
+        ACCESOS.inc(cache="usuarios", resultado="acierto")
+        return Usuario(**entrada[1])
+
+    ACCESOS.inc(cache="usuarios", resultado="fallo")
+    usuario = db.query(Usuario).filter(Usuario.email == email).first()
+    if usuario is None:
+        return None
+
+    datos = _columnas(usuario)
+    if settings.AUTH_CACHE_USUARIOS_TTL_SEGUNDOS > 0:
+        with _lock:
+            _usuarios[email] = (ahora + settings.AUTH_CACHE_USUARIOS_TTL_SEGUNDOS, datos)
+    return Usuario(**datos)
+
+
+def invalidar_usuario(email: Optional[str] = None):
+    """Quitar un usuario de la caché (todos si no se indica)"""
+    with _lock:
+        if email is None:
+            _usuarios.clear()
+        else:
+            _usuarios.pop(email, None)
+
+
+def limpiar():
+    """Vaciar la caché de tokens y usuarios"""
+    with _lock:
+        _tokens.clear()
+        _usuarios.clear()
+
+
+# --- Invalidación por eventos del ORM ---
+
+def _marcar(session: Optional[Session], emails: Set[str]):
+    if session is None:
+        for email in emails:
+            invalidar_usuario(None if email == _TODOS else email)
+        return
+    session.info.setdefault(_PENDIENTES, set()).update(emails)
+
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _usuario_modificado(mapper, connection, usuario: Usuario):
+    # También el email anterior si se cambió
+    historia = inspect(usuario).attrs.email.history
+    emails = {email for email in [usuario.email, *historia.deleted] if email}
+    _marcar(object_session(usuario), emails)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _actualizacion_masiva(estado):
+    """UPDATE o DELETE sobre usuarios sin cargar las instancias (query.update)"""
+    if (estado.is_update or estado.is_delete) and estado.bind_mapper is not None \
+            and estado.bind_mapper.class_ is Usuario:
+        _marcar(estado.session, {_TODOS})
+
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(session: Session):
+    emails = session.info.pop(_PENDIENTES, None)
+    if not emails:
+        return
+    if _TODOS in emails:
+        invalidar_usuario()
+    else:
+        for email in emails:
+            invalidar_usuario(email)
+    logger.debug(f"Caché de usuarios invalidada: {sorted(emails)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _al_revertir(session: Session):
+    session.info.pop(_PENDIENTES, None)
@@ -0,0 +1,104 @@
+"""
+Validadores y variantes de los archivos de salida para su descarga
+
+El ETag (SHA-256 del contenido), el tamaño y la fecha de modificación del
+Excel de asientos se calculan una vez, al escribirlo, y se guardan en el
+historial. La variante .zip se genera la primera vez que se pide, junto al
+archivo, y es determinista: el mismo Excel produce siempre el mismo .zip,
+así que su ETag se deriva del ETag del Excel.
+"""
+import hashlib
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+# Tamaño de los bloques leídos al calcular el hash y al comprimir
+TAMANO_BLOQUE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Validadores:
+    etag: str  # Sin comillas
+    tamano: int
+    modificado: datetime  # UTC
+
+
+def _modificado(path: str) -> datetime:
+    return datetime.fromtimestamp(int(os.stat(path).st_mtime), tz=timezone.utc)
+
+
+def calcular_validadores(path: str) -> Validadores:
+    """ETag por contenido, tamaño y fecha de modificación (al segundo) de un archivo"""
+    hash_contenido = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b""):
+            hash_contenido.update(bloque)
+    return Validadores(
+        etag=hash_contenido.hexdigest(),
+        tamano=os.path.getsize(path),
+        modificado=_modificado(path)
+    )
+
+
+def validadores_por_stat(path: str) -> Validadores:
+    """
+    Validadores sin leer el archivo, a partir de su tamaño y fecha de
+    modificación: para archivos sin ETag guardado
+    """
+    stat = os.stat(path)
+    base = f"{stat.st_mtime_ns}-{stat.st_size}"
+    return Validadores(
+        etag=hashlib.sha256(base.encode()).hexdigest(),
+        tamano=stat.st_size,
+        modificado=_modificado(path)
+    )
+
+
+def validadores_guardados(
+    path: str,
+    etag: Optional[str],
+    tamano: Optional[int],
+    modificado: Optional[datetime]
+) -> Validadores:
+    """Validadores del historial, o por stat si el archivo es anterior a ellos"""
+    if not etag or tamano is None or modificado is None:
+        return validadores_por_stat(path)
+    if modificado.tzinfo is None:
+        modificado = modificado.replace(tzinfo=timezone.utc)
+    return Validadores(etag=etag, tamano=tamano, modificado=modificado)
+
+
+def ruta_zip(path: str) -> str:
+    return f"{path}.zip"
+
+
+def obtener_zip(path: str, nombre: str, validadores: Validadores) -> Validadores:
+    """
+    Generar (si no existe) el .zip con el archivo `path` guardado como
+    `nombre`, y devolver sus validadores. La fecha de la entrada es la del
+    archivo original para que el .zip no cambie entre generaciones.
+    """
+    destino = ruta_zip(path)
+    if not os.path.exists(destino):
+        entrada = zipfile.ZipInfo(nombre, date_time=validadores.modificado.timetuple()[:6])
+        entrada.compress_type = zipfile.ZIP_DEFLATED
+
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp.zip")
+        try:
+            with os.fdopen(descriptor, "wb") as f, zipfile.ZipFile(f, "w") as zf:
+                with open(path, "rb") as origen, zf.open(entrada, "w") as salida:
+                    for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b""):
+                        salida.write(bloque)
+            os.replace(temporal, destino)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    return Validadores(
+        etag=f"{validadores.etag}-zip",
+        tamano=os.path.getsize(destino),
+        modificado=validadores.modificado
+    )
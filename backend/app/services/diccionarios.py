@@ -0,0 +1,94 @@
+"""
+Caché en memoria de los diccionarios de cuentas y combos
+
+Los diccionarios compilados se guardan por proceso junto con la versión con la
+que se cargaron. La versión vive en la base de datos (tabla diccionario_version),
+así que un cambio hecho desde cualquier worker invalida la caché de todos: cada
+consulta solo lee el número de versión y recarga los diccionarios si cambió.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.models import ComboSalto, DiccionarioVersion, ProductoCuenta
+
+logger = logging.getLogger(__name__)
+
+VERSION_ID = 1
+
+
+@dataclass(frozen=True)
+class Diccionarios:
+    version: int
+    cuentas: Dict[str, str]
+    combos: Dict[str, int]
+
+
+_cache: Optional[Diccionarios] = None
+_lock = threading.Lock()
+
+
+def obtener_version(db: Session) -> int:
+    """Versión actual de los diccionarios (0 si nunca se modificaron)"""
+    version = db.query(DiccionarioVersion.version).filter(DiccionarioVersion.id == VERSION_ID).scalar()
+    return version or 0
+
+
+def incrementar_version(db: Session) -> None:
+    """
+    Marcar los diccionarios como modificados. Se ejecuta en la misma
+    transacción que el cambio, antes del commit del endpoint.
+    """
+    resultado = db.execute(
+        update(DiccionarioVersion)
+        .where(DiccionarioVersion.id == VERSION_ID)
+        .values(version=DiccionarioVersion.version + 1)
+    )
+    if resultado.rowcount == 0:
+        db.add(DiccionarioVersion(id=VERSION_ID, version=1))
+
+
+def _cargar(db: Session, version: int) -> Diccionarios:
+    """Leer los diccionarios activos como tuplas (sin instanciar objetos ORM)"""
+    cuentas = db.query(ProductoCuenta.producto, ProductoCuenta.cuenta_contable).filter(
+        ProductoCuenta.activo == True
+    ).all()
+    combos = db.query(ComboSalto.combo, ComboSalto.salto).filter(
+        ComboSalto.activo == True
+    ).all()
+    return Diccionarios(version=version, cuentas=dict(cuentas), combos=dict(combos))
+
+
+def obtener_diccionarios(db: Session) -> Diccionarios:
+    """
+    Diccionarios activos de cuentas y combos, desde la caché si la versión
+    guardada en la base de datos no cambió
+    """
+    global _cache
+    version = obtener_version(db)
+
+    cache = _cache
+    if cache is not None and cache.version == version:
+        return cache
+
+    with _lock:
+        if _cache is not None and _cache.version == version:
+            return _cache
+        # Si la versión cambia durante la carga, la siguiente consulta recarga
+        _cache = _cargar(db, version)
+        logger.info(
+            f"Diccionarios cargados (versión {version}): "
+            f"{len(_cache.cuentas)} cuentas, {len(_cache.combos)} combos"
+        )
+        return _cache
+
+
+def limpiar_cache() -> None:
+    """Descartar los diccionarios en memoria de este proceso"""
+    global _cache
+    with _lock:
+        _cache = None
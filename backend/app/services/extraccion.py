@@ -0,0 +1,292 @@
+"""
+Motores de extracción de boletas desde el reporte de ventas
+"""
+import math
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+from app.services.boletas import BoletasColumnares
+
+# Estados que identifican una fila de cabecera de comprobante
+ESTADOS_CABECERA = ["Activa", "Anulada"]
+
+# Productos que generan la línea adicional del impuesto a la bolsa
+PRODUCTOS_BOLSA = ["Bolsa -", "Bolsa"]
+CODIGO_IMPUESTO_BOLSA = '701112'
+
+# Filas revisadas (desde la cabecera) buscando "Detalle de venta"
+FILAS_BUSQUEDA_DETALLE = 7
+
+# Filas ya procesadas que se acumulan antes de liberarlas del buffer de streaming
+FILAS_COMPACTACION = 512
+
+# Números con separador de miles ("1,234.50"), como los que convierte pd.read_html
+_RE_NUMERO_MILES = re.compile(r"[-+]?[0-9,]+(\.[0-9]*)?")
+
+
+def _texto(valores: np.ndarray) -> np.ndarray:
+    """Equivalente en bloque de str(valor).strip() para un array de celdas"""
+    return pd.Series(valores, dtype=object).astype(str).str.strip().to_numpy()
+
+
+def _numerico(valores: np.ndarray) -> np.ndarray:
+    """Equivalente en bloque de pd.to_numeric(valor, errors='coerce')"""
+    return np.asarray(pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce'), dtype=float)
+
+
+def extraer_info_vectorizado(df: pd.DataFrame, diccionario_combos: Dict[str, int]) -> BoletasColumnares:
+    """
+    Extrae las boletas del reporte trabajando sobre los arrays NumPy del DataFrame.
+
+    Genera las mismas boletas que el motor legacy, directamente en arrays
+    columnares: las cabeceras, las marcas "Detalle de venta", las columnas
+    numéricas del detalle y los saltos de combo se resuelven con operaciones
+    sobre arrays completos. Solo las boletas que contienen un combo se
+    recorren línea por línea.
+    """
+    num_rows = df.shape[0]
+    if num_rows == 0:
+        return BoletasColumnares.vacias()
+
+    def columna(k: int) -> np.ndarray:
+        return df.iloc[:, k].to_numpy()
+
+    # Filas de cabecera ("Activa" / "Anulada")
+    estados = _texto(columna(20))
+    cabeceras = np.flatnonzero(np.isin(estados, ESTADOS_CABECERA))
+    if len(cabeceras) == 0:
+        return BoletasColumnares.vacias()
+
+    # Primera marca "Detalle de venta" a menos de 7 filas de cada cabecera
+    col_fecha = columna(0)
+    marcas = np.append(np.flatnonzero(_texto(col_fecha) == "Detalle de venta"), np.iinfo(np.int64).max)
+    marca = marcas[np.searchsorted(marcas, cabeceras)]
+    encontrada = (marca - cabeceras) < FILAS_BUSQUEDA_DETALLE
+
+    # El motor legacy falla al buscar la marca más allá del final del archivo
+    if np.any(~encontrada & (cabeceras + FILAS_BUSQUEDA_DETALLE > num_rows)):
+        raise IndexError("single positional indexer is out-of-bounds")
+
+    cabeceras = cabeceras[encontrada]
+    inicios = np.minimum(marca[encontrada] + 2, num_rows)
+    num_boletas = len(cabeceras)
+
+    # Columnas del detalle: cantidad (0), producto (2) e importe de la línea (6)
+    productos = _texto(columna(2))
+    importes = _numerico(columna(6))
+    cantidades = _numerico(col_fecha)
+
+    # Una línea termina el detalle si no tiene importe, es "N/N" o no tiene cantidad
+    parada = np.isnan(importes) | (productos == "N/N") | np.isnan(cantidades)
+
+    # Salto de cada fila: el del combo o 1 para el resto de productos
+    salto = np.ones(num_rows, dtype=np.int64)
+    if diccionario_combos:
+        posicion = pd.Index(list(diccionario_combos.keys())).get_indexer(productos)
+        saltos_combo = np.array(list(diccionario_combos.values()), dtype=np.int64)
+        es_combo = posicion >= 0
+        salto[es_combo] = saltos_combo[posicion[es_combo]]
+
+    # Sin combos antes de la primera parada, el detalle es un rango contiguo de filas
+    paradas = np.append(np.flatnonzero(parada), num_rows)
+    con_salto = np.append(np.flatnonzero(salto != 1), num_rows)
+    fines = paradas[np.searchsorted(paradas, inicios)]
+    contiguo = con_salto[np.searchsorted(con_salto, inicios)] >= fines
+    longitudes = np.where(contiguo, fines - inicios, 0)
+
+    # Las boletas con combos siguen los saltos uno a uno
+    recorridos = {}
+    if not np.all(contiguo):
+        parada_l = parada.tolist()
+        salto_l = salto.tolist()
+        for b in np.flatnonzero(~contiguo).tolist():
+            filas_b = []
+            i_detalle = int(inicios[b])
+            while i_detalle < num_rows and not parada_l[i_detalle]:
+                filas_b.append(i_detalle)
+                i_detalle += salto_l[i_detalle]
+            recorridos[b] = filas_b
+            longitudes[b] = len(filas_b)
+
+    limites = np.zeros(num_boletas + 1, dtype=np.int64)
+    np.cumsum(longitudes, out=limites[1:])
+    filas = np.repeat(inicios - limites[:-1], longitudes) + np.arange(limites[-1])
+    for b, filas_b in recorridos.items():
+        filas[limites[b]:limites[b + 1]] = filas_b
+
+    # Importe de cada línea (las bolsas sin importe se valorizan a 0.50 por unidad)
+    producto_linea = productos[filas]
+    importe_linea = importes[filas]
+    es_bolsa = np.isin(producto_linea, PRODUCTOS_BOLSA)
+    costo_bolsa = np.where(importe_linea > 0, importe_linea, cantidades[filas] * 0.5)
+    valor_linea = np.where(es_bolsa, costo_bolsa, importe_linea)
+
+    # Cada bolsa agrega la línea del impuesto inmediatamente después
+    boleta_linea = np.repeat(np.arange(num_boletas), longitudes)
+    extras = np.bincount(boleta_linea[es_bolsa], minlength=num_boletas)
+    offsets = np.zeros(num_boletas + 1, dtype=np.int64)
+    np.cumsum(longitudes + extras, out=offsets[1:])
+
+    codigos_linea, productos_distintos = pd.factorize(producto_linea)
+    productos_distintos = list(productos_distintos)
+    posicion = np.arange(len(filas)) + np.cumsum(es_bolsa) - es_bolsa
+    codigos = np.empty(offsets[-1], dtype=np.int32)
+    valores = np.empty(offsets[-1], dtype=np.float64)
+    codigos[posicion] = codigos_linea
+    valores[posicion] = valor_linea
+    if es_bolsa.any():
+        if CODIGO_IMPUESTO_BOLSA not in productos_distintos:
+            productos_distintos.append(CODIGO_IMPUESTO_BOLSA)
+        codigos[posicion[es_bolsa] + 1] = productos_distintos.index(CODIGO_IMPUESTO_BOLSA)
+        valores[posicion[es_bolsa] + 1] = 0
+
+    # Datos de cabecera de cada boleta
+    dnirucs = _texto(columna(6)[cabeceras])
+    clientes = _texto(columna(5)[cabeceras])
+    varios = dnirucs == "00000000"
+    clientes[varios] = "Clientes Varios"
+
+    def objetos(valores: List) -> np.ndarray:
+        columna_objetos = np.empty(len(valores), dtype=object)
+        columna_objetos[:] = valores
+        return columna_objetos
+
+    return BoletasColumnares(
+        fecha=pd.Series(columna(0)[cabeceras]).astype(object).to_numpy(),
+        dniruc=objetos([dniruc[:40] for dniruc in dnirucs.tolist()]),
+        cliente=objetos([cliente[:40] for cliente in clientes.tolist()]),
+        num=objetos([str(num) for num in columna(8)[cabeceras].tolist()]),
+        serie=objetos([str(serie) for serie in columna(9)[cabeceras].tolist()]),
+        total=pd.Series(columna(17)[cabeceras], dtype=object).infer_objects().to_numpy(),
+        anulada=estados[cabeceras] == "Anulada",
+        offsets=offsets,
+        codigos=codigos,
+        importes=valores,
+        productos=objetos(productos_distintos)
+    )
+
+
+def _celda(fila: Sequence, k: int):
+    """Valor de la columna k (NaN si la fila es más corta)"""
+    return fila[k] if k < len(fila) else math.nan
+
+
+def _a_numero(valor):
+    """Equivalente escalar y rápido de pd.to_numeric(valor, errors='coerce')"""
+    if isinstance(valor, (int, float, np.number)):
+        return valor
+    if isinstance(valor, str):
+        try:
+            return float(valor)
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def _es_nan(valor) -> bool:
+    return isinstance(valor, (float, np.floating)) and math.isnan(valor)
+
+
+def _columna_numerica(valor):
+    """
+    Las columnas SerieDoc, NumDoc y Total solo tienen valores en las cabeceras,
+    por eso pandas las convierte a float cuando todos son numéricos. En streaming
+    no se conoce la columna completa y se aplica la misma conversión por celda.
+    """
+    if isinstance(valor, str) and "," in valor and _RE_NUMERO_MILES.fullmatch(valor.strip()):
+        valor = valor.replace(",", "")
+    numero = _a_numero(valor)
+    if isinstance(valor, bool) or _es_nan(numero):
+        return valor
+    return float(numero)
+
+
+def iter_boletas_streaming(
+    filas: Iterable[Sequence],
+    diccionario_combos: Dict[str, int]
+) -> Iterator[list]:
+    """
+    Motor de extracción en streaming: consume las filas del reporte a medida
+    que se leen y entrega cada boleta ([datos_boleta, [[producto, importe], ...]])
+    apenas se completa su detalle.
+
+    Sigue las mismas reglas que el motor legacy, pero solo retiene en memoria
+    las filas entre la cabecera en curso y el final de su detalle, de modo que
+    el consumo no depende del número de boletas del archivo.
+    """
+    iterador = iter(filas)
+    buffer: List[Sequence] = []
+    base = 0
+    agotado = False
+
+    def fila(idx: int):
+        nonlocal agotado
+        while not agotado and idx - base >= len(buffer):
+            try:
+                buffer.append(next(iterador))
+            except StopIteration:
+                agotado = True
+        if idx - base < len(buffer):
+            return buffer[idx - base]
+        return None
+
+    i = 0
+    while True:
+        actual = fila(i)
+        if actual is None:
+            break
+
+        estado = str(_celda(actual, 20)).strip()
+        if estado in ESTADOS_CABECERA:
+            dniruc = str(_celda(actual, 6)).strip()
+            nombre = str(_celda(actual, 5)).strip()
+            if dniruc == "00000000":
+                nombre = "Clientes Varios"
+            datos_boleta = {
+                "Fecha": _celda(actual, 0),
+                "DNIRUC": dniruc[:40],
+                "Cliente": nombre[:40],
+                "Num": str(_columna_numerica(_celda(actual, 8))),
+                "Serie": str(_columna_numerica(_celda(actual, 9))),
+                "Total": _columna_numerica(_celda(actual, 17)),
+                "Estado": estado
+            }
+
+            i_detalle = None
+            for n in range(FILAS_BUSQUEDA_DETALLE):
+                candidata = fila(i + n)
+                if candidata is None:
+                    raise IndexError("single positional indexer is out-of-bounds")
+                if str(_celda(candidata, 0)).strip() == "Detalle de venta":
+                    i_detalle = i + n + 2
+                    break
+
+            if i_detalle is not None:
+                comida = []
+                while True:
+                    linea = fila(i_detalle)
+                    if linea is None:
+                        break
+                    importe_linea = _a_numero(_celda(linea, 6))
+                    producto = str(_celda(linea, 2)).strip()
+                    cantidad = _a_numero(_celda(linea, 0))
+                    if _es_nan(importe_linea) or producto == "N/N" or _es_nan(cantidad):
+                        break
+
+                    if producto in PRODUCTOS_BOLSA:
+                        costo_bolsa = importe_linea if importe_linea > 0 else cantidad * 0.5
+                        comida.append([producto, costo_bolsa])
+                        comida.append([CODIGO_IMPUESTO_BOLSA, 0])
+                    else:
+                        comida.append([producto, importe_linea])
+
+                    i_detalle += diccionario_combos.get(producto, 1)
+
+                yield [datos_boleta, comida]
+
+        i += 1
+        if i - base >= FILAS_COMPACTACION:
+            del buffer[:i - base]
+            base = i
@@ -0,0 +1,254 @@
+"""
+Importación masiva de los diccionarios de productos-cuentas y combos
+
+La hoja se normaliza y depura en memoria, los registros existentes se leen con
+una sola consulta y las altas/cambios se escriben en lotes (INSERT ... ON
+CONFLICT en PostgreSQL y SQLite), con una transacción por lote. Si un lote
+falla se reintenta fila por fila para informar el error de cada fila.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import ComboSalto, ProductoCuenta
+
+logger = logging.getLogger(__name__)
+
+# Máximo de errores incluidos en el mensaje de respuesta
+MAX_ERRORES_MENSAJE = 5
+
+
+@dataclass
+class ResultadoImportacion:
+    procesados: int = 0
+    insertados: int = 0
+    actualizados: int = 0
+    omitidos: int = 0
+    duplicados: int = 0
+    errores: List[str] = field(default_factory=list)
+
+    @property
+    def guardados(self) -> int:
+        return self.insertados + self.actualizados + self.omitidos + self.duplicados
+
+
+def _texto_limpio(columna: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    str(valor).strip() en bloque y máscara de celdas utilizables
+    (no vacías, no NaN y distintas del texto 'nan')
+    """
+    texto = columna.astype(str).str.strip()
+    valido = columna.notna() & (texto != "") & (texto.str.lower() != "nan")
+    return texto, valido
+
+
+def limpiar_productos(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Normalizar las columnas Producto/Asiento de la hoja importada.
+
+    Devuelve un DataFrame (indexado por la fila original) con las columnas
+    producto y cuenta_contable, sin filas vacías, y la lista de errores de las
+    filas que no cumplen las longitudes del modelo.
+    """
+    producto, producto_valido = _texto_limpio(df["Producto"])
+    cuenta, cuenta_valida = _texto_limpio(df["Asiento"])
+
+    registros = pd.DataFrame({"producto": producto, "cuenta_contable": cuenta})
+    registros = registros[producto_valido & cuenta_valida]
+
+    errores = []
+    largo_producto = registros["producto"].str.len() > ProductoCuenta.producto.type.length
+    largo_cuenta = registros["cuenta_contable"].str.len() > ProductoCuenta.cuenta_contable.type.length
+    for idx, fila in registros[largo_producto].iterrows():
+        errores.append(f"Fila {idx} ({fila['producto'][:40]}): producto excede {ProductoCuenta.producto.type.length} caracteres")
+    for idx, fila in registros[largo_cuenta & ~largo_producto].iterrows():
+        errores.append(f"Fila {idx} ({fila['producto']}): cuenta contable excede {ProductoCuenta.cuenta_contable.type.length} caracteres")
+
+    return registros[~(largo_producto | largo_cuenta)], errores
+
+
+def limpiar_combos(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Normalizar las columnas Combo/Salto de la hoja importada.
+
+    El salto se convierte a entero truncando los decimales (como int(float(x)));
+    las filas con un salto no numérico se informan como error.
+    """
+    combo, combo_valido = _texto_limpio(df["Combo"])
+    salto_original = df["Salto"]
+    filas = combo_valido & salto_original.notna()
+
+    salto = pd.to_numeric(
+        salto_original.map(lambda v: v.strip() if isinstance(v, str) else v),
+        errors="coerce"
+    )
+    salto_valido = salto.notna() & np.isfinite(salto.astype(float))
+
+    errores = [
+        f"Fila {idx}: salto inválido '{salto_original[idx]}'"
+        for idx in df.index[filas & ~salto_valido]
+    ]
+    largo = combo.str.len() > ComboSalto.combo.type.length
+    for idx in df.index[filas & salto_valido & largo]:
+        errores.append(f"Fila {idx} ({combo[idx][:40]}): combo excede {ComboSalto.combo.type.length} caracteres")
+
+    validas = filas & salto_valido & ~largo
+    registros = pd.DataFrame({
+        "combo": combo[validas],
+        "salto": np.trunc(salto[validas].astype(float)).astype(np.int64)
+    })
+    return registros, errores
+
+
+def _sentencia_upsert(db: Session, modelo, clave: str, columnas: Optional[List[str]]):
+    """
+    INSERT ... ON CONFLICT (clave) DO UPDATE (DO NOTHING si no se indican
+    columnas a actualizar), o None si el motor no lo soporta
+    """
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        sentencia = postgresql.insert(modelo)
+    elif dialecto == "sqlite":
+        sentencia = sqlite.insert(modelo)
+    else:
+        return None
+
+    if columnas is None:
+        return sentencia.on_conflict_do_nothing(index_elements=[clave])
+
+    cambios = {col: sentencia.excluded[col] for col in columnas}
+    cambios["updated_at"] = func.now()
+    return sentencia.on_conflict_do_update(index_elements=[clave], set_=cambios)
+
+
+def _escribir(db: Session, modelo, clave: str, upsert, filas: List[dict], existentes: Dict[str, int]):
+    """Escribir un grupo de filas (sin commit)"""
+    if upsert is not None:
+        db.execute(upsert, filas)
+        return
+
+    # Motores sin ON CONFLICT: altas y cambios por separado (executemany)
+    nuevos = [fila for fila in filas if fila[clave] not in existentes]
+    cambiados = [{"id": existentes[fila[clave]], **fila} for fila in filas if fila[clave] in existentes]
+    if nuevos:
+        db.execute(insert(modelo), nuevos)
+    if cambiados:
+        db.execute(update(modelo), cambiados)
+
+
+def importar_registros(
+    db: Session,
+    modelo,
+    clave: str,
+    registros: pd.DataFrame,
+    resultado: ResultadoImportacion,
+    actualizar: bool = True
+) -> ResultadoImportacion:
+    """
+    Aplicar en la base de datos los registros ya limpios de un diccionario.
+
+    Los duplicados se resuelven en memoria (gana la última fila, igual que
+    al importar fila por fila), las filas idénticas a lo guardado se omiten y
+    el resto se escribe por lotes de settings.IMPORTACION_LOTE filas.
+    Con actualizar=False solo se agregan las claves nuevas y las existentes
+    se cuentan como omitidas.
+    """
+    columnas = [c for c in registros.columns if c != clave]
+    resultado.procesados += len(registros)
+
+    # Depurar duplicados de la hoja
+    duplicado = registros.duplicated(subset=[clave], keep="last")
+    resultado.duplicados += int(duplicado.sum())
+    registros = registros[~duplicado]
+
+    # Registros existentes en una sola consulta
+    consulta = db.query(modelo.id, getattr(modelo, clave), modelo.activo, *[getattr(modelo, c) for c in columnas])
+    actuales = pd.DataFrame(consulta.all(), columns=["id", clave, "activo", *columnas])
+    existentes: Dict[str, int] = dict(zip(actuales[clave], actuales["id"]))
+
+    # Diferencia por conjuntos: nuevas, con cambios o iguales a lo guardado
+    cruce = registros.merge(actuales, on=clave, how="left", suffixes=("", "_actual"), indicator=True)
+    existe = (cruce["_merge"] == "both").to_numpy()
+    igual = existe & (cruce["activo"] == True).to_numpy()
+    for col in columnas:
+        igual &= (cruce[col] == cruce[f"{col}_actual"]).to_numpy()
+
+    if actualizar:
+        escribir = ~igual
+        resultado.omitidos += int(igual.sum())
+    else:
+        escribir = ~existe
+        resultado.omitidos += int(existe.sum())
+
+    pendientes: List[Tuple[object, dict]] = []
+    por_escribir = registros[escribir]
+    for idx, fila in zip(por_escribir.index, por_escribir.to_dict("records")):
+        fila["activo"] = True
+        pendientes.append((idx, fila))
+
+    upsert = _sentencia_upsert(db, modelo, clave, columnas + ["activo"] if actualizar else None)
+
+    def contar(fila: dict):
+        if fila[clave] in existentes:
+            resultado.actualizados += 1
+        else:
+            resultado.insertados += 1
+
+    lote = max(1, settings.IMPORTACION_LOTE)
+    for inicio in range(0, len(pendientes), lote):
+        grupo = pendientes[inicio:inicio + lote]
+        try:
+            _escribir(db, modelo, clave, upsert, [fila for _, fila in grupo], existentes)
+            db.commit()
+            for _, fila in grupo:
+                contar(fila)
+        except Exception as error_lote:
+            db.rollback()
+            logger.warning(f"Lote de importación con errores, se reintenta fila por fila: {error_lote}")
+            for idx, fila in grupo:
+                try:
+                    _escribir(db, modelo, clave, upsert, [fila], existentes)
+                    db.commit()
+                    contar(fila)
+                except Exception as error_fila:
+                    db.rollback()
+                    resultado.errores.append(f"Fila {idx} ({fila[clave]}): {str(error_fila)}")
+
+    return resultado
+
+
+def importar_productos(db: Session, df: pd.DataFrame, actualizar: bool = True) -> ResultadoImportacion:
+    """Importar la hoja Producto/Asiento en productos_cuentas"""
+    registros, errores = limpiar_productos(df)
+    resultado = ResultadoImportacion(procesados=len(errores), errores=errores)
+    return importar_registros(db, ProductoCuenta, "producto", registros, resultado, actualizar)
+
+
+def importar_combos(db: Session, df: pd.DataFrame, actualizar: bool = True) -> ResultadoImportacion:
+    """Importar la hoja Combo/Salto en combos_salto"""
+    registros, errores = limpiar_combos(df)
+    resultado = ResultadoImportacion(procesados=len(errores), errores=errores)
+    return importar_registros(db, ComboSalto, "combo", registros, resultado, actualizar)
+
+
+def resumen(resultado: ResultadoImportacion, entidad: str) -> str:
+    """Mensaje de respuesta de la importación"""
+    mensaje = (
+        f"{resultado.guardados} {entidad} guardados exitosamente de {resultado.procesados} procesados "
+        f"({resultado.insertados} nuevos, {resultado.actualizados} actualizados, {resultado.omitidos} omitidos)"
+    )
+    if resultado.duplicados:
+        mensaje += f" ({resultado.duplicados} filas duplicadas)"
+    if resultado.errores:
+        mensaje += f" ({len(resultado.errores)} errores: {'; '.join(resultado.errores[:MAX_ERRORES_MENSAJE])}"
+        if len(resultado.errores) > MAX_ERRORES_MENSAJE:
+            mensaje += "; ..."
+        mensaje += ")"
+    return mensaje
@@ -0,0 +1,611 @@
+"""
+Cola de trabajos de procesamiento ejecutados en un pool de procesos
+
+El endpoint registra el trabajo en ProcesamientoHistorial (estado "pendiente")
+y lo envía al pool; el proceso hijo actualiza el mismo registro con el avance
+y el resultado, de modo que el estado se consulta desde la base de datos.
+
+Los lotes de varios archivos se coordinan desde un hilo del proceso
+principal: cada archivo se extrae en un proceso del pool y las boletas de
+todos se numeran y agrupan juntas en un último trabajo.
+
+Un reprocesamiento vuelve a generar los asientos de un historial con las
+boletas de la caché de lecturas, sin el archivo original. Los envíos de un
+período mensual agregan solo las boletas nuevas al resultado del mes.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging_config import obtener_cola
+from app.services.boletas import BoletasColumnares
+from app.services.metricas import MedidorEtapas, registrar_procesamiento
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_PROCESANDO = "procesando"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+ESTADOS_FINALES = (ESTADO_COMPLETADO, ESTADO_ERROR)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _inicializar_worker(cola_logs):
+    """Enviar los logs de cada proceso del pool a la cola del proceso principal"""
+    from app.core.logging_config import configurar_logging_worker
+
+    configurar_logging_worker(cola_logs)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido (se crea con el primer trabajo)"""
+    global _pool
+    if _pool is None:
+        workers = settings.PROCESAMIENTO_WORKERS or os.cpu_count() or 1
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_worker,
+            initargs=(obtener_cola(),)
+        )
+        logger.info(f"Pool de procesamiento iniciado con {workers} procesos")
+    return _pool
+
+
+def cerrar_pool():
+    """Detener el pool al apagar la aplicación"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _enviar_al_pool(funcion, *args, **kwargs) -> Future:
+    """Enviar una tarea al pool, recreándolo si quedó inutilizable"""
+    global _pool
+    try:
+        return get_pool().submit(funcion, *args, **kwargs)
+    except BrokenProcessPool:
+        # Un proceso del pool murió: se detiene el pool (hilo de gestión y
+        # procesos restantes) y se crea uno nuevo
+        logger.warning("Pool de procesamiento inutilizable, se reinicia")
+        cerrar_pool()
+        return get_pool().submit(funcion, *args, **kwargs)
+
+
+def reconciliar_trabajos() -> int:
+    """
+    Marcar con error los trabajos que quedaron pendientes o procesando: el
+    pool no sobrevive a un reinicio, así que al iniciar ninguno está en
+    curso. Con varios workers de uvicorn todos inician juntos, antes de
+    recibir trabajos. Devuelve la cantidad de trabajos marcados.
+    """
+    from app.core.database import SessionLocal
+    from app.models.models import ProcesamientoHistorial
+
+    db = SessionLocal()
+    try:
+        marcados = db.query(ProcesamientoHistorial).filter(
+            ProcesamientoHistorial.estado.in_([ESTADO_PENDIENTE, ESTADO_PROCESANDO])
+        ).update({
+            "estado": ESTADO_ERROR,
+            "mensaje_error": "El servidor se reinició antes de terminar el procesamiento; vuelva a enviar el archivo"
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    if marcados:
+        logger.warning(f"{marcados} trabajos interrumpidos por el reinicio marcados con error")
+    return marcados
+
+
+def _actualizar_historial(historial_id: int, confirmar: Optional[Callable] = None, **campos):
+    """
+    Actualizar el registro de historial en una sesión propia. `confirmar(db)`
+    aplica otros cambios que se confirman en la misma transacción.
+    """
+    from app.core.database import SessionLocal
+    from app.models.models import ProcesamientoHistorial
+
+    db = SessionLocal()
+    try:
+        if confirmar is not None:
+            confirmar(db)
+        db.query(ProcesamientoHistorial).filter(
+            ProcesamientoHistorial.id == historial_id
+        ).update(campos, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _informar_progreso(historial_id: int, medidor: MedidorEtapas):
+    """Función de avance que registra el porcentaje como etapa de base de datos"""
+    def progreso(porcentaje: int):
+        with medidor.etapa("base_datos", medir_memoria=False):
+            _actualizar_historial(historial_id, progreso=porcentaje)
+    return progreso
+
+
+def _registrar_error(historial_id: int, mensaje: str, medidor: Optional[MedidorEtapas] = None) -> Optional[Dict]:
+    """Marcar el historial con error, guardando las métricas de lo que alcanzó a ejecutarse"""
+    resumen = medidor.resumen(ESTADO_ERROR) if medidor is not None else None
+    _actualizar_historial(
+        historial_id,
+        estado=ESTADO_ERROR,
+        mensaje_error=mensaje,
+        **({"metricas": json.dumps(resumen)} if resumen is not None else {})
+    )
+    return resumen
+
+
+def _purgar_cache_resultados():
+    """Aplicar la política de desalojo de la caché de resultados"""
+    from app.core.database import SessionLocal
+    from app.services.cache_resultados import purgar_resultados
+
+    db = SessionLocal()
+    try:
+        purgar_resultados(db)
+    except Exception:
+        db.rollback()
+        logger.exception("Error al purgar la caché de resultados")
+    finally:
+        db.close()
+
+
+def _guardar_resultado(
+    historial_id: int,
+    df_resultado,
+    codigos_faltantes,
+    output_filename: str,
+    medidor: MedidorEtapas,
+    confirmar: Optional[Callable] = None,
+    **campos
+) -> Dict:
+    """
+    Escribir el Excel de asientos y marcar el historial como completado,
+    con las métricas del trabajo (y los cambios de `confirmar(db)` en la
+    misma transacción). Devuelve el resumen de métricas.
+    """
+    from app.services.almacenamiento import ruta_absoluta, ruta_salida
+    from app.services.descargas import calcular_validadores
+    from app.utils.excel_writer import write_excel_file
+
+    archivo_salida = ruta_salida(output_filename)
+    output_path = ruta_absoluta(archivo_salida)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with medidor.etapa("escribir"):
+        write_excel_file(df_resultado, output_path, engine=settings.SALIDA_ENGINE)
+        # ETag y Last-Modified de la descarga, calculados una sola vez
+        validadores = calcular_validadores(output_path)
+
+    resumen = medidor.resumen(ESTADO_COMPLETADO)
+    _actualizar_historial(
+        historial_id,
+        confirmar=confirmar,
+        total_registros_procesados=len(df_resultado),
+        total_asientos_generados=len(df_resultado),
+        codigos_faltantes=json.dumps(codigos_faltantes, ensure_ascii=False) if codigos_faltantes else None,
+        total_codigos_faltantes=len(codigos_faltantes),
+        archivo_salida=archivo_salida,
+        archivo_salida_etag=validadores.etag,
+        archivo_salida_tamano=validadores.tamano,
+        archivo_salida_modificado=validadores.modificado,
+        estado=ESTADO_COMPLETADO,
+        progreso=100,
+        metricas=json.dumps(resumen),
+        **campos
+    )
+
+    _purgar_cache_resultados()
+    return resumen
+
+
+def ejecutar_procesamiento(
+    historial_id: int,
+    input_path: str,
+    output_filename: str,
+    mes: str,
+    subdiario_inicial: int,
+    numero_comprobante_inicial: int,
+    diccionario_cuentas: Dict[str, str],
+    diccionario_combos: Dict[str, int],
+    clave_lectura: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Trabajo ejecutado en un proceso del pool: procesa el archivo de ventas,
+    escribe el Excel de asientos y registra el resultado en el historial.
+    Con `clave_lectura` las boletas se toman de la caché de lecturas (o se
+    guardan en ella). Devuelve el resumen de métricas del trabajo.
+    """
+    from app.services.procesamiento_service import ProcesamientoService
+
+    medidor = MedidorEtapas()
+    with medidor.etapa("base_datos", medir_memoria=False):
+        _actualizar_historial(historial_id, estado=ESTADO_PROCESANDO, progreso=5)
+
+    try:
+        medidor.datos["tamano_entrada_bytes"] = os.path.getsize(input_path)
+        servicio = ProcesamientoService(diccionario_cuentas, diccionario_combos, medidor=medidor)
+        df_resultado, codigos_faltantes = servicio.procesar_archivo_ventas(
+            input_path,
+            mes,
+            subdiario_inicial,
+            numero_comprobante_inicial,
+            progreso=_informar_progreso(historial_id, medidor),
+            clave_lectura=clave_lectura
+        )
+        medidor.datos.update(servicio.estadisticas)
+
+        # Guardar resultado
+        return _guardar_resultado(historial_id, df_resultado, codigos_faltantes, output_filename, medidor)
+
+    except Exception as e:
+        logger.exception(f"Error en el procesamiento {historial_id}")
+        return _registrar_error(historial_id, str(e), medidor)
+
+    finally:
+        # Limpiar archivo temporal de entrada
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
+
+def extraer_boletas_archivo(
+    input_path: str,
+    diccionario_combos: Dict[str, int],
+    clave_lectura: Optional[str] = None
+) -> Tuple[BoletasColumnares, Dict]:
+    """
+    Tarea del pool para un archivo de un lote: boletas extraídas del reporte
+    (o tomadas de la caché de lecturas) y métricas de su lectura y extracción
+    """
+    from app.services.procesamiento_service import ProcesamientoService
+
+    medidor = MedidorEtapas()
+    medidor.datos["tamano_entrada_bytes"] = os.path.getsize(input_path)
+    servicio = ProcesamientoService({}, diccionario_combos, medidor=medidor)
+    boletas = servicio.extraer_boletas(input_path, clave_lectura)
+    return boletas, medidor.resumen()
+
+
+def _generar_y_guardar(
+    historial_id: int,
+    servicio,
+    boletas_por_archivo: List[Tuple[str, BoletasColumnares]],
+    output_filename: str,
+    mes: str,
+    subdiario_inicial: int,
+    numero_comprobante_inicial: int,
+    detallar: bool
+) -> Dict:
+    """
+    Numerar de forma continua las boletas de los archivos (en ese orden),
+    generar el Excel de asientos y registrar el resultado; con `detallar`
+    se guardan además las estadísticas por archivo (lotes)
+    """
+    medidor = servicio.medidor
+    campos = {}
+    if detallar:
+        detalle = []
+        subdiario, numero = subdiario_inicial, numero_comprobante_inicial
+        for nombre, boletas in boletas_por_archivo:
+            detalle.append(servicio.resumen_archivo(nombre, boletas, mes, subdiario, numero))
+            subdiario, numero = servicio.avanzar_comprobante(subdiario, numero, len(boletas))
+        campos["detalle_archivos"] = json.dumps(detalle, ensure_ascii=False)
+
+    df_resultado, codigos_faltantes = servicio.generar_asientos(
+        BoletasColumnares.concatenar([boletas for _, boletas in boletas_por_archivo]),
+        mes,
+        subdiario_inicial,
+        numero_comprobante_inicial,
+        progreso=_informar_progreso(historial_id, medidor)
+    )
+    medidor.datos.update(servicio.estadisticas)
+
+    return _guardar_resultado(historial_id, df_resultado, codigos_faltantes, output_filename, medidor, **campos)
+
+
+def ejecutar_lote(
+    historial_id: int,
+    boletas_por_archivo: List[Tuple[str, BoletasColumnares]],
+    output_filename: str,
+    mes: str,
+    subdiario_inicial: int,
+    numero_comprobante_inicial: int,
+    diccionario_cuentas: Dict[str, str],
+    diccionario_combos: Dict[str, int],
+    metricas_extraccion: Optional[List[Dict]] = None,
+    segundos_extraccion: float = 0.0
+) -> Optional[Dict]:
+    """
+    Trabajo ejecutado en un proceso del pool con las boletas de todos los
+    archivos de un lote (en el orden del lote): las numera de forma continua,
+    genera un único Excel de asientos y guarda las estadísticas por archivo.
+    Las métricas incluyen la extracción previa de cada archivo (sumadas) y
+    su duración en paralelo; devuelve el resumen de métricas del lote.
+    """
+    from app.services.procesamiento_service import ProcesamientoService
+
+    medidor = MedidorEtapas(segundos_previos=segundos_extraccion)
+    for resumen in metricas_extraccion or []:
+        medidor.agregar(resumen)
+
+    try:
+        servicio = ProcesamientoService(diccionario_cuentas, diccionario_combos, medidor=medidor)
+        return _generar_y_guardar(
+            historial_id,
+            servicio,
+            boletas_por_archivo,
+            output_filename,
+            mes,
+            subdiario_inicial,
+            numero_comprobante_inicial,
+            detallar=True
+        )
+
+    except Exception as e:
+        logger.exception(f"Error en el procesamiento del lote {historial_id}")
+        return _registrar_error(historial_id, str(e), medidor)
+
+
+def ejecutar_reproceso(
+    historial_id: int,
+    archivos: List[Tuple[str, str]],
+    output_filename: str,
+    mes: str,
+    subdiario_inicial: int,
+    numero_comprobante_inicial: int,
+    diccionario_cuentas: Dict[str, str],
+    diccionario_combos: Dict[str, int],
+    lote: bool = False
+) -> Optional[Dict]:
+    """
+    Trabajo ejecutado en un proceso del pool que vuelve a generar los asientos
+    de un procesamiento anterior con las boletas de la caché de lecturas
+    ([(nombre, clave_lectura), ...] en el orden del lote), sin leer los
+    archivos. Devuelve el resumen de métricas del trabajo.
+    """
+    from app.services.procesamiento_service import ProcesamientoService
+
+    medidor = MedidorEtapas()
+    with medidor.etapa("base_datos", medir_memoria=False):
+        _actualizar_historial(historial_id, estado=ESTADO_PROCESANDO, progreso=5)
+
+    try:
+        servicio = ProcesamientoService(diccionario_cuentas, diccionario_combos, medidor=medidor)
+
+        boletas_por_archivo = []
+        for nombre, clave in archivos:
+            boletas = servicio.boletas_en_cache(clave)
+            if boletas is None:
+                raise Exception(
+                    f"La lectura del archivo {nombre} ya no está en la caché; vuelva a subir el archivo"
+                )
+            boletas_por_archivo.append((nombre, boletas))
+
+        return _generar_y_guardar(
+            historial_id,
+            servicio,
+            boletas_por_archivo,
+            output_filename,
+            mes,
+            subdiario_inicial,
+            numero_comprobante_inicial,
+            detallar=lote
+        )
+
+    except Exception as e:
+        logger.exception(f"Error en el reprocesamiento {historial_id}")
+        return _registrar_error(historial_id, str(e), medidor)
+
+
+def ejecutar_incremental(
+    historial_id: int,
+    periodo_id: int,
+    input_path: str,
+    output_filename: str,
+    diccionario_cuentas: Dict[str, str],
+    diccionario_combos: Dict[str, int],
+    clave_lectura: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Trabajo ejecutado en un proceso del pool que agrega un archivo a un
+    período mensual: procesa solo las boletas que el período no tiene, las
+    numera a continuación y guarda sus asientos como un tramo del período.
+    El historial (con el Excel del envío) y el período se actualizan en la
+    misma transacción. Devuelve el resumen de métricas del trabajo.
+    """
+    import pandas as pd
+    from app.core.database import SessionLocal
+    from app.models.models import PeriodoMensual
+    from app.services import periodos
+    from app.services.procesamiento_service import COLUMNAS_CONCAR, ProcesamientoService
+
+    medidor = MedidorEtapas()
+    with medidor.etapa("base_datos", medir_memoria=False):
+        _actualizar_historial(historial_id, estado=ESTADO_PROCESANDO, progreso=5)
+
+    pendiente = periodos.ruta_tramo_pendiente(periodo_id, historial_id)
+    try:
+        medidor.datos["tamano_entrada_bytes"] = os.path.getsize(input_path)
+        servicio = ProcesamientoService(diccionario_cuentas, diccionario_combos, medidor=medidor)
+        progreso = _informar_progreso(historial_id, medidor)
+        boletas = servicio.extraer_boletas(input_path, clave_lectura)
+        progreso(40)
+
+        # Boletas que el período todavía no tiene y numeración con la que sigue
+        claves = periodos.claves_boletas(boletas)
+        with medidor.etapa("base_datos", medir_memoria=False):
+            db = SessionLocal()
+            try:
+                periodo = db.query(PeriodoMensual).filter(PeriodoMensual.id == periodo_id).first()
+                if periodo is None or periodo.estado != periodos.ESTADO_ABIERTO:
+                    raise Exception("El período no existe o está cerrado")
+                mes = periodo.mes
+                numeracion = (periodo.subdiario_siguiente, periodo.numero_siguiente)
+                nuevas = periodos.boletas_nuevas(db, periodo_id, claves)
+            finally:
+                db.close()
+        medidor.datos["boletas_repetidas"] = int((~nuevas).sum())
+        boletas = boletas.seleccionar(nuevas)
+
+        if len(boletas):
+            df_resultado, codigos_faltantes = servicio.generar_asientos(boletas, mes, *numeracion, progreso=progreso)
+            medidor.datos.update(servicio.estadisticas)
+            with medidor.etapa("escribir"):
+                periodos.guardar_tramo(df_resultado, pendiente)
+        else:
+            df_resultado, codigos_faltantes = pd.DataFrame(columns=COLUMNAS_CONCAR), []
+            medidor.datos.update({"tickets": 0, "lineas": 0})
+
+        def confirmar(db):
+            periodos.confirmar_tramo(
+                db,
+                periodo_id,
+                historial_id,
+                claves[nuevas].tolist(),
+                numeracion,
+                servicio.avanzar_comprobante(*numeracion, len(boletas)),
+                len(df_resultado)
+            )
+
+        resumen = _guardar_resultado(
+            historial_id,
+            df_resultado,
+            codigos_faltantes,
+            output_filename,
+            medidor,
+            confirmar=confirmar,
+            subdiario_inicial=numeracion[0],
+            numero_comprobante_inicial=numeracion[1]
+        )
+
+        # El tramo entra en el Excel del mes una vez registradas sus boletas
+        if os.path.exists(pendiente):
+            os.replace(pendiente, periodos.ruta_tramo(periodo_id, historial_id))
+        return resumen
+
+    except Exception as e:
+        logger.exception(f"Error en el procesamiento {historial_id} del período {periodo_id}")
+        if os.path.exists(pendiente):
+            os.remove(pendiente)
+        return _registrar_error(historial_id, str(e), medidor)
+
+    finally:
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
+
+def _coordinar_lote(historial_id: int, archivos: List[Tuple[str, str, Optional[str]]], directorio: str, **kwargs):
+    """
+    Hilo del proceso principal que coordina un lote: extrae los archivos en
+    paralelo en el pool, informa el avance a medida que terminan y envía al
+    pool la numeración y agrupación conjunta
+    """
+    try:
+        _actualizar_historial(historial_id, estado=ESTADO_PROCESANDO, progreso=5)
+
+        inicio = time.perf_counter()
+        futuros = {
+            _enviar_al_pool(extraer_boletas_archivo, path, kwargs["diccionario_combos"], clave): indice
+            for indice, (_, path, clave) in enumerate(archivos)
+        }
+        boletas: Dict[int, BoletasColumnares] = {}
+        metricas: List[Dict] = []
+        for terminados, futuro in enumerate(as_completed(futuros), start=1):
+            indice = futuros[futuro]
+            try:
+                boletas[indice], metricas_archivo = futuro.result()
+                metricas.append(metricas_archivo)
+            except Exception as e:
+                for pendiente in futuros:
+                    pendiente.cancel()
+                raise Exception(f"Error al procesar el archivo {archivos[indice][0]} del lote: {e}")
+            _actualizar_historial(historial_id, progreso=5 + 35 * terminados // len(archivos))
+
+        boletas_por_archivo = [(nombre, boletas[indice]) for indice, (nombre, _, _) in enumerate(archivos)]
+        resumen = _enviar_al_pool(
+            ejecutar_lote,
+            historial_id,
+            boletas_por_archivo,
+            metricas_extraccion=metricas,
+            segundos_extraccion=time.perf_counter() - inicio,
+            **kwargs
+        ).result()
+        registrar_procesamiento(resumen)
+
+    except Exception as e:
+        logger.exception(f"Error en el procesamiento del lote {historial_id}")
+        _registrar_error(historial_id, str(e))
+        registrar_procesamiento(None, ESTADO_ERROR)
+
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def enviar_lote(
+    historial_id: int, archivos: List[Tuple[str, str, Optional[str]]], directorio: str, **kwargs
+) -> threading.Thread:
+    """
+    Enviar un lote de archivos ([(nombre, ruta, clave_lectura), ...] en el
+    orden en que se numeran; la clave de la caché de lecturas puede ser None).
+    Los archivos del directorio del lote se borran al terminar.
+    """
+    hilo = threading.Thread(
+        target=_coordinar_lote,
+        args=(historial_id, archivos, directorio),
+        kwargs=kwargs,
+        name=f"lote-{historial_id}",
+        daemon=True
+    )
+    hilo.start()
+    return hilo
+
+
+def _enviar_trabajo(funcion, historial_id: int, **kwargs) -> Future:
+    """
+    Enviar un trabajo de un solo paso al pool. Si el proceso hijo termina de
+    forma inesperada (sin registrar su resultado), el historial queda en error.
+    """
+    future = _enviar_al_pool(funcion, historial_id, **kwargs)
+
+    def _al_terminar(f: Future):
+        error = f.exception() if not f.cancelled() else None
+        if f.cancelled() or error is not None:
+            mensaje = str(error) if error is not None else "Trabajo cancelado"
+            logger.error(f"El procesamiento {historial_id} terminó de forma inesperada: {mensaje}")
+            _registrar_error(historial_id, mensaje)
+            registrar_procesamiento(None, ESTADO_ERROR)
+        else:
+            registrar_procesamiento(f.result())
+
+    future.add_done_callback(_al_terminar)
+    return future
+
+
+def enviar_procesamiento(historial_id: int, **kwargs) -> Future:
+    """Enviar el procesamiento de un archivo al pool"""
+    return _enviar_trabajo(ejecutar_procesamiento, historial_id, **kwargs)
+
+
+def enviar_incremental(historial_id: int, **kwargs) -> Future:
+    """Enviar al pool el agregado de un archivo a un período mensual"""
+    return _enviar_trabajo(ejecutar_incremental, historial_id, **kwargs)
+
+
+def enviar_reproceso(historial_id: int, **kwargs) -> Future:
+    """Enviar al pool un reprocesamiento desde la caché de lecturas"""
+    return _enviar_trabajo(ejecutar_reproceso, historial_id, **kwargs)
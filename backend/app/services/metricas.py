@@ -0,0 +1,220 @@
+"""
+Métricas de los procesamientos: tiempos por etapa, CPU y memoria
+
+El trabajo mide sus etapas con un MedidorEtapas en el proceso del pool; el
+resumen se guarda como JSON en ProcesamientoHistorial.metricas y se devuelve
+al proceso principal, que lo acumula en los histogramas expuestos en /metrics.
+"""
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from time import perf_counter, process_time
+from typing import Dict, Optional
+
+from app.core.metricas import REGISTRO
+
+try:
+    import resource
+except ImportError:  # Windows: sin memoria residente máxima
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Etapas en el orden en que ocurren
+ETAPAS = ["cache", "leer", "extraer", "construir", "agrupar", "escribir", "base_datos"]
+
+_MB = 1024 * 1024
+
+# Sin /proc ni resource no se mide memoria: los resúmenes no llevan rss_pico_mb
+MEMORIA_DISPONIBLE = resource is not None or os.path.exists("/proc/self/status")
+
+
+def reiniciar_pico_rss() -> bool:
+    """
+    Reiniciar la memoria residente máxima del proceso (Linux), para que el
+    pico medido corresponda al trabajo actual y no a uno anterior del mismo
+    proceso del pool. Devuelve False si el sistema no lo permite.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def pico_rss_bytes() -> Optional[int]:
+    """
+    Memoria residente máxima del proceso desde el último reinicio, en bytes
+    (None si el sistema no la informa)
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo if sys.platform == "darwin" else maximo * 1024
+
+
+class MedidorEtapas:
+    """
+    Tiempo de pared, tiempo de CPU y memoria pico por etapa de un trabajo.
+
+    Las etapas pueden anidarse (p. ej. una actualización del historial
+    durante la construcción de asientos): el tiempo de la etapa interna se
+    descuenta de la que la contiene, de modo que las etapas suman el total.
+    Una etapa que se repite acumula sus tiempos.
+    """
+
+    def __init__(self, segundos_previos: float = 0.0):
+        """
+        Args:
+            segundos_previos: Tiempo ya transcurrido del trabajo antes de este
+                proceso (p. ej. la extracción en paralelo de un lote)
+        """
+        reiniciar_pico_rss()
+        self.etapas: Dict[str, Dict[str, float]] = {}
+        self.datos: Dict[str, int] = {}
+        self._pila = []
+        self._inicio = perf_counter() - segundos_previos
+        self._cpu_inicio = process_time()
+        self._cpu_externo = 0.0
+
+    def _registro(self, nombre: str) -> Dict[str, float]:
+        return self.etapas.setdefault(nombre, {"segundos": 0.0, "cpu_segundos": 0.0, "rss_pico_mb": 0.0})
+
+    def _anotar_memoria(self, nombre: str):
+        pico = pico_rss_bytes()
+        if pico is None:
+            return
+        registro = self._registro(nombre)
+        registro["rss_pico_mb"] = max(registro["rss_pico_mb"], pico / _MB)
+
+    @contextmanager
+    def etapa(self, nombre: str, medir_memoria: bool = True):
+        """Medir el bloque como parte de la etapa `nombre`"""
+        internas = [0.0, 0.0]
+        self._pila.append(internas)
+        inicio, cpu_inicio = perf_counter(), process_time()
+        try:
+            yield
+        finally:
+            segundos = perf_counter() - inicio
+            cpu_segundos = process_time() - cpu_inicio
+            self._pila.pop()
+            registro = self._registro(nombre)
+            registro["segundos"] += segundos - internas[0]
+            registro["cpu_segundos"] += cpu_segundos - internas[1]
+            if self._pila:
+                self._pila[-1][0] += segundos
+                self._pila[-1][1] += cpu_segundos
+            if medir_memoria:
+                self._anotar_memoria(nombre)
+
+    def agregar(self, resumen: Dict):
+        """
+        Sumar las etapas de otro resumen (p. ej. la extracción de cada archivo
+        de un lote, ejecutada en otro proceso), su CPU y sus datos de tamaño
+        """
+        self._cpu_externo += resumen.get("cpu_segundos", 0.0)
+        for nombre, otra in resumen.get("etapas", {}).items():
+            registro = self._registro(nombre)
+            registro["segundos"] += otra["segundos"]
+            registro["cpu_segundos"] += otra["cpu_segundos"]
+            registro["rss_pico_mb"] = max(registro["rss_pico_mb"], otra.get("rss_pico_mb", 0.0))
+        for clave in ("tamano_entrada_bytes", "tickets", "lineas", "lecturas_en_cache", "lecturas_extraidas"):
+            if clave in resumen:
+                self.datos[clave] = self.datos.get(clave, 0) + resumen[clave]
+
+    def resumen(self, estado: Optional[str] = None) -> Dict:
+        """Métricas del trabajo listas para guardar como JSON"""
+        etapas = {
+            nombre: {
+                "segundos": round(max(registro["segundos"], 0.0), 4),
+                "cpu_segundos": round(max(registro["cpu_segundos"], 0.0), 4),
+                **({"rss_pico_mb": round(registro["rss_pico_mb"], 1)} if MEMORIA_DISPONIBLE else {}),
+            }
+            for nombre, registro in sorted(
+                self.etapas.items(), key=lambda item: ETAPAS.index(item[0]) if item[0] in ETAPAS else len(ETAPAS)
+            )
+        }
+        resumen = {
+            "duracion_segundos": round(perf_counter() - self._inicio, 4),
+            "cpu_segundos": round(process_time() - self._cpu_inicio + self._cpu_externo, 4),
+        }
+        pico = pico_rss_bytes()
+        if pico is not None:
+            resumen["rss_pico_mb"] = round(max([pico / _MB] + [e["rss_pico_mb"] for e in etapas.values()]), 1)
+        resumen.update(self.datos)
+        resumen["etapas"] = etapas
+        if estado is not None:
+            resumen["estado"] = estado
+        return resumen
+
+
+# Histogramas del proceso web (alimentados con los resúmenes de los trabajos)
+_BUCKETS_SEGUNDOS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+_BUCKETS_MB = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+_BUCKETS_BYTES = tuple(mb * _MB for mb in (0.1, 0.5, 1, 5, 10, 25, 50, 100))
+_BUCKETS_CANTIDAD = (100, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+PROCESAMIENTOS = REGISTRO.contador(
+    "ventas_procesamientos_total", "Procesamientos terminados por estado", ["estado"]
+)
+LECTURAS = REGISTRO.contador(
+    "ventas_cache_lecturas_total", "Archivos de ventas tomados de la caché de lecturas o extraídos", ["resultado"]
+)
+DURACION = REGISTRO.histograma(
+    "ventas_procesamiento_duracion_segundos", "Duración total de los procesamientos", _BUCKETS_SEGUNDOS
+)
+ETAPA_SEGUNDOS = REGISTRO.histograma(
+    "ventas_procesamiento_etapa_segundos", "Tiempo de pared por etapa", _BUCKETS_SEGUNDOS, ["etapa"]
+)
+ETAPA_CPU_SEGUNDOS = REGISTRO.histograma(
+    "ventas_procesamiento_etapa_cpu_segundos", "Tiempo de CPU por etapa", _BUCKETS_SEGUNDOS, ["etapa"]
+)
+RSS_PICO = REGISTRO.histograma(
+    "ventas_procesamiento_rss_pico_mb", "Memoria residente máxima del trabajo en MB", _BUCKETS_MB
+)
+ENTRADA_BYTES = REGISTRO.histograma(
+    "ventas_procesamiento_entrada_bytes", "Tamaño de los archivos de ventas procesados", _BUCKETS_BYTES
+)
+TICKETS = REGISTRO.histograma(
+    "ventas_procesamiento_tickets", "Boletas por procesamiento", _BUCKETS_CANTIDAD
+)
+LINEAS = REGISTRO.histograma(
+    "ventas_procesamiento_lineas", "Líneas de detalle por procesamiento", _BUCKETS_CANTIDAD
+)
+
+
+def registrar_procesamiento(resumen: Optional[Dict], estado: Optional[str] = None):
+    """Acumular el resumen de un trabajo terminado en las métricas de /metrics"""
+    estado = estado or (resumen or {}).get("estado") or "desconocido"
+    PROCESAMIENTOS.inc(estado=estado)
+    if not resumen:
+        return
+    try:
+        DURACION.observe(resumen["duracion_segundos"])
+        if "rss_pico_mb" in resumen:
+            RSS_PICO.observe(resumen["rss_pico_mb"])
+        for nombre, etapa in resumen.get("etapas", {}).items():
+            ETAPA_SEGUNDOS.observe(etapa["segundos"], etapa=nombre)
+            ETAPA_CPU_SEGUNDOS.observe(etapa["cpu_segundos"], etapa=nombre)
+        if "tamano_entrada_bytes" in resumen:
+            ENTRADA_BYTES.observe(resumen["tamano_entrada_bytes"])
+        if "tickets" in resumen:
+            TICKETS.observe(resumen["tickets"])
+        if "lineas" in resumen:
+            LINEAS.observe(resumen["lineas"])
+        if resumen.get("lecturas_en_cache"):
+            LECTURAS.inc(resumen["lecturas_en_cache"], resultado="acierto")
+        if resumen.get("lecturas_extraidas"):
+            LECTURAS.inc(resumen["lecturas_extraidas"], resultado="fallo")
+    except (KeyError, TypeError):
+        logger.exception("Resumen de métricas inválido")
@@ -0,0 +1,164 @@
+"""
+Períodos mensuales incrementales
+
+Cada envío diario de un período procesa solo las boletas que el período aún
+no tiene (por serie-número), las numera a continuación de la última y guarda
+sus asientos como un tramo (.npz) en el directorio del período. El tramo
+queda pendiente hasta que la base de datos registra sus boletas. El Excel
+del mes se arma al descargarlo, uniendo los tramos en el orden en que se
+agregaron, y se conserva hasta que llega un tramo nuevo.
+"""
+import glob
+import logging
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import PeriodoBoleta, PeriodoMensual
+from app.services.boletas import BoletasColumnares, codificar_columna, decodificar_columna
+
+logger = logging.getLogger(__name__)
+
+ESTADO_ABIERTO = "abierto"
+ESTADO_CERRADO = "cerrado"
+
+# Claves consultadas por sentencia al buscar boletas ya agregadas
+CLAVES_POR_CONSULTA = 500
+
+
+def directorio_periodo(periodo_id: int) -> str:
+    return os.path.join(settings.UPLOAD_DIR, "periodos", str(periodo_id))
+
+
+def ruta_tramo(periodo_id: int, historial_id: int) -> str:
+    # Con ceros a la izquierda, el orden de los nombres es el orden de llegada
+    return os.path.join(directorio_periodo(periodo_id), f"tramo_{historial_id:010d}.npz")
+
+
+def ruta_tramo_pendiente(periodo_id: int, historial_id: int) -> str:
+    return os.path.join(directorio_periodo(periodo_id), f"pendiente_{historial_id:010d}.npz")
+
+
+def claves_boletas(boletas: BoletasColumnares) -> np.ndarray:
+    """Clave serie-número de cada boleta"""
+    serie = pd.Series(boletas.serie, dtype=object).astype(str).str.strip()
+    num = pd.Series(boletas.num, dtype=object).astype(str).str.strip()
+    return (serie + "-" + num).to_numpy(dtype=object)
+
+
+def boletas_nuevas(db: Session, periodo_id: int, claves: np.ndarray) -> np.ndarray:
+    """
+    Máscara de las boletas que el período todavía no tiene. Si una clave se
+    repite dentro del mismo archivo solo cuenta la primera. Las consultas se
+    hacen por las claves del archivo, no por todas las del período.
+    """
+    repetidas = pd.Series(claves).duplicated().to_numpy()
+    distintas = pd.unique(claves).tolist()
+
+    existentes = set()
+    for inicio in range(0, len(distintas), CLAVES_POR_CONSULTA):
+        bloque = distintas[inicio:inicio + CLAVES_POR_CONSULTA]
+        existentes.update(
+            clave for (clave,) in db.query(PeriodoBoleta.clave).filter(
+                PeriodoBoleta.periodo_id == periodo_id,
+                PeriodoBoleta.clave.in_(bloque)
+            )
+        )
+
+    return ~repetidas & ~pd.Series(claves).isin(existentes).to_numpy()
+
+
+def confirmar_tramo(
+    db: Session,
+    periodo_id: int,
+    historial_id: int,
+    claves: List[str],
+    numeracion_inicial: Tuple[int, int],
+    numeracion_siguiente: Tuple[int, int],
+    asientos: int
+):
+    """
+    Registrar en el período las boletas de un tramo ya escrito y avanzar su
+    numeración (sin commit: se confirma junto con el historial). Falla si el
+    período cambió desde que se leyó su numeración.
+    """
+    periodo = db.query(PeriodoMensual).filter(PeriodoMensual.id == periodo_id).with_for_update().first()
+    if periodo is None or periodo.estado != ESTADO_ABIERTO:
+        raise Exception("El período no existe o está cerrado")
+    if (periodo.subdiario_siguiente, periodo.numero_siguiente) != numeracion_inicial:
+        raise Exception("El período cambió durante el procesamiento; vuelva a enviar el archivo")
+
+    if claves:
+        db.execute(
+            insert(PeriodoBoleta),
+            [{"periodo_id": periodo_id, "clave": clave, "historial_id": historial_id} for clave in claves]
+        )
+    periodo.subdiario_siguiente, periodo.numero_siguiente = numeracion_siguiente
+    periodo.total_boletas = (periodo.total_boletas or 0) + len(claves)
+    periodo.total_asientos = (periodo.total_asientos or 0) + asientos
+
+
+def guardar_tramo(df: pd.DataFrame, ruta: str):
+    """Guardar los asientos de un tramo (.npz con columnas codificadas, sin pickle)"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    arrays = {"columnas": np.array([str(columna) for columna in df.columns])}
+    for k, columna in enumerate(df.columns):
+        arrays.update(codificar_columna(f"c{k}", df[columna].to_numpy()))
+
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def cargar_tramo(ruta: str) -> pd.DataFrame:
+    with np.load(ruta, allow_pickle=False) as npz:
+        datos = {nombre: npz[nombre] for nombre in npz.files}
+    columnas = datos["columnas"].tolist()
+    return pd.DataFrame({columna: decodificar_columna(f"c{k}", datos) for k, columna in enumerate(columnas)})
+
+
+def salida_mensual(periodo: PeriodoMensual) -> Optional[str]:
+    """
+    Ruta del Excel del mes (todos los tramos del período en orden de llegada),
+    generándolo si llegaron tramos desde la última descarga. None si el
+    período todavía no tiene asientos.
+    """
+    from app.utils.excel_writer import write_excel_file
+
+    directorio = directorio_periodo(periodo.id)
+    tramos = sorted(glob.glob(os.path.join(directorio, "tramo_*.npz")))
+    if not tramos:
+        return None
+
+    # Los tramos solo se agregan: la cantidad identifica el contenido
+    ruta = os.path.join(directorio, f"asientos_{periodo.anio}{periodo.mes}_{len(tramos)}.xlsx")
+    if os.path.exists(ruta):
+        return ruta
+
+    df = pd.concat([cargar_tramo(tramo) for tramo in tramos], ignore_index=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp.xlsx")
+    os.close(descriptor)
+    try:
+        write_excel_file(df, temporal, engine=settings.SALIDA_ENGINE)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    for anterior in glob.glob(os.path.join(directorio, "asientos_*.xlsx")):
+        if anterior != ruta:
+            os.remove(anterior)
+
+    logger.info(f"Excel del período {periodo.id} generado con {len(tramos)} tramos ({len(df)} asientos)")
+    return ruta
@@ -2,24 +2,67 @@
 Servicio de procesamiento de archivos de ventas a asientos contables
 Migrado de la función process_files() original
 """
+import numpy as np
 import pandas as pd
 import logging
-from typing import Dict, List, Tuple, Set
-from app.utils.excel_reader import read_excel_file
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple, Set
+from app.core.config import settings
+from app.core.logging_config import TrazaMuestreada
+from app.services import cache_lecturas
+from app.services.boletas import BoletasColumnares, ConstructorBoletas
+from app.services.extraccion import extraer_info_vectorizado, iter_boletas_streaming
+from app.services.metricas import MedidorEtapas
+from app.utils.excel_reader import read_excel_file, iter_excel_rows
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
+# Último número de comprobante de un subdiario
+MAX_NUMERO_COMPROBANTE = 9999
+
+# Códigos faltantes listados en el resumen del log
+MAX_CODIGOS_LOG = 20
+
+# Columnas del archivo de importación de Concar
+COLUMNAS_CONCAR = [
+    "Sub Diario", "Numero de Comprobante", "Fecha", "Código de Moneda",
+    "Glosa Principal", "Tipo de Cambio", "Tipo de Conversión", "Flag de Conversión de Moneda",
+    "Fecha de Tipo de Cambio", "CuentaContable", "CodigoAnexo", "CodigoCentroCosto",
+    "DebeHaber", "ImporteOriginal", "ImporteDolares", "ImporteSoles",
+    "TipoDoc", "Nr.Doc", "FechaDoc", "FechaVenc"
+]
+
 
 class ProcesamientoService:
     """
     Servicio para procesar archivos de ventas y generar asientos contables para Concar
     """
 
-    def __init__(self, diccionario_cuentas: Dict[str, str], diccionario_combos: Dict[str, int]):
+    def __init__(
+        self,
+        diccionario_cuentas: Dict[str, str],
+        diccionario_combos: Dict[str, int],
+        engine: Optional[str] = None,
+        medidor: Optional[MedidorEtapas] = None
+    ):
         self.diccionario_cuentas = diccionario_cuentas
         self.diccionario_combos = diccionario_combos
+        self.engine = engine or settings.PROCESAMIENTO_ENGINE
+        self.medidor = medidor
         self.missing_codes: Set[str] = set()
+        # Boletas y líneas de detalle de la última llamada a generar_asientos
+        self.estadisticas: Dict[str, int] = {"tickets": 0, "lineas": 0}
+
+    def _etapa(self, nombre: str):
+        """Medir un bloque como etapa del procesamiento (si hay medidor)"""
+        if self.medidor is None:
+            return nullcontext()
+        return self.medidor.etapa(nombre)
+
+    def _contar_lectura(self, dato: str):
+        if self.medidor is not None:
+            self.medidor.datos[dato] = self.medidor.datos.get(dato, 0) + 1
 
     @staticmethod
     def get_DNIRUC_name(df: pd.DataFrame, i: int) -> Tuple[str, str]:
@@ -41,26 +84,9 @@ class ProcesamientoService:
         else:
             return "NO RECONOCIDO"
 
-    def procesar_archivo_ventas(
-        self,
-        archivo_ventas_path: str,
-        mes: str,
-        subdiario_inicial: int,
-        num_comprobante_inicial: int
-    ) -> Tuple[pd.DataFrame, List[str]]:
-        """
-        Procesa un archivo de ventas y genera los asientos contables
-
-        Args:
-            archivo_ventas_path: Ruta al archivo de ventas
-            mes: Mes en formato '01', '02', etc.
-            subdiario_inicial: Número inicial de subdiario
-            num_comprobante_inicial: Número inicial de comprobante
-
-        Returns:
-            Tuple con DataFrame de asientos contables y lista de códigos faltantes
-        """
-        # Cargar archivo de ventas
+    @staticmethod
+    def _leer_reporte(archivo_ventas_path: str) -> pd.DataFrame:
+        """Cargar el archivo de ventas completo y nombrar sus columnas"""
         df = read_excel_file(archivo_ventas_path)
 
         # Nombres de columnas esperados (pueden variar entre archivos)
@@ -80,8 +106,15 @@ class ProcesamientoService:
             # Si hay más columnas de las esperadas, agregar nombres genéricos
             df.columns = expected_columns + [f"Extra_{i}" for i in range(num_cols - len(expected_columns))]
 
-        # Extracción de información
-        info = []
+        return df
+
+    def _extraer_info_legacy(self, df: pd.DataFrame) -> BoletasColumnares:
+        """
+        Recorre el reporte fila por fila y extrae las boletas con su detalle
+        (motor original, basado en df.iloc)
+        """
+        info = ConstructorBoletas()
+        traza = TrazaMuestreada(logger)
         num_rows = df.shape[0]
         i = 0
 
@@ -132,29 +165,16 @@ class ProcesamientoService:
                         break
 
                     if producto in ['Bolsa -', 'Bolsa']:
-                        # Log completo de la fila para debugging
-                        logger.info(f"[BOLSA DEBUG] Fila completa {i_detalle}:")
-                        logger.info(f"  Headers: {list(df.columns[:10])}")
-                        logger.info(f"  Col 0 ({df.columns[0]}): {df.iloc[i_detalle, 0]}")
-                        logger.info(f"  Col 1 ({df.columns[1]}): {df.iloc[i_detalle, 1]}")
-                        logger.info(f"  Col 2 ({df.columns[2]} - Producto): {df.iloc[i_detalle, 2]}")
-                        logger.info(f"  Col 3 ({df.columns[3]}): {df.iloc[i_detalle, 3]}")
-                        logger.info(f"  Col 4 ({df.columns[4]} - P.U.): {df.iloc[i_detalle, 4]}")
-                        logger.info(f"  Col 5 ({df.columns[5]}): {df.iloc[i_detalle, 5]}")
-                        logger.info(f"  Col 6 ({df.columns[6]} - Total/Importe línea): {df.iloc[i_detalle, 6]}")
-                        if len(df.columns) > 7:
-                            logger.info(f"  Col 7 ({df.columns[7]}): {df.iloc[i_detalle, 7]}")
-                        if len(df.columns) > 8:
-                            logger.info(f"  Col 8 ({df.columns[8]}): {df.iloc[i_detalle, 8]}")
-
                         if pd.notna(importe_linea) and importe_linea > 0:
                             costo_bolsa = importe_linea
                         else:
                             costo_bolsa = cantidad * 0.5
 
-                        logger.info(f"[BOLSA] Producto: {producto}, Cantidad: {cantidad}, Importe línea: {importe_linea}, Costo calculado: {costo_bolsa}")
-                        logger.info(f"[BOLSA] Agregando: ['{producto}', {costo_bolsa}]")
-                        logger.info(f"[BOLSA] Agregando: ['701112', 0]")
+                        if traza.activa:
+                            traza(
+                                "BOLSA", "Fila %s %s: cantidad=%s, importe línea=%s, costo calculado=%s",
+                                i_detalle, df.iloc[i_detalle, :9].tolist(), cantidad, importe_linea, costo_bolsa
+                            )
 
                         comida.append([producto, costo_bolsa])
                         comida.append(['701112', 0])
@@ -167,9 +187,226 @@ class ProcesamientoService:
                     else:
                         i_detalle += 1
 
-                info.append([datos_boleta, comida])
+                info.agregar(datos_boleta, comida)
             i += 1
 
+        return info.construir()
+
+    @staticmethod
+    def _agrupar_asientos(cab: pd.DataFrame, lin: pd.DataFrame) -> pd.DataFrame:
+        """
+        Agrupa las líneas por Nr.Doc y CuentaContable sumando ImporteOriginal.
+
+        Equivale a construir el DataFrame de 20 columnas con una fila por línea
+        y aplicar groupby(["Nr.Doc", "CuentaContable"]).agg('first' / 'sum'),
+        pero solo se agrupa la columna de importes, con las claves codificadas
+        como enteros (mismo orden que el groupby). El resto de columnas se toma
+        de la primera línea de cada grupo: las de cabecera desde la tabla de
+        comprobantes y las constantes se generan directamente.
+
+        Args:
+            cab: Sub Diario, Numero de Comprobante, Fecha, Glosa Principal, TipoDoc y Nr.Doc por comprobante
+            lin: Comprobante (posición en cab), CuentaContable, CodigoAnexo, DebeHaber e ImporteOriginal por línea
+        """
+        if lin.empty:
+            raise ValueError("El archivo no contiene boletas válidas")
+
+        # Claves enteras ordenadas igual que groupby (factorize con sort, sin NaN)
+        comprobante = lin["Comprobante"].to_numpy()
+        nr_doc = cab["Nr.Doc"].to_numpy()[comprobante]
+        codigos_doc, _ = pd.factorize(nr_doc, sort=True)
+        codigos_cuenta, cuentas = pd.factorize(lin["CuentaContable"], sort=True)
+        validos = (codigos_doc >= 0) & (codigos_cuenta >= 0)
+        if not validos.all():
+            lin = lin[validos].reset_index(drop=True)
+            comprobante, nr_doc = comprobante[validos], nr_doc[validos]
+            codigos_doc, codigos_cuenta = codigos_doc[validos], codigos_cuenta[validos]
+
+        clave = codigos_doc.astype(np.int64) * max(len(cuentas), 1) + codigos_cuenta
+        _, primera, grupo = np.unique(clave, return_index=True, return_inverse=True)
+        comprobante_primera = comprobante[primera]
+        num_grupos = len(primera)
+
+        def primero_linea(col: str) -> np.ndarray:
+            serie = lin[col]
+            if serie.isna().any():
+                return serie.groupby(grupo).first().to_numpy()
+            return serie.to_numpy()[primera]
+
+        def primero_cabecera(col: str) -> np.ndarray:
+            serie = cab[col]
+            if serie.isna().any():
+                # 'first' omite los valores nulos: se resuelve por línea
+                return serie.iloc[comprobante].reset_index(drop=True).groupby(grupo).first().to_numpy()
+            return serie.to_numpy()[comprobante_primera]
+
+        def constante(valor) -> np.ndarray:
+            return np.full(num_grupos, valor, dtype=object if isinstance(valor, str) else None)
+
+        fecha = primero_cabecera("Fecha")
+        return pd.DataFrame({
+            "Sub Diario": primero_cabecera("Sub Diario"),
+            "Numero de Comprobante": primero_cabecera("Numero de Comprobante"),
+            "Fecha": fecha,
+            "Código de Moneda": constante("MN"),
+            "Glosa Principal": primero_cabecera("Glosa Principal"),
+            "Tipo de Cambio": constante(0),
+            "Tipo de Conversión": constante("V"),
+            "Flag de Conversión de Moneda": constante("S"),
+            "Fecha de Tipo de Cambio": constante(""),
+            "CuentaContable": lin["CuentaContable"].to_numpy()[primera],
+            "CodigoAnexo": primero_linea("CodigoAnexo"),
+            "CodigoCentroCosto": constante(""),
+            "DebeHaber": primero_linea("DebeHaber"),
+            "ImporteOriginal": lin["ImporteOriginal"].groupby(grupo).sum().to_numpy(),
+            "ImporteDolares": constante(""),
+            "ImporteSoles": constante(""),
+            "TipoDoc": primero_cabecera("TipoDoc"),
+            "Nr.Doc": nr_doc[primera],
+            "FechaDoc": fecha,
+            "FechaVenc": fecha
+        })
+
+    def extraer_boletas(self, archivo_ventas_path: str, clave_lectura: Optional[str] = None) -> BoletasColumnares:
+        """
+        Boletas del reporte de ventas, en arrays columnares, según el motor
+        configurado. En modo streaming el archivo se lee a medida que se
+        extraen las boletas (la lectura se mide dentro de la extracción).
+
+        Con `clave_lectura` (ver cache_lecturas.clave_lectura) las boletas se
+        toman de la caché de lecturas si ya están y, si no, se guardan en ella.
+        """
+        if clave_lectura is None:
+            return self._extraer_boletas(archivo_ventas_path)
+
+        boletas = self.boletas_en_cache(clave_lectura)
+        if boletas is not None:
+            return boletas
+
+        boletas = self._extraer_boletas(archivo_ventas_path)
+        with self._etapa("cache"):
+            cache_lecturas.guardar_lectura(clave_lectura, boletas)
+        self._contar_lectura("lecturas_extraidas")
+        return boletas
+
+    def boletas_en_cache(self, clave_lectura: str) -> Optional[BoletasColumnares]:
+        """Boletas de la caché de lecturas, o None si la clave no está"""
+        with self._etapa("cache"):
+            boletas = cache_lecturas.cargar_lectura(clave_lectura)
+        if boletas is not None:
+            logger.info(f"Lectura tomada de la caché ({len(boletas)} boletas)")
+            self._contar_lectura("lecturas_en_cache")
+        return boletas
+
+    def _extraer_boletas(self, archivo_ventas_path: str) -> BoletasColumnares:
+        if self.engine == "streaming":
+            # Las boletas se leen una a una, sin cargar el archivo completo
+            with self._etapa("extraer"):
+                return BoletasColumnares.desde_iterable(
+                    iter_boletas_streaming(iter_excel_rows(archivo_ventas_path), self.diccionario_combos)
+                )
+        elif self.engine in ("legacy", "vectorizado"):
+            with self._etapa("leer"):
+                df = self._leer_reporte(archivo_ventas_path)
+            with self._etapa("extraer"):
+                if self.engine == "legacy":
+                    return self._extraer_info_legacy(df)
+                return extraer_info_vectorizado(df, self.diccionario_combos)
+        else:
+            raise ValueError(f"Motor de procesamiento desconocido: {self.engine}")
+
+    @staticmethod
+    def avanzar_comprobante(subdiario: int, numero: int, boletas: int) -> Tuple[int, int]:
+        """
+        Subdiario y número de comprobante que recibe la boleta en la posición
+        `boletas` (desde 0) al numerar a partir de (subdiario, numero), con el
+        paso al siguiente subdiario al superar 9999 que aplica generar_asientos
+        """
+        posicion = int(numero) - 1 + int(boletas)
+        if posicion < MAX_NUMERO_COMPROBANTE:
+            return int(subdiario), posicion + 1
+        posicion -= MAX_NUMERO_COMPROBANTE
+        return int(subdiario) + 1 + posicion // MAX_NUMERO_COMPROBANTE, posicion % MAX_NUMERO_COMPROBANTE + 1
+
+    def resumen_archivo(
+        self,
+        nombre: str,
+        boletas: BoletasColumnares,
+        mes: str,
+        subdiario: int,
+        numero: int
+    ) -> Dict:
+        """
+        Estadísticas de un archivo de un lote cuyas boletas se numeran desde
+        (subdiario, numero): comprobantes, anuladas, líneas de detalle,
+        rango de comprobantes asignado y códigos sin cuenta contable
+        """
+        activa = ~boletas.anulada[boletas.boleta_de_linea()]
+        productos = boletas.productos[np.unique(boletas.codigos[activa])]
+        faltantes = [producto for producto in productos.tolist() if producto not in self.diccionario_cuentas]
+
+        def comprobante(posicion: int) -> str:
+            sub, num = self.avanzar_comprobante(subdiario, numero, posicion)
+            return f"{str(sub).zfill(2)}-{mes}{str(num).zfill(4)}"
+
+        return {
+            "archivo": nombre,
+            "comprobantes": len(boletas),
+            "anuladas": int(boletas.anulada.sum()),
+            "lineas": int(activa.sum()),
+            "primer_comprobante": comprobante(0) if boletas else None,
+            "ultimo_comprobante": comprobante(len(boletas) - 1) if boletas else None,
+            "codigos_faltantes": sorted(map(str, faltantes))
+        }
+
+    def procesar_archivo_ventas(
+        self,
+        archivo_ventas_path: str,
+        mes: str,
+        subdiario_inicial: int,
+        num_comprobante_inicial: int,
+        progreso: Optional[Callable[[int], None]] = None,
+        clave_lectura: Optional[str] = None
+    ) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Procesa un archivo de ventas y genera los asientos contables
+
+        Args:
+            archivo_ventas_path: Ruta al archivo de ventas
+            mes: Mes en formato '01', '02', etc.
+            subdiario_inicial: Número inicial de subdiario
+            num_comprobante_inicial: Número inicial de comprobante
+            progreso: Función opcional que recibe el avance (0-100) al terminar cada etapa
+            clave_lectura: Clave de la caché de lecturas del archivo (opcional)
+
+        Returns:
+            Tuple con DataFrame de asientos contables y lista de códigos faltantes
+        """
+        info = self.extraer_boletas(archivo_ventas_path, clave_lectura)
+
+        if progreso is not None:
+            progreso(40)
+
+        return self.generar_asientos(info, mes, subdiario_inicial, num_comprobante_inicial, progreso)
+
+    def generar_asientos(
+        self,
+        info: BoletasColumnares,
+        mes: str,
+        subdiario_inicial: int,
+        num_comprobante_inicial: int,
+        progreso: Optional[Callable[[int], None]] = None
+    ) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Numera las boletas ya extraídas y genera los asientos contables agrupados
+
+        Returns:
+            Tuple con DataFrame de asientos contables y lista de códigos faltantes
+        """
+        def avance(porcentaje: int):
+            if progreso is not None:
+                progreso(porcentaje)
+
         # Mapeo adicional (hardcodeado en original)
         dic8caracter18Caracter = {
             701112: '',
@@ -178,129 +415,136 @@ class ProcesamientoService:
             702211: ''
         }
 
-        # Construcción de los registros contables
-        datos = []
-        num_comprobante_int_local = int(num_comprobante_inicial) - 1
-        subdiario_int_local = int(subdiario_inicial)
+        # Construcción de los registros contables sobre los arrays de las
+        # boletas: los datos de cabecera se guardan una vez por comprobante y
+        # cada línea referencia su comprobante
+        traza = TrazaMuestreada(logger)
+        num_boletas = len(info)
+
+        with self._etapa("construir"):
+            # Cuenta contable y código adicional de cada producto distinto
+            productos = info.productos.tolist()
+            cuenta_producto = np.empty(len(productos), dtype=object)
+            extra_producto = np.empty(len(productos), dtype=object)
+            tiene_cuenta = np.zeros(len(productos), dtype=bool)
+            for codigo, producto in enumerate(productos):
+                if producto in self.diccionario_cuentas:
+                    caracter18 = self.diccionario_cuentas[producto]
+                    try:
+                        clave = int(caracter18) if str(caracter18).isdigit() else caracter18
+                    except ValueError:
+                        clave = caracter18
+                    cuenta_producto[codigo] = caracter18
+                    extra_producto[codigo] = dic8caracter18Caracter.get(clave, '')
+                    tiene_cuenta[codigo] = True
+
+            # Las líneas de las boletas anuladas no generan asientos de productos
+            boleta_linea = info.boleta_de_linea()
+            activa = ~info.anulada[boleta_linea]
+            con_cuenta = activa & tiene_cuenta[info.codigos]
+            sin_cuenta = activa & ~tiene_cuenta[info.codigos]
+            lineas_sin_cuenta = int(sin_cuenta.sum())
+            for codigo in pd.unique(info.codigos[sin_cuenta]).tolist():
+                self.missing_codes.add(productos[codigo])
+
+            if traza.activa:
+                for codigo, importe in zip(info.codigos[activa].tolist(), info.importes[activa].tolist()):
+                    if tiene_cuenta[codigo]:
+                        traza(
+                            "ASIENTO", "Producto: %s, Cuenta: %s, Extra: %s, ImporteOriginal: %s",
+                            productos[codigo], cuenta_producto[codigo], extra_producto[codigo], importe
+                        )
+                    else:
+                        traza("FALTANTE", "Código no encontrado en DiccionarioCuentas: %s", productos[codigo])
+
+            # Numeración: al pasar de 9999 se sube el subdiario y se reinicia el contador
+            posicion = int(num_comprobante_inicial) - 1 + np.arange(num_boletas, dtype=np.int64)
+            desborde = posicion >= MAX_NUMERO_COMPROBANTE
+            subdiario = np.where(
+                desborde, int(subdiario_inicial) + 1 + (posicion - MAX_NUMERO_COMPROBANTE) // MAX_NUMERO_COMPROBANTE,
+                int(subdiario_inicial)
+            )
+            numero = np.where(desborde, (posicion - MAX_NUMERO_COMPROBANTE) % MAX_NUMERO_COMPROBANTE, posicion) + 1
+
+            # Nr.Doc y tipo de documento desde los últimos 4 caracteres del número
+            ultimos = pd.Series(info.num, dtype=object).str[-4:]
+            tipo_doc = ultimos.str[:1].map({"B": "BV", "b": "BV", "F": "FT", "f": "FT"}).fillna("NO RECONOCIDO")
+
+            cabeceras = pd.DataFrame({
+                "Sub Diario": pd.Series(subdiario).astype(str).str.zfill(2),
+                "Numero de Comprobante": mes + pd.Series(numero).astype(str).str.zfill(4),
+                "Fecha": info.fecha,
+                "Glosa Principal": np.where(info.anulada, "ANULADO", info.cliente).astype(object),
+                "TipoDoc": tipo_doc.to_numpy(),
+                "Nr.Doc": (ultimos + "-" + pd.Series(info.serie, dtype=object)).to_numpy()
+            }).infer_objects()
+
+            # Cada comprobante tiene su línea de cliente (Debe) seguida de las
+            # líneas de productos con cuenta (Haber), en el orden del detalle
+            boleta_producto = boleta_linea[con_cuenta]
+            codigo_producto = info.codigos[con_cuenta]
+            productos_por_boleta = np.bincount(boleta_producto, minlength=num_boletas)
+            inicio = np.zeros(num_boletas + 1, dtype=np.int64)
+            np.cumsum(productos_por_boleta + 1, out=inicio[1:])
+            antes = np.cumsum(productos_por_boleta) - productos_por_boleta
+            pos_cliente = inicio[:-1]
+            pos_producto = inicio[boleta_producto] + 1 + np.arange(len(boleta_producto)) - antes[boleta_producto]
+            total_lineas = int(inicio[-1])
+
+            varios = pd.Series(info.dniruc, dtype=object).str.strip().to_numpy() == "00000000"
+            anexo_cliente = np.where(info.anulada, '0001', np.where(varios, '99999', info.dniruc))
+
+            def columna(cliente, producto, dtype=object) -> np.ndarray:
+                valores = np.empty(total_lineas, dtype=dtype)
+                valores[pos_cliente] = cliente
+                valores[pos_producto] = producto
+                return valores
+
+            lineas = pd.DataFrame({
+                "Comprobante": columna(np.arange(num_boletas), boleta_producto, np.int64),
+                "CuentaContable": columna(101101, cuenta_producto[codigo_producto]),
+                "CodigoAnexo": columna(anexo_cliente, extra_producto[codigo_producto]),
+                "DebeHaber": columna('D', 'H'),
+                "ImporteOriginal": columna(
+                    info.total, info.importes[con_cuenta], np.result_type(info.total.dtype, np.float64)
+                )
+            }).infer_objects()
+            lineas_detalle = int(activa.sum())
+
+        self.estadisticas = {"tickets": num_boletas, "lineas": lineas_detalle}
+        avance(70)
+
+        # Resumen de la etapa (en lugar de un log por línea)
+        logger.info(
+            f"Asientos construidos: {len(cabeceras)} comprobantes, {len(lineas)} líneas, "
+            f"{lineas_sin_cuenta} líneas sin cuenta ({len(self.missing_codes)} códigos faltantes)"
+        )
+        if self.missing_codes:
+            faltantes = sorted(map(str, self.missing_codes))
+            logger.warning(
+                "Códigos no encontrados en DiccionarioCuentas: "
+                + ", ".join(faltantes[:MAX_CODIGOS_LOG]) + (" ..." if len(faltantes) > MAX_CODIGOS_LOG else "")
+            )
 
-        for boleta in info:
-            # Incrementar el contador
-            num_comprobante_int_local += 1
+        with self._etapa("agrupar"):
+            # Agrupar por Nr.Doc y CuentaContable
+            grouped_df = self._agrupar_asientos(cabeceras, lineas)
 
-            # Si pasa de 9999, subir subdiario y reiniciar el contador
-            if num_comprobante_int_local > 9999:
-                subdiario_int_local += 1
-                num_comprobante_int_local = 1
+            avance(85)
 
-            # Construir el NR. de comprobante (dos dígitos de mes + 4 de correlativo)
-            num_comprobante_str = mes + str(num_comprobante_int_local).zfill(4)
+            # Formatear fechas (Fecha, FechaDoc y FechaVenc tienen los mismos valores)
+            fechas = pd.to_datetime(grouped_df["Fecha"], errors='coerce').dt.strftime('%d/%m/%Y')
+            for col in ["Fecha", "FechaDoc", "FechaVenc"]:
+                grouped_df[col] = fechas
 
-            # Construir el subdiario (2 dígitos)
-            sub_diario_str = str(subdiario_int_local).zfill(2)
+            # Truncar Glosa Principal a 40 caracteres
+            grouped_df["Glosa Principal"] = grouped_df["Glosa Principal"].astype(str).str[:40]
 
-            tipoDoc = self.tipo_doc_func(
-                boleta[0]["Num"][-4:] if len(boleta[0]["Num"]) >= 4 else boleta[0]["Num"]
+            # Ordenar
+            grouped_df.sort_values(
+                by=["Sub Diario", "Numero de Comprobante", "DebeHaber", "ImporteOriginal"],
+                ascending=[True, True, True, False],
+                inplace=True
             )
-            fecha = boleta[0]["Fecha"]
-
-            if boleta[0]["Estado"].strip() == "Anulada":
-                cliente = "ANULADO"
-                datos.append([
-                    sub_diario_str, num_comprobante_str, fecha, "MN", cliente, 0, "V", "S", "",
-                    101101, '0001', '', 'D', boleta[0]["Total"], "", "", tipoDoc,
-                    boleta[0]["Num"][-4:] + "-" + str(boleta[0]["Serie"]), fecha, fecha
-                ])
-            else:
-                cliente = boleta[0]["Cliente"]
-                if boleta[0]["DNIRUC"].strip() == "00000000":
-                    codAnex = '99999'
-                else:
-                    codAnex = boleta[0]["DNIRUC"]
-
-                # Asiento para la cuenta de cliente
-                datos.append([
-                    sub_diario_str, num_comprobante_str, fecha, "MN", cliente, 0, "V", "S", "",
-                    101101, codAnex, '', 'D', boleta[0]["Total"], "", "", tipoDoc,
-                    boleta[0]["Num"][-4:] + "-" + str(boleta[0]["Serie"]), fecha, fecha
-                ])
-
-                # Asientos para los productos vendidos
-                for comida_costo in boleta[1]:
-                    if comida_costo[0] not in self.diccionario_cuentas:
-                        print("Código no encontrado en DiccionarioCuentas:", comida_costo[0])
-                        self.missing_codes.add(comida_costo[0])
-                    else:
-                        caracter18 = self.diccionario_cuentas[comida_costo[0]]
-                        try:
-                            clave = int(caracter18) if str(caracter18).isdigit() else caracter18
-                        except:
-                            clave = caracter18
-                        extra = dic8caracter18Caracter.get(clave, '')
-
-                        logger.info(f"[ASIENTO] Producto: {comida_costo[0]}, Cuenta: {caracter18}, Extra: {extra}, ImporteOriginal: {comida_costo[1]}")
-
-                        datos.append([
-                            sub_diario_str, num_comprobante_str, fecha, "MN", cliente, 0,
-                            "V", "S", "", caracter18, extra, '', 'H', comida_costo[1],
-                            "", "", tipoDoc,
-                            boleta[0]["Num"][-4:] + "-" + str(boleta[0]["Serie"]), fecha, fecha
-                        ])
-
-        # Crear DataFrame
-        contable = pd.DataFrame(datos)
-        contable.columns = [
-            "Sub Diario", "Numero de Comprobante", "Fecha", "Código de Moneda",
-            "Glosa Principal", "Tipo de Cambio", "Tipo de Conversión", "Flag de Conversión de Moneda",
-            "Fecha de Tipo de Cambio", "CuentaContable", "CodigoAnexo", "CodigoCentroCosto",
-            "DebeHaber", "ImporteOriginal", "ImporteDolares", "ImporteSoles",
-            "TipoDoc", "Nr.Doc", "FechaDoc", "FechaVenc"
-        ]
-
-        # Agrupar por Nr.Doc y CuentaContable
-        grouped_df = contable.groupby(
-            ["Nr.Doc", "CuentaContable"], as_index=False
-        ).agg({
-            "Sub Diario": 'first',
-            "Numero de Comprobante": 'first',
-            "Fecha": 'first',
-            "Código de Moneda": 'first',
-            "Glosa Principal": 'first',
-            "Tipo de Cambio": 'first',
-            "Tipo de Conversión": 'first',
-            "Flag de Conversión de Moneda": 'first',
-            'Fecha de Tipo de Cambio': 'first',
-            "CodigoAnexo": "first",
-            "CodigoCentroCosto": "first",
-            "DebeHaber": "first",
-            "ImporteOriginal": 'sum',
-            "ImporteDolares": 'first',
-            "ImporteSoles": 'first',
-            "TipoDoc": 'first',
-            "Nr.Doc": 'first',
-            "FechaDoc": 'first',
-            "FechaVenc": 'first'
-        })
-
-        grouped_df = grouped_df[[
-            "Sub Diario", "Numero de Comprobante", "Fecha", "Código de Moneda",
-            "Glosa Principal", "Tipo de Cambio", "Tipo de Conversión", "Flag de Conversión de Moneda",
-            "Fecha de Tipo de Cambio", "CuentaContable", "CodigoAnexo", "CodigoCentroCosto",
-            "DebeHaber", "ImporteOriginal", "ImporteDolares", "ImporteSoles",
-            "TipoDoc", "Nr.Doc", "FechaDoc", "FechaVenc"
-        ]]
-
-        # Formatear fechas
-        for col in ["Fecha", "FechaDoc", "FechaVenc"]:
-            grouped_df[col] = pd.to_datetime(grouped_df[col], errors='coerce').dt.strftime('%d/%m/%Y')
-
-        # Truncar Glosa Principal a 40 caracteres
-        grouped_df["Glosa Principal"] = grouped_df["Glosa Principal"].astype(str).str[:40]
-
-        # Ordenar
-        grouped_df.sort_values(
-            by=["Sub Diario", "Numero de Comprobante", "DebeHaber", "ImporteOriginal"],
-            ascending=[True, True, True, False],
-            inplace=True
-        )
 
         return grouped_df, list(self.missing_codes)
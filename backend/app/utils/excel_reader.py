@@ -3,37 +3,41 @@ Utilidades para leer archivos Excel
 Migrado de la función read_excel_file() original
 """
 import os
+import math
 import pandas as pd
+from typing import Iterator, List
+from app.utils.html_reader import es_html, iter_html_table, read_html_table
+
+# Textos que pandas interpreta como celda vacía (NaN) al leer un Excel
+VALORES_NA = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+# Códigos de error de Excel (openpyxl los devuelve como texto)
+ERRORES_EXCEL = {'#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A'}
 
 
 def read_excel_file(file_path: str) -> pd.DataFrame:
     """
     Lee el archivo utilizando el motor adecuado según la extensión.
     Para archivos .xls:
-      - Se intenta primero con xlrd.
-      - Si falla por error de BOF (por ejemplo, cuando el archivo contiene HTML),
-        se intenta leer mediante pd.read_html (usando flavor='lxml') sin convertir a string.
+      - Si los primeros bytes indican que es HTML (exportaciones de POS), se lee
+        solo la primera tabla con el parser incremental de html_reader.
+      - En otro caso se utiliza xlrd.
     Para archivos .xlsx se utiliza openpyxl.
     """
     ext = os.path.splitext(file_path)[1].lower()
 
     if ext == '.xls':
+        if es_html(file_path):
+            try:
+                return read_html_table(file_path)
+            except Exception as e_html:
+                raise Exception(f"Error al leer el archivo {file_path} como HTML: {e_html}")
         try:
             return pd.read_excel(file_path, engine='xlrd')
         except Exception as e:
-            error_message = str(e)
-            if "Expected BOF record" in error_message or "<html" in error_message.lower():
-                try:
-                    with open(file_path, "rb") as f:
-                        header = f.read(512).lower()
-                    if b"<html" in header:
-                        df_list = pd.read_html(file_path, flavor='lxml')
-                        if df_list:
-                            return df_list[0]
-                        raise Exception("No se encontró ninguna tabla HTML en el archivo")
-                    raise Exception(f"Error al leer el archivo {file_path} con xlrd: {e}")
-                except Exception as e_html:
-                    raise Exception(f"Error al leer el archivo {file_path} como HTML: {e_html}")
             raise Exception(f"Error al leer el archivo {file_path} con xlrd: {e}")
 
     elif ext == '.xlsx':
@@ -48,3 +52,109 @@ def read_excel_file(file_path: str) -> pd.DataFrame:
             return df
         except Exception as e:
             raise Exception(f"Error al leer el archivo {file_path}: {e}")
+
+
+def _normalizar_celda(valor):
+    """
+    Convierte el valor crudo de una celda al que pandas dejaría en una
+    columna de tipo object (vacíos a NaN y números enteros a int)
+    """
+    if valor is None:
+        return math.nan
+    if isinstance(valor, float):
+        if math.isfinite(valor) and valor == int(valor):
+            return int(valor)
+        return valor
+    if isinstance(valor, str) and (valor in VALORES_NA or valor in ERRORES_EXCEL):
+        return math.nan
+    return valor
+
+
+def _iter_rows_xlsx(file_path: str) -> Iterator[List]:
+    """Filas de la primera hoja con openpyxl en modo read-only"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        for row in ws.iter_rows(values_only=True):
+            yield [_normalizar_celda(v) for v in row]
+    finally:
+        wb.close()
+
+
+def _iter_rows_xls(file_path: str) -> Iterator[List]:
+    """
+    Filas de la primera hoja con xlrd. xlrd carga las celdas de la hoja al
+    abrirla (on_demand evita cargar las demás hojas), pero las filas se
+    convierten y entregan una a una sin construir un DataFrame.
+    Falla de inmediato si el archivo no es un .xls binario.
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(file_path, on_demand=True)
+
+    def filas():
+        try:
+            sheet = book.sheet_by_index(0)
+            for i in range(sheet.nrows):
+                row = []
+                for valor, tipo in zip(sheet.row_values(i), sheet.row_types(i)):
+                    if tipo == xlrd.XL_CELL_DATE:
+                        try:
+                            valor = xlrd.xldate.xldate_as_datetime(valor, book.datemode)
+                        except OverflowError:
+                            pass
+                    elif tipo == xlrd.XL_CELL_ERROR:
+                        valor = None
+                    elif tipo == xlrd.XL_CELL_BOOLEAN:
+                        valor = bool(valor)
+                    row.append(_normalizar_celda(valor))
+                yield row
+        finally:
+            book.release_resources()
+
+    return filas()
+
+
+def _iter_rows_html(file_path: str) -> Iterator[List]:
+    """
+    Filas de datos de un .xls HTML directamente desde el parser incremental.
+    Igual que pd.read_html, las filas de encabezado (<thead> o solo <th>) se
+    omiten y, si no hay ninguna, la primera fila también es de datos
+    """
+    for es_encabezado, textos in iter_html_table(file_path):
+        if not es_encabezado:
+            yield [_normalizar_celda(texto) for texto in textos]
+
+
+def iter_excel_rows(file_path: str) -> Iterator[List]:
+    """
+    Lee el archivo de forma perezosa y entrega sus filas de datos una a una,
+    con los mismos valores que read_excel_file dejaría en el DataFrame
+    (sin la inferencia de tipo por columna que hace pandas).
+    En .xlsx y .xls la primera fila se omite porque pandas la usa como encabezado.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+
+    if ext == '.xls' and es_html(file_path):
+        try:
+            yield from _iter_rows_html(file_path)
+        except Exception as e_html:
+            raise Exception(f"Error al leer el archivo {file_path} como HTML: {e_html}")
+        return
+
+    try:
+        if ext == '.xlsx':
+            filas = _iter_rows_xlsx(file_path)
+        elif ext == '.xls':
+            filas = _iter_rows_xls(file_path)
+        else:
+            raise ValueError(f"Extensión no soportada en modo streaming: {ext}")
+        next(filas, None)
+    except Exception:
+        df = read_excel_file(file_path)
+        filas = (list(row) for row in df.itertuples(index=False, name=None))
+
+    yield from filas
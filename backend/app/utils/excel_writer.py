@@ -0,0 +1,81 @@
+"""
+Utilidades para escribir archivos Excel de salida
+"""
+import pandas as pd
+
+# Motores de escritura disponibles
+ENGINE_PANDAS = "pandas"
+ENGINE_STREAMING = "streaming"
+
+# Filas convertidas a objetos Python por bloque en la escritura streaming
+FILAS_BLOQUE_ESCRITURA = 10000
+
+
+def _estilo_encabezado():
+    """Mismo estilo que DataFrame.to_excel aplica al encabezado"""
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    borde = Side(style="thin")
+    return {
+        "font": Font(bold=True),
+        "border": Border(left=borde, right=borde, top=borde, bottom=borde),
+        "alignment": Alignment(horizontal="center", vertical="top"),
+    }
+
+
+def _columna_celdas(columna: pd.Series) -> list:
+    """Valores de la columna como objetos Python, con las celdas vacías como ''"""
+    valores = columna.astype(object)
+    return valores.where(columna.notna(), "").tolist()
+
+
+def write_excel_streaming(df: pd.DataFrame, file_path: str, sheet_name: str = "Sheet1") -> None:
+    """
+    Escribe el DataFrame con el modo write_only de openpyxl: las filas se
+    serializan al archivo a medida que se agregan, sin construir el modelo de
+    celdas del libro en memoria. El contenido es el mismo que genera
+    df.to_excel(file_path, index=False).
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+
+    estilo = _estilo_encabezado()
+    encabezado = []
+    for nombre in df.columns:
+        celda = WriteOnlyCell(ws, value=str(nombre))
+        celda.font = estilo["font"]
+        celda.border = estilo["border"]
+        celda.alignment = estilo["alignment"]
+        encabezado.append(celda)
+    ws.append(encabezado)
+
+    for inicio in range(0, len(df), FILAS_BLOQUE_ESCRITURA):
+        bloque = df.iloc[inicio:inicio + FILAS_BLOQUE_ESCRITURA]
+        columnas = [_columna_celdas(bloque.iloc[:, k]) for k in range(bloque.shape[1])]
+        for fila in zip(*columnas):
+            ws.append(fila)
+
+    wb.save(file_path)
+
+
+def write_excel_file(df: pd.DataFrame, file_path: str, engine: str = ENGINE_STREAMING) -> None:
+    """
+    Escribe el DataFrame (sin índice) en un .xlsx con el motor indicado:
+      - "streaming": openpyxl en modo write_only, memoria constante por fila.
+      - "pandas": df.to_excel, que arma el libro completo en memoria.
+    """
+    if engine == ENGINE_STREAMING:
+        escribir = write_excel_streaming
+    elif engine == ENGINE_PANDAS:
+        def escribir(datos, ruta):
+            datos.to_excel(ruta, index=False)
+    else:
+        raise ValueError(f"Motor de escritura desconocido: {engine}")
+
+    try:
+        escribir(df, file_path)
+    except Exception as e:
+        raise Exception(f"Error al escribir el archivo {file_path} con engine={engine}: {e}")
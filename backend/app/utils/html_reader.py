@@ -0,0 +1,234 @@
+"""
+Lector incremental de tablas HTML guardadas con extensión .xls
+(exportaciones de POS que no son libros de Excel reales)
+"""
+import re
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+
+# Bytes iniciales revisados para reconocer un HTML
+BYTES_DETECCION = 1024
+MARCAS_HTML = (b"<html", b"<!doctype html", b"<table", b"<head", b"<meta")
+
+# Misma normalización de espacios que pd.read_html
+_RE_ESPACIOS = re.compile(r"[\r\n]+|\s{2,}")
+_RE_OCULTO = re.compile(r"display:\s*none")
+
+
+def es_html(file_path: str) -> bool:
+    """Detectar por los primeros bytes si el archivo es HTML"""
+    with open(file_path, "rb") as f:
+        inicio = f.read(BYTES_DETECCION)
+    inicio = inicio.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    return any(marca in inicio for marca in MARCAS_HTML)
+
+
+def _oculto(elem) -> bool:
+    estilo = elem.get("style")
+    return bool(estilo) and bool(_RE_OCULTO.search(estilo))
+
+
+def _texto_celda(celda) -> str:
+    """Texto de una celda tal como lo obtiene pd.read_html con lxml"""
+    if len(celda):
+        for br in celda.iter("br"):
+            br.tail = "\n" + (br.tail or "")
+        texto = "".join(celda.itertext())
+    else:
+        texto = celda.text or ""
+    return _RE_ESPACIOS.sub(" ", texto.strip())
+
+
+class _ExpansorFilas:
+    """
+    Expande colspan/rowspan fila a fila (mismo algoritmo que pd.read_html,
+    que lo aplica por separado a encabezado, cuerpo y pie de la tabla)
+    """
+
+    def __init__(self):
+        self.pendientes: List[Tuple[int, str, int]] = []
+
+    def fila(self, celdas) -> List[str]:
+        textos = []
+        siguientes = []
+        indice = 0
+        for celda in celdas:
+            while self.pendientes and self.pendientes[0][0] <= indice:
+                prev_i, prev_texto, prev_rowspan = self.pendientes.pop(0)
+                textos.append(prev_texto)
+                if prev_rowspan > 1:
+                    siguientes.append((prev_i, prev_texto, prev_rowspan - 1))
+                indice += 1
+
+            texto = _texto_celda(celda)
+            rowspan = int(celda.get("rowspan") or 1)
+            colspan = int(celda.get("colspan") or 1)
+            for _ in range(colspan):
+                textos.append(texto)
+                if rowspan > 1:
+                    siguientes.append((indice, texto, rowspan - 1))
+                indice += 1
+
+        for prev_i, prev_texto, prev_rowspan in self.pendientes:
+            textos.append(prev_texto)
+            if prev_rowspan > 1:
+                siguientes.append((prev_i, prev_texto, prev_rowspan - 1))
+
+        self.pendientes = siguientes
+        return textos
+
+    def finalizar(self) -> List[List[str]]:
+        """Filas que solo existen por un rowspan de la última fila"""
+        filas = []
+        while self.pendientes:
+            textos = []
+            siguientes = []
+            for prev_i, prev_texto, prev_rowspan in self.pendientes:
+                textos.append(prev_texto)
+                if prev_rowspan > 1:
+                    siguientes.append((prev_i, prev_texto, prev_rowspan - 1))
+            filas.append(textos)
+            self.pendientes = siguientes
+        return filas
+
+
+def iter_html_table(file_path: str) -> Iterator[Tuple[bool, List[str]]]:
+    """
+    Recorre con lxml.etree.iterparse la primera tabla con filas del documento
+    y entrega (es_encabezado, textos) por cada fila, en el mismo orden en que
+    pd.read_html las ubicaría (encabezado, cuerpo y al final el pie).
+
+    Cada <tr> se descarta del árbol apenas se procesa y el resto del documento
+    (otras tablas incluidas) no se llega a leer.
+    """
+    from lxml import etree
+
+    nivel_tabla = 0
+    tabla_oculta = False
+    seccion = None
+    tiene_thead = False
+    en_encabezado_implicito = True
+    encabezado = _ExpansorFilas()
+    cuerpo = _ExpansorFilas()
+    pie = _ExpansorFilas()
+    filas_pie: List[List[str]] = []
+    filas_emitidas = 0
+
+    contexto = etree.iterparse(
+        file_path,
+        events=("start", "end"),
+        tag=("table", "thead", "tbody", "tfoot", "tr"),
+        html=True,
+        huge_tree=True
+    )
+    for evento, elem in contexto:
+        tag = elem.tag
+
+        if tag == "table":
+            if evento == "start":
+                nivel_tabla += 1
+                if nivel_tabla == 1:
+                    tabla_oculta = _oculto(elem)
+                continue
+            nivel_tabla -= 1
+            if nivel_tabla == 0:
+                for textos in encabezado.finalizar():
+                    filas_emitidas += 1
+                    yield True, textos
+                for textos in cuerpo.finalizar():
+                    filas_emitidas += 1
+                    yield False, textos
+                for textos in filas_pie + pie.finalizar():
+                    filas_emitidas += 1
+                    yield False, textos
+                if filas_emitidas:
+                    return
+                # Tabla vacía u oculta: seguir con la siguiente
+                seccion = None
+                tiene_thead = False
+                en_encabezado_implicito = True
+                encabezado, cuerpo, pie, filas_pie = _ExpansorFilas(), _ExpansorFilas(), _ExpansorFilas(), []
+                elem.clear()
+            continue
+
+        if nivel_tabla != 1:
+            continue
+
+        if tag in ("thead", "tbody", "tfoot"):
+            if evento == "start":
+                seccion = tag
+                tiene_thead = tiene_thead or tag == "thead"
+            else:
+                # <thead> sin <tr>: sus celdas forman una fila (igual que pandas)
+                if tag == "thead":
+                    celdas = [c for c in elem if c.tag in ("td", "th") and not _oculto(c)]
+                    if celdas:
+                        filas_emitidas += 1
+                        yield True, encabezado.fila(celdas)
+                seccion = None
+            continue
+
+        if tag != "tr" or evento != "end":
+            continue
+
+        if tabla_oculta:
+            elem.clear()
+            continue
+
+        celdas = [c for c in elem if c.tag in ("td", "th") and not _oculto(c)]
+        if seccion == "thead":
+            filas_emitidas += 1
+            yield True, encabezado.fila(celdas)
+        elif seccion == "tfoot":
+            filas_pie.append(pie.fila(celdas))
+        elif not tiene_thead and en_encabezado_implicito and celdas and all(c.tag == "th" for c in celdas):
+            # Sin <thead>, las primeras filas solo con <th> son el encabezado
+            filas_emitidas += 1
+            yield True, encabezado.fila(celdas)
+        else:
+            if en_encabezado_implicito:
+                en_encabezado_implicito = False
+                for textos in encabezado.finalizar():
+                    filas_emitidas += 1
+                    yield True, textos
+            filas_emitidas += 1
+            yield False, cuerpo.fila(celdas)
+
+        # Liberar la fila ya procesada y las anteriores
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    if not filas_emitidas:
+        raise ValueError("No se encontró ninguna tabla HTML en el archivo")
+
+
+def read_html_table(file_path: str) -> pd.DataFrame:
+    """
+    Construye el DataFrame de la primera tabla con las mismas reglas que
+    pd.read_html(file_path, flavor='lxml')[0], sin cargar el documento completo
+    """
+    from pandas.io.parsers import TextParser
+
+    encabezado = []
+    filas = []
+    for es_encabezado, textos in iter_html_table(file_path):
+        (encabezado if es_encabezado else filas).append(textos)
+
+    header = None
+    if encabezado:
+        filas = encabezado + filas
+        if len(encabezado) == 1:
+            header = 0
+        else:
+            header = [i for i, fila in enumerate(encabezado) if any(texto for texto in fila)]
+
+    # Completar las filas más cortas
+    ancho = max(len(fila) for fila in filas)
+    for fila in filas:
+        if len(fila) < ancho:
+            fila.extend([""] * (ancho - len(fila)))
+
+    with TextParser(filas, header=header, thousands=",") as parser:
+        return parser.read()
@@ -0,0 +1,92 @@
+"""
+Benchmark de escritura del Excel de asientos: df.to_excel frente al
+escritor streaming (openpyxl write_only)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_excel_writer --filas 100000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.procesamiento_service import COLUMNAS_CONCAR
+from app.utils.excel_writer import ENGINE_PANDAS, ENGINE_STREAMING, write_excel_file
+
+
+def asientos_sinteticos(filas: int, semilla: int = 0) -> pd.DataFrame:
+    """DataFrame con la forma y los tipos del resultado de procesar_archivo_ventas"""
+    rng = np.random.default_rng(semilla)
+    comprobante = np.arange(filas) // 3
+    fechas = pd.Timestamp("2024-08-01") + pd.to_timedelta(comprobante % 31, unit="D")
+    fecha_txt = fechas.strftime("%d/%m/%Y")
+    cuentas = rng.choice([101101, 701211, 401891, 702211, 701112], size=filas)
+    return pd.DataFrame({
+        "Sub Diario": "05",
+        "Numero de Comprobante": ["08" + str(n % 10000).zfill(4) for n in comprobante],
+        "Fecha": fecha_txt,
+        "Código de Moneda": "MN",
+        "Glosa Principal": rng.choice(["Clientes Varios", "EMPRESA SAC", "JUAN PEREZ"], size=filas),
+        "Tipo de Cambio": 0,
+        "Tipo de Conversión": "V",
+        "Flag de Conversión de Moneda": "S",
+        "Fecha de Tipo de Cambio": "",
+        "CuentaContable": cuentas,
+        "CodigoAnexo": np.where(cuentas == 401891, "4018", ""),
+        "CodigoCentroCosto": "",
+        "DebeHaber": np.where(cuentas == 101101, "D", "H"),
+        "ImporteOriginal": np.round(rng.uniform(1, 300, size=filas), 2),
+        "ImporteDolares": "",
+        "ImporteSoles": "",
+        "TipoDoc": "BV",
+        "Nr.Doc": ["B001-" + str(100000 + n) + ".0" for n in comprobante],
+        "FechaDoc": fecha_txt,
+        "FechaVenc": fecha_txt,
+    })[COLUMNAS_CONCAR]
+
+
+def _medir_en_proceso(filas: int, engine: str, ruta: str, cola) -> None:
+    df = asientos_sinteticos(filas)
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    write_excel_file(df, ruta, engine=engine)
+    segundos = time.perf_counter() - inicio
+    rss_final = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cola.put((segundos, (rss_final - rss_inicial) * 1024))
+
+
+def medir(filas: int, engine: str, ruta: str):
+    """Tiempo y memoria pico adicional (RSS) de una escritura, en un proceso nuevo"""
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_medir_en_proceso, args=(filas, engine, ruta, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.filas} filas x {len(COLUMNAS_CONCAR)} columnas")
+        for engine in (ENGINE_PANDAS, ENGINE_STREAMING):
+            ruta = os.path.join(tmp, f"{engine}.xlsx")
+            tiempos, picos = zip(*(medir(args.filas, engine, ruta) for _ in range(args.repeticiones)))
+            print(
+                f"{engine:>10}: {min(tiempos):7.2f} s  memoria adicional {max(picos) / 1024 / 1024:8.1f} MB  "
+                f"archivo {os.path.getsize(ruta) / 1024:8.0f} KB"
+            )
+
+
+if __name__ == "__main__":
+    main()
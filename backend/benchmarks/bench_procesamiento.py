@@ -0,0 +1,231 @@
+"""
+Benchmark de ProcesamientoService por etapas, con reportes sintéticos
+
+Cada caso (formato x tickets x motor) se ejecuta en un proceso nuevo y mide:
+  - leer: carga del reporte en un DataFrame (_leer_reporte)
+  - extraer: boletas columnares desde el DataFrame (en streaming incluye la
+    lectura, que ocurre a medida que se extraen las boletas)
+  - construir: numeración y líneas contables (generar_asientos hasta el 70%)
+  - agrupar: agrupación por Nr.Doc/CuentaContable, formato de fechas y orden
+  - escribir: Excel de asientos con settings.SALIDA_ENGINE
+y la memoria pico (RSS) acumulada al terminar cada etapa.
+
+Los resultados se comparan con la línea base guardada en baselines.json
+(mismo directorio); con --guardar-baseline se reemplaza la de los casos
+medidos. El código de salida es 1 si algún caso empeora más que la tolerancia.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_procesamiento
+    python -m benchmarks.bench_procesamiento --tickets 1000 100000 --formatos html --engines vectorizado
+    python -m benchmarks.bench_procesamiento --guardar-baseline
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+from benchmarks.generador_reportes import (
+    FORMATO_HTML, FORMATOS, diccionario_combos, diccionario_cuentas, generar_reporte
+)
+
+ETAPAS = ["leer", "extraer", "construir", "agrupar", "escribir"]
+ENGINES = ["legacy", "vectorizado", "streaming"]
+
+RUTA_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Diferencias menores a este tiempo no se consideran regresiones (ruido de medición)
+SEGUNDOS_MINIMOS_REGRESION = 0.05
+
+
+def _rss_pico() -> int:
+    """Memoria residente máxima del proceso hasta ahora, en bytes"""
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo if sys.platform == "darwin" else maximo * 1024
+
+
+def _medir_en_proceso(ruta: str, engine: str, salida: str, cola) -> None:
+    from app.core.config import settings
+    from app.services.extraccion import extraer_info_vectorizado
+    from app.services.procesamiento_service import ProcesamientoService
+    from app.utils.excel_writer import write_excel_file
+
+    # Importar antes de medir los lectores y escritores que se cargan al primer uso
+    import lxml.etree  # noqa: F401
+    import openpyxl  # noqa: F401
+    import xlrd  # noqa: F401
+
+    logging.disable(logging.CRITICAL)
+    servicio = ProcesamientoService(diccionario_cuentas(), diccionario_combos(), engine=engine)
+    tiempos: Dict[str, float] = {}
+    picos: Dict[str, float] = {}
+    rss_inicial = _rss_pico()
+
+    def cerrar_etapa(etapa: str, segundos: float):
+        tiempos[etapa] = segundos
+        picos[etapa] = (_rss_pico() - rss_inicial) / 1024 / 1024
+
+    inicio = time.perf_counter()
+    if engine == "streaming":
+        cerrar_etapa("leer", 0.0)
+        info = servicio.extraer_boletas(ruta)
+        cerrar_etapa("extraer", time.perf_counter() - inicio)
+    else:
+        df = servicio._leer_reporte(ruta)
+        cerrar_etapa("leer", time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        if engine == "legacy":
+            info = servicio._extraer_info_legacy(df)
+        else:
+            info = extraer_info_vectorizado(df, servicio.diccionario_combos)
+        cerrar_etapa("extraer", time.perf_counter() - inicio)
+        del df
+
+    marcas: Dict[int, float] = {}
+    inicio = time.perf_counter()
+    resultado, _ = servicio.generar_asientos(
+        info, "08", 5, 1, progreso=lambda porcentaje: marcas.setdefault(porcentaje, time.perf_counter())
+    )
+    fin = time.perf_counter()
+    cerrar_etapa("construir", marcas[70] - inicio)
+    cerrar_etapa("agrupar", fin - marcas[70])
+
+    inicio = time.perf_counter()
+    write_excel_file(resultado, salida, engine=settings.SALIDA_ENGINE)
+    cerrar_etapa("escribir", time.perf_counter() - inicio)
+
+    cola.put({"tiempos": tiempos, "picos_mb": picos, "filas_salida": len(resultado)})
+
+
+def medir(ruta: str, engine: str, salida: str) -> Dict:
+    """Tiempos por etapa y memoria pico de un procesamiento, en un proceso nuevo"""
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_medir_en_proceso, args=(ruta, engine, salida, cola))
+    proceso.start()
+    try:
+        resultado = cola.get(timeout=3600)
+    finally:
+        proceso.join()
+    return resultado
+
+
+def reporte_sintetico(directorio: str, formato: str, tickets: int, semilla: int = 0) -> Optional[str]:
+    """Ruta del reporte del caso (se genera una sola vez); None si no cabe en el formato"""
+    extension = "xls" if formato == FORMATO_HTML else formato
+    ruta = os.path.join(directorio, f"ventas_{tickets}_{semilla}_{formato}.{extension}")
+    if not os.path.exists(ruta):
+        try:
+            generar_reporte(ruta, tickets, formato, semilla)
+        except ValueError as e:
+            print(f"  {formato}/{tickets}: se omite ({e})")
+            return None
+    return ruta
+
+
+def _entorno() -> Dict:
+    import numpy
+    import pandas
+
+    return {
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _cargar_baseline() -> Dict:
+    if not os.path.exists(RUTA_BASELINE):
+        return {"entorno": {}, "casos": {}}
+    with open(RUTA_BASELINE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _comparar(caso: str, actual: Dict, base: Optional[Dict], tolerancia: float) -> bool:
+    """Imprime la variación contra la línea base y devuelve True si hay regresión"""
+    if base is None:
+        print(f"{'':>32}  (sin línea base)")
+        return False
+
+    regresion = False
+    variaciones = []
+    for etapa in ETAPAS + ["total"]:
+        antes, ahora = base["tiempos"].get(etapa, 0.0), actual["tiempos"][etapa]
+        empeora = ahora > antes * (1 + tolerancia) and ahora - antes > SEGUNDOS_MINIMOS_REGRESION
+        regresion |= empeora
+        if antes > 0:
+            variaciones.append(f"{etapa} {ahora / antes:5.2f}x{'!' if empeora else ''}")
+
+    pico_antes, pico_ahora = base["pico_mb"], actual["pico_mb"]
+    empeora_memoria = pico_ahora > pico_antes * (1 + tolerancia) and pico_ahora - pico_antes > 10
+    regresion |= empeora_memoria
+    variaciones.append(f"memoria {pico_ahora - pico_antes:+.0f} MB{'!' if empeora_memoria else ''}")
+    print(f"{'vs base':>32}  " + "  ".join(variaciones))
+    return regresion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=list(FORMATOS))
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--repeticiones", type=int, default=1, help="se toma el menor tiempo de cada etapa")
+    parser.add_argument("--directorio", default=os.path.join(tempfile.gettempdir(), "bench_reportes"),
+                        help="directorio de los reportes generados (se reutilizan entre ejecuciones)")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento admitido (0.2 = 20%%)")
+    parser.add_argument("--guardar-baseline", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.directorio, exist_ok=True)
+    baseline = _cargar_baseline()
+    resultados = {}
+    regresiones = []
+
+    print(f"{'caso':>32}  " + "  ".join(f"{etapa:>9}" for etapa in ETAPAS + ["total"]) + "   pico MB")
+    for formato in args.formatos:
+        for tickets in args.tickets:
+            ruta = reporte_sintetico(args.directorio, formato, tickets)
+            if ruta is None:
+                continue
+            for engine in args.engines:
+                caso = f"{formato}/{tickets}/{engine}"
+                with tempfile.TemporaryDirectory() as tmp:
+                    mediciones = [medir(ruta, engine, os.path.join(tmp, "asientos.xlsx")) for _ in range(args.repeticiones)]
+
+                tiempos = {etapa: min(m["tiempos"][etapa] for m in mediciones) for etapa in ETAPAS}
+                tiempos["total"] = sum(tiempos.values())
+                actual = {
+                    "tiempos": {etapa: round(segundos, 4) for etapa, segundos in tiempos.items()},
+                    "picos_mb": {etapa: round(max(m["picos_mb"][etapa] for m in mediciones), 1) for etapa in ETAPAS},
+                    "filas_salida": mediciones[0]["filas_salida"],
+                }
+                actual["pico_mb"] = max(actual["picos_mb"].values())
+                resultados[caso] = actual
+
+                print(f"{caso:>32}  " + "  ".join(f"{tiempos[e]:8.2f}s" for e in ETAPAS + ["total"]) +
+                      f"  {actual['pico_mb']:8.1f}")
+                if _comparar(caso, actual, baseline["casos"].get(caso), args.tolerancia):
+                    regresiones.append(caso)
+
+    if args.guardar_baseline:
+        baseline["entorno"] = _entorno()
+        baseline["casos"].update(resultados)
+        with open(RUTA_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"Línea base guardada en {RUTA_BASELINE} ({len(resultados)} casos)")
+    elif regresiones:
+        print(f"Regresiones (tolerancia {args.tolerancia:.0%}): {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Generador de reportes de ventas sintéticos con el formato del POS
+
+Produce el mismo layout que espera procesar_archivo_ventas: una fila de
+encabezado con las 31 columnas, una fila de cabecera por ticket (Activa o
+Anulada), filas de pagos, el bloque "Detalle de venta" con combos (y las filas
+de sus componentes según el salto), líneas de Bolsa con y sin importe, y una
+fila vacía al final de cada ticket.
+
+Formatos:
+  - xlsx: openpyxl en modo write_only (hasta 1.048.576 filas, ~100 mil tickets)
+  - xls: libro Excel 97 real con xlwt, dependencia opcional (hasta 65.536 filas, ~6 mil tickets)
+  - html: tabla HTML guardada como .xls, como exportan algunos POS (sin límite de filas)
+
+Uso (desde backend/):
+    python -m benchmarks.generador_reportes ventas.xlsx --tickets 10000
+    python -m benchmarks.generador_reportes ventas.xls --tickets 1000000 --formato html
+"""
+import argparse
+import datetime
+import html
+import os
+import random
+from typing import Dict, Iterator, List, Optional
+
+FORMATO_XLSX = "xlsx"
+FORMATO_XLS = "xls"
+FORMATO_HTML = "html"
+FORMATOS = (FORMATO_XLSX, FORMATO_XLS, FORMATO_HTML)
+
+# Filas máximas de una hoja en cada formato
+MAX_FILAS = {
+    FORMATO_XLSX: 1048576,
+    FORMATO_XLS: 65536,
+    FORMATO_HTML: None,
+}
+
+COLUMNAS_REPORTE = [
+    "Fecha", "Hora", "Mesa", "Caja", "Turno", "Cliente", "DNIRUC",
+    "TipoDoc", "SerieDoc", "NumDoc", "PagosA", "PagosB", "Retencion", "Propina",
+    "Subtotal", "IGV", "Impuestos", "Total", "Descuento", "Tipo", "Estado",
+    "UsuarioAnulador", "PerfilAnulador", "UsuarioAprobador", "PerfilAprobador",
+    "Motivo", "CanalVenta", "CanalDelivery", "RetornoStock", "UsuarioRegistrado", "PerfilRegistrador"
+]
+
+# Catálogo: producto -> (precio unitario, cuenta contable)
+PRODUCTOS = {
+    "1/4 Brasa - Con Papas": (18.5, "702211"),
+    "1/4 Brasa - Con Chaufa": (19.9, "702211"),
+    "1/2 Brasa - Con Papas": (34.0, "702211"),
+    "1 Brasa - Con Papas": (62.0, "702211"),
+    "Mostrito": (21.5, "702211"),
+    "Anticuchos": (24.0, "702211"),
+    "Ensalada Clasica": (9.5, "702211"),
+    "Papas Fritas Porcion": (8.0, "702211"),
+    "Inca Kola 500ml": (4.5, "701211"),
+    "Coca Cola 500ml": (4.5, "701211"),
+    "Inca Kola 1.5L": (9.0, "701211"),
+    "Agua Mineral 625ml": (3.0, "701211"),
+    "Chicha Morada 1L": (12.0, "401891"),
+    "Limonada 1L": (12.0, "401891"),
+    "Cerveza Pilsen": (8.5, "701211"),
+}
+# Combos: nombre -> (precio, salto = filas del combo incluidos sus componentes)
+COMBOS = {
+    "(Combo)1 brasa + 2 guar": (79.9, 4),
+    "(Combo)1/2 brasa + guar": (45.9, 4),
+    "(Combo)1/4 brasa + 2 guar": (27.9, 4),
+    "(Combo)1/8 brasa + 2 guar": (17.9, 4),
+}
+CUENTA_COMBOS = "702211"
+PRODUCTOS_BOLSA = ["Bolsa", "Bolsa -"]
+CUENTA_BOLSA = "701112"
+# Productos vendidos que no están en el diccionario (generan códigos faltantes)
+PRODUCTOS_SIN_CUENTA = {"Producto Temporada": 15.0}
+
+SERIES = ["B001", "B002", "F001"]
+PROPORCION_ANULADAS = 0.04
+PROPORCION_COMBOS = 0.12
+PROPORCION_BOLSA = 0.15
+PROPORCION_SIN_CUENTA = 0.005
+
+
+def diccionario_cuentas() -> Dict[str, str]:
+    """Diccionario producto -> cuenta contable de los productos generados"""
+    cuentas = {producto: cuenta for producto, (_, cuenta) in PRODUCTOS.items()}
+    cuentas.update({combo: CUENTA_COMBOS for combo in COMBOS})
+    cuentas.update({bolsa: CUENTA_BOLSA for bolsa in PRODUCTOS_BOLSA})
+    cuentas["701112"] = CUENTA_BOLSA
+    return cuentas
+
+
+def diccionario_combos() -> Dict[str, int]:
+    """Diccionario combo -> salto de los combos generados"""
+    return {combo: salto for combo, (_, salto) in COMBOS.items()}
+
+
+def filas_reporte(tickets: int, semilla: int = 0, mes: int = 8, anio: int = 2024) -> Iterator[List]:
+    """
+    Filas del reporte (None = celda vacía): el encabezado y, por cada ticket,
+    su cabecera, pagos, detalle y la fila vacía de separación
+    """
+    rng = random.Random(semilla)
+    productos = list(PRODUCTOS.items())
+    combos = list(COMBOS.items())
+    inicio_mes = datetime.datetime(anio, mes, 1, 9, 0)
+    correlativos = {serie: 1 for serie in SERIES}
+
+    yield list(COLUMNAS_REPORTE)
+
+    for t in range(tickets):
+        momento = inicio_mes + datetime.timedelta(minutes=int(t * 40000 / max(tickets, 1)) + rng.randint(0, 5))
+        serie = rng.choices(SERIES, weights=[6, 3, 1])[0]
+        numero = correlativos[serie]
+        correlativos[serie] += 1
+
+        if serie.startswith("F"):
+            dniruc, cliente = f"20{rng.randint(100000000, 999999999)}", f"EMPRESA {rng.randint(1, 500)} SAC"
+        elif rng.random() < 0.7:
+            dniruc, cliente = "00000000", "Clientes Varios"
+        else:
+            dniruc, cliente = str(rng.randint(10000000, 79999999)), f"CLIENTE {rng.randint(1, 5000)}"
+
+        detalle = []
+        total = 0.0
+        for _ in range(rng.randint(1, 6)):
+            tipo = rng.random()
+            cantidad = rng.choices([1, 2, 3], weights=[7, 2, 1])[0]
+            if tipo < PROPORCION_COMBOS:
+                combo, (precio, salto) = rng.choice(combos)
+                importe = round(cantidad * precio, 2)
+                detalle.append([cantidad, None, combo, None, precio, None, importe])
+                for componente in range(salto - 1):
+                    detalle.append([cantidad, None, f"  componente {componente + 1}", None, None, None, None])
+            elif tipo < PROPORCION_COMBOS + PROPORCION_BOLSA:
+                # Algunos POS dejan el importe de la bolsa en 0
+                importe = rng.choice([0.0, round(cantidad * 0.5, 2)])
+                detalle.append([cantidad, None, rng.choice(PRODUCTOS_BOLSA), None, 0.5, None, importe])
+            elif tipo < PROPORCION_COMBOS + PROPORCION_BOLSA + PROPORCION_SIN_CUENTA:
+                producto, precio = next(iter(PRODUCTOS_SIN_CUENTA.items()))
+                importe = round(cantidad * precio, 2)
+                detalle.append([cantidad, None, producto, None, precio, None, importe])
+            else:
+                producto, (precio, _) = rng.choice(productos)
+                importe = round(cantidad * precio, 2)
+                detalle.append([cantidad, None, producto, None, precio, None, importe])
+            total += importe
+
+        total = round(total, 2)
+        anulada = rng.random() < PROPORCION_ANULADAS
+        subtotal = round(total / 1.18, 2)
+        cabecera = [
+            momento, momento.strftime("%H:%M"), rng.randint(1, 30), rng.randint(1, 3), 1 if momento.hour < 16 else 2,
+            cliente, dniruc, "Factura" if serie.startswith("F") else "Boleta", serie, str(numero).zfill(8),
+            total, 0, 0, 0, subtotal, round(total - subtotal, 2), 0, total, 0,
+            rng.choice(["Salon", "Llevar", "Delivery"]), "Anulada" if anulada else "Activa",
+            "cajero1" if anulada else None, "Cajero" if anulada else None, None, None,
+            "Error de digitación" if anulada else None, "POS", None, None, "cajero1", "Cajero"
+        ]
+        yield cabecera
+
+        for _ in range(rng.randint(0, 2)):
+            yield ["Pago", None, rng.choice(["Efectivo", "Visa", "Yape"]), None, None, None, total]
+        yield ["Detalle de venta"]
+        yield ["Cantidad", None, "Producto", None, "P.U.", None, "Total"]
+        yield from detalle
+        yield [None]
+
+
+def _escribir_xlsx(ruta: str, filas: Iterator[List]) -> int:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Ventas")
+    total = 0
+    for fila in filas:
+        ws.append(fila)
+        total += 1
+    wb.save(ruta)
+    return total
+
+
+def _escribir_xls(ruta: str, filas: Iterator[List]) -> int:
+    try:
+        import xlwt
+    except ImportError:
+        raise Exception("Error al escribir el archivo .xls: se requiere el paquete opcional xlwt (pip install xlwt)")
+
+    wb = xlwt.Workbook()
+    ws = wb.add_sheet("Ventas")
+    estilo_fecha = xlwt.easyxf(num_format_str="DD/MM/YYYY hh:mm")
+    total = 0
+    for i, fila in enumerate(filas):
+        for j, valor in enumerate(fila):
+            if valor is None:
+                continue
+            if isinstance(valor, datetime.datetime):
+                ws.write(i, j, valor, estilo_fecha)
+            else:
+                ws.write(i, j, valor)
+        total += 1
+    wb.save(ruta)
+    return total
+
+
+def _celda_html(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime.datetime):
+        return valor.strftime("%d/%m/%Y %H:%M")
+    if isinstance(valor, float):
+        return "{:,.2f}".format(valor)
+    return html.escape(str(valor))
+
+
+def _escribir_html(ruta: str, filas: Iterator[List]) -> int:
+    total = 0
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write('<html><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8"></head><body>\n')
+        f.write('<table border="1">\n')
+        for i, fila in enumerate(filas):
+            etiqueta = "th" if i == 0 else "td"
+            f.write("<tr>" + "".join(f"<{etiqueta}>{_celda_html(v)}</{etiqueta}>" for v in fila) + "</tr>\n")
+            total += 1
+        f.write("</table>\n</body></html>\n")
+    return total
+
+
+def _limitar(filas: Iterator[List], formato: str) -> Iterator[List]:
+    maximo = MAX_FILAS[formato]
+    for n, fila in enumerate(filas, start=1):
+        if maximo is not None and n > maximo:
+            raise ValueError(
+                f"El reporte excede las {maximo} filas que admite el formato {formato}; "
+                f"use menos tickets o el formato html"
+            )
+        yield fila
+
+
+def generar_reporte(ruta: str, tickets: int, formato: Optional[str] = None, semilla: int = 0) -> int:
+    """
+    Escribir un reporte sintético de `tickets` tickets y devolver sus filas.
+    Sin formato se deduce de la extensión (.xlsx o .xls real).
+    """
+    if formato is None:
+        formato = FORMATO_XLSX if ruta.lower().endswith(".xlsx") else FORMATO_XLS
+    escritores = {FORMATO_XLSX: _escribir_xlsx, FORMATO_XLS: _escribir_xls, FORMATO_HTML: _escribir_html}
+    if formato not in escritores:
+        raise ValueError(f"Formato desconocido: {formato}")
+
+    try:
+        return escritores[formato](ruta, _limitar(filas_reporte(tickets, semilla), formato))
+    except BaseException:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ruta")
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--formato", choices=FORMATOS, default=None)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    filas = generar_reporte(args.ruta, args.tickets, args.formato, args.semilla)
+    print(f"{args.ruta}: {args.tickets} tickets, {filas} filas, {os.path.getsize(args.ruta) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
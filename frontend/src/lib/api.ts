@@ -1,7 +1,7 @@
 /**
  * Cliente API para comunicarse con el backend
  */
-import axios, { AxiosError } from 'axios'
+import axios, { AxiosError, AxiosResponse } from 'axios'
 import type {
   LoginRequest,
   RegisterRequest,
@@ -12,7 +12,15 @@ import type {
   ComboSalto,
   ComboSaltoCreate,
   ProcesamientoResponse,
+  TrabajoEnviado,
+  TrabajoEstado,
   HistorialItem,
+  HistorialResumen,
+  HistorialPagina,
+  HistorialFiltros,
+  ConsultaDiccionario,
+  PaginaDiccionario,
+  Periodo,
 } from '@/types'
 
 const API_URL = (import.meta as any).env?.VITE_API_URL || 'http://localhost:8000/api/v1'
@@ -69,13 +77,21 @@ export const authApi = {
   },
 }
 
+// Lee los headers de paginación de un listado de diccionario
+const paginaDiccionario = <T>(response: AxiosResponse<T[]>): PaginaDiccionario<T> => ({
+  items: response.data,
+  total: Number(response.headers['x-total'] ?? response.data.length),
+  siguienteCursor: response.headers['x-siguiente-cursor'] || undefined,
+})
+
 // --- Productos y Cuentas ---
 export const productosApi = {
-  getAll: async (activo?: boolean): Promise<ProductoCuenta[]> => {
-    const { data } = await api.get<ProductoCuenta[]>('/configuracion/productos-cuentas', {
-      params: { activo, limit: 10000 },
+  // Página filtrada en el servidor; total cuenta todas las coincidencias
+  getPagina: async (consulta: ConsultaDiccionario = {}, cursor?: string): Promise<PaginaDiccionario<ProductoCuenta>> => {
+    const response = await api.get<ProductoCuenta[]>('/configuracion/productos-cuentas', {
+      params: { ...consulta, cursor },
     })
-    return data
+    return paginaDiccionario(response)
   },
 
   create: async (producto: ProductoCuentaCreate): Promise<ProductoCuenta> => {
@@ -104,11 +120,11 @@ export const productosApi = {
 
 // --- Combos ---
 export const combosApi = {
-  getAll: async (activo?: boolean): Promise<ComboSalto[]> => {
-    const { data } = await api.get<ComboSalto[]>('/configuracion/combos-salto', {
-      params: { activo },
+  getPagina: async (consulta: ConsultaDiccionario = {}, cursor?: string): Promise<PaginaDiccionario<ComboSalto>> => {
+    const response = await api.get<ComboSalto[]>('/configuracion/combos-salto', {
+      params: { ...consulta, cursor },
     })
-    return data
+    return paginaDiccionario(response)
   },
 
   create: async (combo: ComboSaltoCreate): Promise<ComboSalto> => {
@@ -151,14 +167,65 @@ export const procesamientoApi = {
     formData.append('subdiario_inicial', params.subdiario_inicial.toString())
     formData.append('numero_comprobante_inicial', params.numero_comprobante_inicial.toString())
 
-    const { data } = await api.post<ProcesamientoResponse>('/procesamiento/procesar', formData, {
+    const { data } = await api.post<TrabajoEnviado>('/procesamiento/procesar', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     })
+    return procesamientoApi.esperarTrabajo(data.job_id)
+  },
+
+  // Varios archivos (o .zip) numerados de forma continua en un solo resultado
+  procesarLote: async (
+    archivos: File[],
+    params: {
+      mes: string
+      subdiario_inicial: number
+      numero_comprobante_inicial: number
+    }
+  ): Promise<ProcesamientoResponse> => {
+    const formData = new FormData()
+    archivos.forEach((archivo) => formData.append('archivos', archivo))
+    formData.append('mes', params.mes)
+    formData.append('subdiario_inicial', params.subdiario_inicial.toString())
+    formData.append('numero_comprobante_inicial', params.numero_comprobante_inicial.toString())
+
+    const { data } = await api.post<TrabajoEnviado>('/procesamiento/procesar-lote', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+    return procesamientoApi.esperarTrabajo(data.job_id)
+  },
+
+  estadoTrabajo: async (jobId: string): Promise<TrabajoEstado> => {
+    const { data } = await api.get<TrabajoEstado>(`/procesamiento/jobs/${jobId}`)
     return data
   },
 
-  descargar: async (historialId: number, nombreArchivo?: string): Promise<void> => {
+  // Consultar el trabajo hasta que termine y devolver su resultado
+  esperarTrabajo: async (
+    jobId: string,
+    onProgreso?: (progreso: number) => void,
+    intervaloMs = 1000
+  ): Promise<ProcesamientoResponse> => {
+    while (true) {
+      const trabajo = await procesamientoApi.estadoTrabajo(jobId)
+      onProgreso?.(trabajo.progreso)
+      if (trabajo.estado === 'completado' && trabajo.resultado) {
+        return trabajo.resultado
+      }
+      if (trabajo.estado === 'error') {
+        throw new Error(trabajo.mensaje_error || 'Error al procesar el archivo')
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervaloMs))
+    }
+  },
+
+  // formato 'zip': el Excel comprimido, más liviano para conexiones lentas
+  descargar: async (
+    historialId: number,
+    nombreArchivo?: string,
+    formato: 'xlsx' | 'zip' = 'xlsx'
+  ): Promise<void> => {
     const response = await api.get(`/procesamiento/descargar/${historialId}`, {
+      params: formato === 'zip' ? { formato } : undefined,
       responseType: 'blob',
     })
 
@@ -167,7 +234,8 @@ export const procesamientoApi = {
     const url = window.URL.createObjectURL(blob)
     const link = document.createElement('a')
     link.href = url
-    link.download = nombreArchivo || `asientos_${historialId}.xlsx`
+    const nombre = nombreArchivo || `asientos_${historialId}.xlsx`
+    link.download = formato === 'zip' ? nombre.replace(/\.[^.]+$/, '') + '.zip' : nombre
     document.body.appendChild(link)
     link.click()
     document.body.removeChild(link)
@@ -177,11 +245,15 @@ export const procesamientoApi = {
 
 // --- Historial ---
 export const historialApi = {
-  getAll: async (): Promise<HistorialItem[]> => {
-    const { data } = await api.get<HistorialItem[]>('/historial/', {
-      params: { limit: 100 },
+  // Página del historial; siguienteCursor pide la página siguiente
+  getAll: async (filtros: HistorialFiltros = {}, cursor?: string): Promise<HistorialPagina> => {
+    const response = await api.get<HistorialResumen[]>('/historial/', {
+      params: { limit: 50, ...filtros, cursor },
     })
-    return data
+    return {
+      items: response.data,
+      siguienteCursor: response.headers['x-siguiente-cursor'] || undefined,
+    }
   },
 
   getById: async (id: number): Promise<HistorialItem> => {
@@ -192,4 +264,67 @@ export const historialApi = {
   delete: async (id: number): Promise<void> => {
     await api.delete(`/historial/${id}`)
   },
+
+  // Volver a generar los asientos con los diccionarios actuales, sin subir el archivo
+  reprocesar: async (
+    id: number,
+    params: {
+      mes?: string
+      subdiario_inicial?: number
+      numero_comprobante_inicial?: number
+    } = {}
+  ): Promise<ProcesamientoResponse> => {
+    const { data } = await api.post<TrabajoEnviado>(`/historial/${id}/reprocesar`, params)
+    return procesamientoApi.esperarTrabajo(data.job_id)
+  },
+}
+
+// --- Períodos mensuales ---
+export const periodosApi = {
+  getAll: async (): Promise<Periodo[]> => {
+    const { data } = await api.get<Periodo[]>('/periodos/')
+    return data
+  },
+
+  create: async (params: {
+    anio: number
+    mes: string
+    subdiario_inicial: number
+    numero_comprobante_inicial: number
+  }): Promise<Periodo> => {
+    const { data } = await api.post<Periodo>('/periodos/', params)
+    return data
+  },
+
+  // Agregar el archivo del día: solo se procesan las boletas nuevas del período
+  procesar: async (id: number, archivo: File): Promise<ProcesamientoResponse> => {
+    const formData = new FormData()
+    formData.append('archivo', archivo)
+
+    const { data } = await api.post<TrabajoEnviado>(`/periodos/${id}/procesar`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+    return procesamientoApi.esperarTrabajo(data.job_id)
+  },
+
+  cerrar: async (id: number): Promise<Periodo> => {
+    const { data } = await api.post<Periodo>(`/periodos/${id}/cerrar`)
+    return data
+  },
+
+  descargar: async (periodo: Periodo): Promise<void> => {
+    const response = await api.get(`/periodos/${periodo.id}/descargar`, {
+      responseType: 'blob',
+    })
+
+    const blob = new Blob([response.data])
+    const url = window.URL.createObjectURL(blob)
+    const link = document.createElement('a')
+    link.href = url
+    link.download = `asientos_${periodo.anio}${periodo.mes}.xlsx`
+    document.body.appendChild(link)
+    link.click()
+    document.body.removeChild(link)
+    window.URL.revokeObjectURL(url)
+  },
 }
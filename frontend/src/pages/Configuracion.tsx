@@ -1,20 +1,29 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useCallback, useMemo } from 'react'
 import { Upload, Plus, Trash2, ArrowUpDown, ArrowUp, ArrowDown } from 'lucide-react'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/Card'
 import { Button } from '@/components/ui/Button'
 import { Input } from '@/components/ui/Input'
 import { Label } from '@/components/ui/Label'
 import { productosApi, combosApi } from '@/lib/api'
-import type { ProductoCuenta, ComboSalto } from '@/types'
+import type { ProductoCuenta, ComboSalto, ConsultaDiccionario } from '@/types'
 
 type SortField = 'nombre' | 'fecha'
 type SortDirection = 'asc' | 'desc' | null
 
+// Filas por página y espera tras teclear antes de buscar en el servidor
+const TAMANO_PAGINA = 50
+const ESPERA_BUSQUEDA_MS = 300
+
 export function Configuracion() {
   const [activeTab, setActiveTab] = useState<'productos' | 'combos'>('productos')
   const [productos, setProductos] = useState<ProductoCuenta[]>([])
   const [combos, setCombos] = useState<ComboSalto[]>([])
+  const [totalProductos, setTotalProductos] = useState(0)
+  const [totalCombos, setTotalCombos] = useState(0)
+  const [cursorProductos, setCursorProductos] = useState<string | undefined>()
+  const [cursorCombos, setCursorCombos] = useState<string | undefined>()
   const [searchTerm, setSearchTerm] = useState('')
+  const [busqueda, setBusqueda] = useState('')
 
   // Estados de ordenamiento
   const [sortField, setSortField] = useState<SortField | null>(null)
@@ -30,19 +39,65 @@ export function Configuracion() {
   const [importandoProductos, setImportandoProductos] = useState(false)
   const [importandoCombos, setImportandoCombos] = useState(false)
 
-  // Carga inicial
+  // La búsqueda se envía al servidor cuando se deja de teclear
   useEffect(() => {
-    cargarDatos()
-  }, [])
+    const espera = setTimeout(() => setBusqueda(searchTerm.trim()), ESPERA_BUSQUEDA_MS)
+    return () => clearTimeout(espera)
+  }, [searchTerm])
+
+  // Filtro, orden y paginación se resuelven en el servidor
+  const consulta = useMemo<ConsultaDiccionario>(
+    () => ({
+      activo: true,
+      buscar: busqueda || undefined,
+      orden: sortField && sortDirection ? sortField : 'fecha',
+      direccion: sortField && sortDirection ? sortDirection : 'asc',
+      limit: TAMANO_PAGINA,
+    }),
+    [busqueda, sortField, sortDirection]
+  )
 
-  const cargarDatos = async () => {
+  const cargarDatos = useCallback(async () => {
     try {
-      const [prods, cmbs] = await Promise.all([productosApi.getAll(true), combosApi.getAll(true)])
-      setProductos(prods)
-      setCombos(cmbs)
+      const [prods, cmbs] = await Promise.all([
+        productosApi.getPagina(consulta),
+        combosApi.getPagina(consulta),
+      ])
+      setProductos(prods.items)
+      setTotalProductos(prods.total)
+      setCursorProductos(prods.siguienteCursor)
+      setCombos(cmbs.items)
+      setTotalCombos(cmbs.total)
+      setCursorCombos(cmbs.siguienteCursor)
     } catch (error) {
       console.error('Error cargando datos:', error)
     }
+  }, [consulta])
+
+  useEffect(() => {
+    cargarDatos()
+  }, [cargarDatos])
+
+  const cargarMasProductos = async () => {
+    if (!cursorProductos) return
+    try {
+      const pagina = await productosApi.getPagina(consulta, cursorProductos)
+      setProductos((actual) => [...actual, ...pagina.items])
+      setCursorProductos(pagina.siguienteCursor)
+    } catch (error) {
+      console.error('Error cargando productos:', error)
+    }
+  }
+
+  const cargarMasCombos = async () => {
+    if (!cursorCombos) return
+    try {
+      const pagina = await combosApi.getPagina(consulta, cursorCombos)
+      setCombos((actual) => [...actual, ...pagina.items])
+      setCursorCombos(pagina.siguienteCursor)
+    } catch (error) {
+      console.error('Error cargando combos:', error)
+    }
   }
 
   const handleAgregarProducto = async () => {
@@ -158,44 +213,6 @@ export function Configuracion() {
     return <ArrowDown className="h-4 w-4 ml-1 inline text-primary" />
   }
 
-  // Función para ordenar un array
-  const sortArray = <T extends ProductoCuenta | ComboSalto>(items: T[]): T[] => {
-    if (!sortField || !sortDirection) return items
-
-    return [...items].sort((a, b) => {
-      let aValue: string | number
-      let bValue: string | number
-
-      if (sortField === 'nombre') {
-        aValue = 'producto' in a ? a.producto : a.combo
-        bValue = 'producto' in b ? b.producto : b.combo
-        aValue = aValue.toLowerCase()
-        bValue = bValue.toLowerCase()
-      } else {
-        aValue = new Date(a.created_at).getTime()
-        bValue = new Date(b.created_at).getTime()
-      }
-
-      if (aValue < bValue) return sortDirection === 'asc' ? -1 : 1
-      if (aValue > bValue) return sortDirection === 'asc' ? 1 : -1
-      return 0
-    })
-  }
-
-  const productosFiltrados = sortArray(
-    productos.filter(
-      (p) =>
-        p.producto.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        p.cuenta_contable.toLowerCase().includes(searchTerm.toLowerCase())
-    )
-  )
-
-  const combosFiltrados = sortArray(
-    combos.filter((c) =>
-      c.combo.toLowerCase().includes(searchTerm.toLowerCase())
-    )
-  )
-
   return (
     <div className="space-y-6">
       <div>
@@ -213,7 +230,7 @@ export function Configuracion() {
               : 'text-gray-600 hover:text-gray-900'
           }`}
         >
-          Productos y Cuentas ({productos.length})
+          Productos y Cuentas ({totalProductos})
         </button>
         <button
           onClick={() => setActiveTab('combos')}
@@ -223,7 +240,7 @@ export function Configuracion() {
               : 'text-gray-600 hover:text-gray-900'
           }`}
         >
-          Combos ({combos.length})
+          Combos ({totalCombos})
         </button>
       </div>
 
@@ -301,7 +318,7 @@ export function Configuracion() {
           {/* Tabla */}
           <Card>
             <CardHeader>
-              <CardTitle>Productos ({productosFiltrados.length})</CardTitle>
+              <CardTitle>Productos ({totalProductos})</CardTitle>
             </CardHeader>
             <CardContent>
               <div className="overflow-x-auto">
@@ -331,7 +348,7 @@ export function Configuracion() {
                     </tr>
                   </thead>
                   <tbody className="divide-y divide-gray-200">
-                    {productosFiltrados.slice(0, 50).map((producto) => (
+                    {productos.map((producto) => (
                       <tr key={producto.id} className="hover:bg-gray-50">
                         <td className="px-4 py-3 text-sm">{producto.producto}</td>
                         <td className="px-4 py-3 text-sm font-mono">{producto.cuenta_contable}</td>
@@ -355,10 +372,15 @@ export function Configuracion() {
                     ))}
                   </tbody>
                 </table>
-                {productosFiltrados.length > 50 && (
-                  <p className="text-sm text-gray-500 mt-4 text-center">
-                    Mostrando 50 de {productosFiltrados.length} productos
-                  </p>
+                {cursorProductos && (
+                  <div className="flex flex-col items-center gap-2 mt-4">
+                    <p className="text-sm text-gray-500">
+                      Mostrando {productos.length} de {totalProductos} productos
+                    </p>
+                    <Button onClick={cargarMasProductos} variant="outline" size="sm">
+                      Cargar más
+                    </Button>
+                  </div>
                 )}
               </div>
             </CardContent>
@@ -430,7 +452,7 @@ export function Configuracion() {
           {/* Tabla */}
           <Card>
             <CardHeader>
-              <CardTitle>Combos ({combosFiltrados.length})</CardTitle>
+              <CardTitle>Combos ({totalCombos})</CardTitle>
             </CardHeader>
             <CardContent>
               <div className="overflow-x-auto">
@@ -460,7 +482,7 @@ export function Configuracion() {
                     </tr>
                   </thead>
                   <tbody className="divide-y divide-gray-200">
-                    {combosFiltrados.map((combo) => (
+                    {combos.map((combo) => (
                       <tr key={combo.id} className="hover:bg-gray-50">
                         <td className="px-4 py-3 text-sm">{combo.combo}</td>
                         <td className="px-4 py-3 text-sm font-mono">{combo.salto}</td>
@@ -484,6 +506,16 @@ export function Configuracion() {
                     ))}
                   </tbody>
                 </table>
+                {cursorCombos && (
+                  <div className="flex flex-col items-center gap-2 mt-4">
+                    <p className="text-sm text-gray-500">
+                      Mostrando {combos.length} de {totalCombos} combos
+                    </p>
+                    <Button onClick={cargarMasCombos} variant="outline" size="sm">
+                      Cargar más
+                    </Button>
+                  </div>
+                )}
               </div>
             </CardContent>
           </Card>
@@ -11,6 +11,24 @@ type DashboardStats = {
   procesamientosMes: number
 }
 
+// El historial viene del más reciente al más antiguo: se pide hasta salir del mes
+const contarProcesamientosMes = async (): Promise<number> => {
+  const ahora = new Date()
+  const esDelMes = (fecha: Date) =>
+    fecha.getFullYear() === ahora.getFullYear() && fecha.getMonth() === ahora.getMonth()
+
+  let total = 0
+  let cursor: string | undefined
+  do {
+    const pagina = await historialApi.getAll({}, cursor)
+    const delMes = pagina.items.filter((item) => esDelMes(new Date(item.created_at)))
+    total += delMes.length
+    if (delMes.length < pagina.items.length) break
+    cursor = pagina.siguienteCursor
+  } while (cursor)
+  return total
+}
+
 export function Dashboard() {
   const [stats, setStats] = useState<DashboardStats>({ productos: 0, combos: 0, procesamientosMes: 0 })
   const [loading, setLoading] = useState(true)
@@ -18,21 +36,15 @@ export function Dashboard() {
   useEffect(() => {
     const cargarEstadisticas = async () => {
       try {
-        const [productos, combos, historial] = await Promise.all([
-          productosApi.getAll(true),
-          combosApi.getAll(true),
-          historialApi.getAll(),
+        const [productos, combos, procesamientosMes] = await Promise.all([
+          productosApi.getPagina({ activo: true, limit: 1 }),
+          combosApi.getPagina({ activo: true, limit: 1 }),
+          contarProcesamientosMes(),
         ])
 
-        const ahora = new Date()
-        const procesamientosMes = historial.filter((item) => {
-          const fecha = new Date(item.created_at)
-          return fecha.getFullYear() === ahora.getFullYear() && fecha.getMonth() === ahora.getMonth()
-        }).length
-
         setStats({
-          productos: productos.length,
-          combos: combos.length,
+          productos: productos.total,
+          combos: combos.total,
           procesamientosMes,
         })
       } catch (error) {
@@ -1,14 +1,17 @@
 import { useState, useEffect } from 'react'
-import { Download, Trash2, CheckCircle2, XCircle, AlertCircle } from 'lucide-react'
+import { Download, Trash2, CheckCircle2, XCircle, AlertCircle, Clock, RefreshCw } from 'lucide-react'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/Card'
 import { Button } from '@/components/ui/Button'
 import { historialApi, procesamientoApi } from '@/lib/api'
 import { formatDate } from '@/lib/utils'
-import type { HistorialItem } from '@/types'
+import type { HistorialResumen } from '@/types'
 
 export function Historial() {
-  const [historial, setHistorial] = useState<HistorialItem[]>([])
+  const [historial, setHistorial] = useState<HistorialResumen[]>([])
+  const [siguienteCursor, setSiguienteCursor] = useState<string | undefined>()
   const [loading, setLoading] = useState(true)
+  const [cargandoMas, setCargandoMas] = useState(false)
+  const [reprocesando, setReprocesando] = useState<number | null>(null)
 
   useEffect(() => {
     cargarHistorial()
@@ -17,8 +20,9 @@ export function Historial() {
   const cargarHistorial = async () => {
     setLoading(true)
     try {
-      const data = await historialApi.getAll()
-      setHistorial(data)
+      const pagina = await historialApi.getAll()
+      setHistorial(pagina.items)
+      setSiguienteCursor(pagina.siguienteCursor)
     } catch (error) {
       console.error('Error cargando historial:', error)
     } finally {
@@ -26,6 +30,20 @@ export function Historial() {
     }
   }
 
+  const cargarMas = async () => {
+    if (!siguienteCursor) return
+    setCargandoMas(true)
+    try {
+      const pagina = await historialApi.getAll({}, siguienteCursor)
+      setHistorial((actual) => [...actual, ...pagina.items])
+      setSiguienteCursor(pagina.siguienteCursor)
+    } catch (error) {
+      console.error('Error cargando historial:', error)
+    } finally {
+      setCargandoMas(false)
+    }
+  }
+
   const handleEliminar = async (id: number) => {
     if (confirm('¿Estás seguro de eliminar este registro?')) {
       try {
@@ -37,15 +55,28 @@ export function Historial() {
     }
   }
 
-  const handleDescargar = async (item: HistorialItem) => {
+  const handleDescargar = async (item: HistorialResumen, formato: 'xlsx' | 'zip' = 'xlsx') => {
     try {
-      await procesamientoApi.descargar(item.id, item.nombre_archivo)
+      await procesamientoApi.descargar(item.id, item.nombre_archivo, formato)
     } catch (error) {
       console.error('Error descargando archivo:', error)
       alert('Error al descargar el archivo')
     }
   }
 
+  const handleReprocesar = async (item: HistorialResumen) => {
+    setReprocesando(item.id)
+    try {
+      await historialApi.reprocesar(item.id)
+      cargarHistorial()
+    } catch (error: any) {
+      console.error('Error reprocesando:', error)
+      alert(error.response?.data?.detail || error.message || 'Error al reprocesar')
+    } finally {
+      setReprocesando(null)
+    }
+  }
+
   const getEstadoBadge = (estado: string) => {
     if (estado === 'completado') {
       return (
@@ -55,6 +86,14 @@ export function Historial() {
         </span>
       )
     }
+    if (estado === 'pendiente' || estado === 'procesando') {
+      return (
+        <span className="inline-flex items-center gap-1 px-2 py-1 rounded-full text-xs font-medium bg-yellow-100 text-yellow-800">
+          <Clock className="h-3 w-3" />
+          {estado === 'pendiente' ? 'Pendiente' : 'Procesando'}
+        </span>
+      )
+    }
     return (
       <span className="inline-flex items-center gap-1 px-2 py-1 rounded-full text-xs font-medium bg-red-100 text-red-800">
         <XCircle className="h-3 w-3" />
@@ -123,11 +162,11 @@ export function Historial() {
                   </div>
                 </div>
 
-                {item.codigos_faltantes && (
+                {!!item.total_codigos_faltantes && (
                   <div className="bg-yellow-50 border border-yellow-200 rounded-md p-3 mb-4">
                     <p className="text-sm text-yellow-800">
                       <strong>Códigos faltantes:</strong>{' '}
-                      {JSON.parse(item.codigos_faltantes).length} productos sin mapeo
+                      {item.total_codigos_faltantes} productos sin mapeo
                     </p>
                   </div>
                 )}
@@ -142,9 +181,26 @@ export function Historial() {
 
                 <div className="flex gap-2">
                   {item.estado === 'completado' && (
-                    <Button onClick={() => handleDescargar(item)} size="sm">
-                      <Download className="h-4 w-4 mr-2" />
-                      Descargar Excel
+                    <>
+                      <Button onClick={() => handleDescargar(item)} size="sm">
+                        <Download className="h-4 w-4 mr-2" />
+                        Descargar Excel
+                      </Button>
+                      <Button onClick={() => handleDescargar(item, 'zip')} variant="outline" size="sm">
+                        <Download className="h-4 w-4 mr-2" />
+                        ZIP
+                      </Button>
+                    </>
+                  )}
+                  {!!item.total_codigos_faltantes && (
+                    <Button
+                      onClick={() => handleReprocesar(item)}
+                      variant="outline"
+                      size="sm"
+                      disabled={reprocesando === item.id}
+                    >
+                      <RefreshCw className="h-4 w-4 mr-2" />
+                      {reprocesando === item.id ? 'Reprocesando...' : 'Reprocesar'}
                     </Button>
                   )}
                   <Button
@@ -163,6 +219,13 @@ export function Historial() {
               </CardContent>
             </Card>
           ))}
+          {siguienteCursor && (
+            <div className="flex justify-center">
+              <Button onClick={cargarMas} variant="outline" disabled={cargandoMas}>
+                {cargandoMas ? 'Cargando...' : 'Cargar más'}
+              </Button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -92,6 +92,9 @@ export function Procesar() {
         } else {
           setError('Error al procesar el archivo')
         }
+      } else if (err instanceof Error && err.message) {
+        // Error informado por el trabajo de procesamiento
+        setError(err.message)
       } else {
         setError('Error al procesar el archivo')
       }
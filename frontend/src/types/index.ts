@@ -26,6 +26,22 @@ export interface ComboSalto {
   updated_at?: string
 }
 
+// Consulta de un diccionario con búsqueda y orden en el servidor
+export interface ConsultaDiccionario {
+  activo?: boolean
+  buscar?: string
+  modo?: 'contiene' | 'prefijo'
+  orden?: 'nombre' | 'fecha'
+  direccion?: 'asc' | 'desc'
+  limit?: number
+}
+
+export interface PaginaDiccionario<T> {
+  items: T[]
+  total: number
+  siguienteCursor?: string
+}
+
 export interface ComboSaltoCreate {
   combo: string
   salto: number
@@ -38,6 +54,16 @@ export interface ProcesamientoRequest {
   numero_comprobante_inicial: number
 }
 
+export interface EstadisticaArchivo {
+  archivo: string
+  comprobantes: number
+  anuladas: number
+  lineas: number
+  primer_comprobante?: string
+  ultimo_comprobante?: string
+  codigos_faltantes: string[]
+}
+
 export interface ProcesamientoResponse {
   id: number
   nombre_archivo: string
@@ -46,9 +72,29 @@ export interface ProcesamientoResponse {
   codigos_faltantes: string[]
   archivo_salida_url: string
   mensaje: string
+  detalle_archivos?: EstadisticaArchivo[]
 }
 
-export interface HistorialItem {
+export interface TrabajoEnviado {
+  job_id: string
+  historial_id: number
+  estado: string
+  progreso: number
+  estado_url: string
+  desde_cache: boolean
+}
+
+export interface TrabajoEstado {
+  job_id: string
+  historial_id: number
+  estado: 'pendiente' | 'procesando' | 'completado' | 'error'
+  progreso: number
+  mensaje_error?: string
+  resultado?: ProcesamientoResponse
+}
+
+// Fila del listado de historial (sin los JSON grandes)
+export interface HistorialResumen {
   id: number
   nombre_archivo: string
   mes: string
@@ -56,13 +102,50 @@ export interface HistorialItem {
   numero_comprobante_inicial: number
   total_registros_procesados: number
   total_asientos_generados: number
-  codigos_faltantes?: string
+  total_codigos_faltantes?: number
   estado: string
   mensaje_error?: string
   procesado_por?: string
+  job_id?: string
+  progreso?: number
+  reprocesado_de?: number
+  periodo_id?: number
   created_at: string
 }
 
+export interface HistorialItem extends HistorialResumen {
+  codigos_faltantes?: string
+  detalle_archivos?: string
+  metricas?: string
+}
+
+export interface HistorialPagina {
+  items: HistorialResumen[]
+  siguienteCursor?: string
+}
+
+export interface HistorialFiltros {
+  mes?: string
+  estado?: string
+  procesado_por?: string
+}
+
+export interface Periodo {
+  id: number
+  anio: number
+  mes: string
+  subdiario_inicial: number
+  numero_comprobante_inicial: number
+  subdiario_siguiente: number
+  numero_siguiente: number
+  total_boletas: number
+  total_asientos: number
+  estado: 'abierto' | 'cerrado'
+  creado_por?: string
+  created_at: string
+  updated_at?: string
+}
+
 export interface Usuario {
   id: number
   email: string